@@ -0,0 +1,264 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+
+from instrumentation import LATENCY_BUCKETS
+from metrics import Counter, Gauge, Histogram
+
+#Admission control: every request is given a priority class by its route, and a class is only
+#admitted while fewer than its limit of requests (of any class) are in flight in this worker.
+#Low-priority work therefore stops being admitted first as load builds, while critical clinical
+#routes can use the whole budget. Requests over their class's limit wait in a bounded FIFO queue
+#(higher classes are served first when a slot frees up); when the queue is full they are turned
+#away at once with 429, when they have waited too long with 503, both with Retry-After.
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+#class=value lists overriding the defaults below, e.g. ADMISSION_LIMITS="low=2"
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "")
+ADMISSION_QUEUE_LIMITS = os.getenv("ADMISSION_QUEUE_LIMITS", "")
+ADMISSION_QUEUE_TIMEOUTS = os.getenv("ADMISSION_QUEUE_TIMEOUTS", "")
+#Overrides of ROUTE_CLASSES, e.g. ADMISSION_ROUTE_CLASSES="POST /token=normal,GET /stats=low"
+ADMISSION_ROUTE_CLASSES = os.getenv("ADMISSION_ROUTE_CLASSES", "")
+
+
+def _parse_classes(spec: str, convert) -> dict:
+    values = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.rpartition("=")
+        values[name.strip()] = convert(value.strip())
+    return values
+
+
+#Highest priority first
+PRIORITY_CLASSES = ("critical", "normal", "low")
+DEFAULT_CLASS = "normal"
+#Not admission-controlled: long-lived streams and the operational endpoints, which must keep
+#answering precisely when the app is overloaded
+EXEMPT = "exempt"
+
+#Keep the critical limit below DB_POOL_SIZE + DB_MAX_OVERFLOW and the 40 threads sync handlers run
+#on: past those, sync requests queue inside the app instead of here, where they can deadlock
+#waiting for connections held by requests that need a thread to finish.
+LIMITS = {"critical": 24, "normal": 16, "low": 4, **_parse_classes(ADMISSION_LIMITS, int)}
+QUEUE_LIMITS = {"critical": 512, "normal": 64, "low": 16, **_parse_classes(ADMISSION_QUEUE_LIMITS, int)}
+#Seconds
+QUEUE_TIMEOUTS = {"critical": 10.0, "normal": 2.0, "low": 0.5, **_parse_classes(ADMISSION_QUEUE_TIMEOUTS, float)}
+
+#"METHOD /route/template": class; routes not listed are DEFAULT_CLASS
+ROUTE_CLASSES = {
+    # Time-critical in stroke care: the tPA decision and the data it rests on
+    "GET /users/{user_id}/tpa-eligibility": "critical",
+    "GET /tpa-eligibility": "critical",
+    "POST /users/{user_id}/consultations": "critical",
+    "GET /users/{user_id}/consultations": "critical",
+    "GET /users/{user_id}/vitals": "critical",
+    "GET /users/{user_id}/results": "critical",
+    "POST /users/me/vitals": "critical",
+    "POST /users/me/results": "critical",
+    "GET /worklist": "critical",
+    # Listings, logins (tokens last ACCESS_TOKEN_EXPIRE_MINUTES) and bulk work can wait
+    "POST /token": "low",
+    "GET /users/": "low",
+    "GET /users/role/{role}": "low",
+    "POST /ingest/vitals": "low",
+    "POST /ingest/results": "low",
+    "DELETE /users/": "low",
+    "GET /export": "low",
+    "GET /audit/events": "low",
+    "GET /events": EXEMPT,
+    "GET /metrics": EXEMPT,
+    "GET /admission/stats": EXEMPT,
+    "GET /events/stats": EXEMPT,
+    "GET /token/cache-stats": EXEMPT,
+    "GET /token/hashing-stats": EXEMPT,
+    "GET /response-cache/stats": EXEMPT,
+    "GET /db/pool-stats": EXEMPT,
+    "GET /purge-jobs/{job_id}": EXEMPT,
+    "GET /audit/stats": EXEMPT,
+    **_parse_classes(ADMISSION_ROUTE_CLASSES, str),
+}
+
+
+class Shed(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code, self.reason, self.retry_after = status_code, reason, retry_after
+
+
+# In-flight accounting and the per-class queues of one worker. Only ever used from the event
+# loop, so it needs no locking.
+class AdmissionController:
+    def __init__(self, limits: dict = LIMITS, queue_limits: dict = QUEUE_LIMITS, queue_timeouts: dict = QUEUE_TIMEOUTS):
+        unknown = (set(limits) | set(queue_limits) | set(queue_timeouts)) - set(PRIORITY_CLASSES)
+        if unknown:
+            raise ValueError(f"Unknown priority classes: {', '.join(sorted(unknown))}.")
+        self.limits = {name: limits[name] for name in PRIORITY_CLASSES}
+        self.queue_limits = {name: queue_limits[name] for name in PRIORITY_CLASSES}
+        self.queue_timeouts = {name: queue_timeouts[name] for name in PRIORITY_CLASSES}
+        self.in_flight = 0
+        self.waiters = {name: deque() for name in PRIORITY_CLASSES}
+        #Smoothed time a request holds its slot, for Retry-After
+        self.service_seconds = 0.05
+        labels = ("class",)
+        self.running = Gauge("admission_in_flight", "Admitted requests being served, by priority class.", labels)
+        self.queued = Gauge("admission_queue_depth", "Requests waiting for admission, by priority class.", labels)
+        self.admitted = Counter("admission_admitted_total", "Requests admitted, by priority class.", labels)
+        self.shed = Counter("admission_shed_total", "Requests turned away, by priority class and reason.",
+                            ("class", "reason"))
+        self.queue_wait = Histogram("admission_queue_wait_seconds", "Time admitted requests spent queued.", labels,
+                                    LATENCY_BUCKETS)
+
+    def _blocked(self, priority_class: str) -> bool:
+        # Nobody overtakes a queued request of the same or a higher class
+        for name in PRIORITY_CLASSES:
+            if self.waiters[name]:
+                return True
+            if name == priority_class:
+                return self.in_flight >= self.limits[name]
+
+    def retry_after(self, priority_class: str) -> int:
+        ahead = sum(len(self.waiters[name]) for name in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority_class) + 1])
+        return max(1, math.ceil(self.service_seconds * (ahead + 1) / self.limits[priority_class]))
+
+    def _reject(self, priority_class: str, reason: str, status_code: int):
+        self.shed.inc((priority_class, reason))
+        raise Shed(status_code, reason, self.retry_after(priority_class))
+
+    # Waits for a slot (raises Shed when there is none to be had); pair with release()
+    async def acquire(self, priority_class: str):
+        if not self._blocked(priority_class):
+            self._start(priority_class)
+            self.queue_wait.observe((priority_class,), 0.0)
+            return
+        waiters = self.waiters[priority_class]
+        if len(waiters) >= self.queue_limits[priority_class]:
+            self._reject(priority_class, "queue_full", 429)
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        self.queued.inc((priority_class,))
+        queued_at = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.queue_timeouts[priority_class]):
+                await future
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the wait ended: pass it on
+                self._finish(priority_class)
+            elif future in waiters:
+                waiters.remove(future)
+                self.queued.dec((priority_class,))
+            if isinstance(e, TimeoutError):
+                self._reject(priority_class, "queue_timeout", 503)
+            raise
+        self.queue_wait.observe((priority_class,), time.perf_counter() - queued_at)
+
+    def release(self, priority_class: str, held_seconds: float):
+        self.service_seconds += (held_seconds - self.service_seconds) * 0.1
+        self._finish(priority_class)
+
+    def _start(self, priority_class: str):
+        self.in_flight += 1
+        self.running.inc((priority_class,))
+        self.admitted.inc((priority_class,))
+
+    def _finish(self, priority_class: str):
+        self.in_flight -= 1
+        self.running.dec((priority_class,))
+        # Hand freed slots to the queued requests, highest class first
+        for name in PRIORITY_CLASSES:
+            waiters = self.waiters[name]
+            while waiters and self.in_flight < self.limits[name]:
+                future = waiters.popleft()
+                self.queued.dec((name,))
+                if not future.cancelled():
+                    self._start(name)
+                    future.set_result(None)
+            if waiters:
+                return
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "service_ms": round(self.service_seconds * 1000, 2),
+            "classes": {
+                name: {
+                    "limit": self.limits[name],
+                    "queue_limit": self.queue_limits[name],
+                    "queue_timeout_s": self.queue_timeouts[name],
+                    "queued": len(self.waiters[name]),
+                } for name in PRIORITY_CLASSES
+            },
+        }
+
+    def render(self) -> list[str]:
+        return [line for metric in (self.running, self.queued, self.admitted, self.shed, self.queue_wait)
+                for line in metric.render()]
+
+
+# Pure ASGI, in front of routing: a request is classified by the route the router will pick
+# (the first full match in `routes`), and turned away before its body is read when shed.
+class AdmissionControlMiddleware:
+    def __init__(self, app, controller: AdmissionController, routes: list, route_classes: dict = None):
+        self.app = app
+        self.controller = controller
+        self.routes = routes
+        self.route_classes = route_classes if route_classes is not None else ROUTE_CLASSES
+        unknown = set(self.route_classes.values()) - {*PRIORITY_CLASSES, EXEMPT}
+        if unknown:
+            raise ValueError(f"Unknown priority classes: {', '.join(sorted(unknown))}.")
+
+    def classify(self, scope) -> str:
+        path, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and path.startswith(root_path + "/"):
+            path = path[len(root_path):]
+        # The path regex alone (Route.matches also converts the path parameters, at several
+        # times the cost); a path match with the wrong method is a 405, classified by its path
+        partial = None
+        for route in self.routes:
+            if route.path_regex.match(path):
+                methods = getattr(route, "methods", None)
+                if not methods or scope["method"] in methods:
+                    break
+                partial = partial or route
+        else:
+            route = partial
+            if route is None:
+                return DEFAULT_CLASS
+        # The metrics and log context label the request by it, even when it never reaches the router
+        scope["route"] = route
+        method = "GET" if scope["method"] == "HEAD" else scope["method"]
+        return self.route_classes.get(f"{method} {route.path}", DEFAULT_CLASS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        priority_class = self.classify(scope)
+        if priority_class == EXEMPT:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.acquire(priority_class)
+        except Shed as shed:
+            await _send_shed(send, shed, priority_class)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority_class, time.perf_counter() - started)
+
+
+async def _send_shed(send, shed: Shed, priority_class: str):
+    detail = "Too many requests queued, please retry." if shed.reason == "queue_full" else \
+        "The service is overloaded, please retry."
+    body = json.dumps({"detail": detail, "priority_class": priority_class}).encode()
+    await send({"type": "http.response.start", "status": shed.status_code, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(shed.retry_after).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
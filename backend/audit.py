@@ -0,0 +1,219 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event, insert, text
+
+from logs import current_request
+from metrics import Histogram
+from models import AuditEvent
+
+#PHI audit trail: who read or changed which patient's vitals, lab results, consultations and
+#eligibility. Handlers only append a tuple to a bounded in-memory buffer; a flusher thread per
+#worker writes the buffered events to the append-only auditevent table in one multi-row INSERT
+#per batch, every AUDIT_FLUSH_INTERVAL_MS or as soon as AUDIT_BATCH_SIZE events are waiting.
+#  - bounded memory: past AUDIT_BUFFER_SIZE events the oldest are dropped, counted and logged
+#  - shutdown: the lifespan drains the buffer after the last request has finished (atexit covers
+#    scripts); a batch whose write failed is retried every interval, and SHUTDOWN_FLUSH_ATTEMPTS
+#    times at shutdown before what is left is logged as lost
+#  - events become visible to GET /audit/events within about one flush interval
+AUDIT_TRAIL = os.getenv("AUDIT_TRAIL", "true").lower() == "true"
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", 100000))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 5000))
+AUDIT_FLUSH_INTERVAL_MS = float(os.getenv("AUDIT_FLUSH_INTERVAL_MS", 1000))
+#Write attempts left for the final flush before shutdown gives up on a failing database
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+FLUSH_SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000)
+FLUSH_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+logger = logging.getLogger(__name__)
+
+#SQLite: the batch goes to the driver's executemany as tuples; SQLAlchemy's per-row bind
+#processing would cost twice the insert itself. Timestamps are stored in SQLAlchemy's format, and
+#roles by name, as the Enum column does.
+SQLITE_INSERT = (
+    "INSERT INTO auditevent (occurred_at, actor_id, actor_role, action, resource, patient_id, request_id) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+SQLITE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+#SQLite refuses to change or delete audit rows (server databases: revoke UPDATE/DELETE instead)
+SQLITE_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS auditevent_no_update BEFORE UPDATE ON auditevent "
+    "BEGIN SELECT RAISE(ABORT, 'the audit trail is append-only'); END",
+    "CREATE TRIGGER IF NOT EXISTS auditevent_no_delete BEFORE DELETE ON auditevent "
+    "BEGIN SELECT RAISE(ABORT, 'the audit trail is append-only'); END",
+]
+
+
+def create_audit_guards(conn):
+    if conn.dialect.name == "sqlite":
+        for statement in SQLITE_DDL:
+            conn.execute(text(statement))
+
+
+@event.listens_for(AuditEvent.__table__, "after_create")
+def _create_audit_guards_with_table(target, connection, **kw):
+    create_audit_guards(connection)
+
+
+class AuditTrail:
+    def __init__(self, engine, enabled: bool = AUDIT_TRAIL, buffer_size: int = AUDIT_BUFFER_SIZE,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_interval_ms: float = AUDIT_FLUSH_INTERVAL_MS):
+        self.engine = engine
+        self.enabled = enabled
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.interval = flush_interval_ms / 1000
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.flush_sizes = Histogram("audit_flush_size", "Audit events written per INSERT.", (), FLUSH_SIZE_BUCKETS)
+        self.flush_seconds = Histogram("audit_flush_seconds", "Time to write one batch of audit events.", (),
+                                       FLUSH_SECONDS_BUCKETS)
+        # One entry per record() call: (time, actor_id, actor_role, action, resource, patient_ids,
+        # request_id), expanded into one row per patient when written. Bounded by events, not entries.
+        self._buffer = deque()
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._thread = None
+        # Entries taken off the buffer whose write failed, retried before anything newer
+        self._pending = []
+        self._pending_events = 0
+
+    # Called by the handlers, from the event loop or a threadpool thread; never touches the
+    # database, and costs the same for a page of patients as for one. `actor` is the
+    # authenticated User (None for unauthenticated routes).
+    def record(self, actor, action: str, resource: str, patient_ids=(None,)):
+        if not self.enabled:
+            return
+        context = current_request.get()
+        request_id = context.request_id if context is not None else None
+        actor_id, actor_role = (actor.id, actor.role) if actor is not None else (None, None)
+        patient_ids = tuple(patient_ids)
+        if not patient_ids:
+            return
+        entry = (time.time(), actor_id, actor_role, action, resource, patient_ids, request_id)
+        with self._lock:
+            self._buffer.append(entry)
+            self._buffered += len(patient_ids)
+            self.recorded += len(patient_ids)
+            # Full: the oldest entries make room
+            while self._buffered > self.buffer_size:
+                dropped = len(self._buffer.popleft()[5])
+                self._buffered -= dropped
+                self.dropped += dropped
+            if self._buffered >= self.batch_size:
+                self._wake.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or not self.enabled:
+                return
+            self._closing = False
+            self._thread = threading.Thread(target=self._flusher, name="audit-flusher", daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _flusher(self):
+        dropped, attempts = 0, SHUTDOWN_FLUSH_ATTEMPTS
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            closing = self._closing
+            while self._flush_batch():
+                pass
+            if self.dropped != dropped:
+                logger.error("audit buffer full, %d events dropped", self.dropped - dropped)
+                dropped = self.dropped
+            if closing:
+                attempts -= 1
+                if not self._pending or not attempts:
+                    break
+        if self._pending:
+            logger.error("audit trail closed with %d events unwritten", self._pending_events + self._buffered)
+
+    # Writes the pending batch, or the next one off the buffer (about batch_size events). Returns
+    # whether a batch was written.
+    def _flush_batch(self) -> bool:
+        if not self._pending:
+            with self._lock:
+                while self._buffer and self._pending_events < self.batch_size:
+                    entry = self._buffer.popleft()
+                    self._pending.append(entry)
+                    self._pending_events += len(entry[5])
+                self._buffered -= self._pending_events
+            if not self._pending:
+                return False
+        sqlite = self.engine.dialect.name == "sqlite"
+        rows = list(self._rows(sqlite))
+        started = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                if sqlite:
+                    conn.exec_driver_sql(SQLITE_INSERT, rows)
+                else:
+                    conn.execute(insert(AuditEvent), rows)
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception("audit flush of %d events failed, retrying", self._pending_events)
+            return False
+        self.flush_seconds.observe((), time.perf_counter() - started)
+        self.flush_sizes.observe((), self._pending_events)
+        self.written += self._pending_events
+        self._pending, self._pending_events = [], 0
+        return True
+
+    # One row per patient of the pending entries: tuples for SQLITE_INSERT, dicts for Core
+    def _rows(self, sqlite: bool):
+        for at, actor_id, actor_role, action, resource, patient_ids, request_id in self._pending:
+            occurred_at = datetime.fromtimestamp(at, timezone.utc)
+            if sqlite:
+                occurred_at = occurred_at.strftime(SQLITE_TIMESTAMP_FORMAT)
+                role = actor_role.name if actor_role is not None else None
+                for patient_id in patient_ids:
+                    yield occurred_at, actor_id, role, action, resource, patient_id, request_id
+            else:
+                for patient_id in patient_ids:
+                    yield dict(occurred_at=occurred_at, actor_id=actor_id, actor_role=actor_role, action=action,
+                               resource=resource, patient_id=patient_id, request_id=request_id)
+
+    # Writes everything still buffered, then stops the flusher. Blocking: from the event loop,
+    # run it with asyncio.to_thread.
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._closing = True
+        if thread is not None:
+            self._wake.set()
+            thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = self._buffered + self._pending_events
+        return {
+            "enabled": self.enabled,
+            "recorded": self.recorded,
+            "written": self.written,
+            "buffered": buffered,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+        }
+
+    def render(self) -> list[str]:
+        stats = self.stats()
+        lines = []
+        for name, kind, value in (("audit_events_recorded_total", "counter", stats["recorded"]),
+                                  ("audit_events_written_total", "counter", stats["written"]),
+                                  ("audit_events_dropped_total", "counter", stats["dropped"]),
+                                  ("audit_events_buffered", "gauge", stats["buffered"])):
+            lines += [f"# TYPE {name} {kind}", f"{name} {value}"]
+        return lines + self.flush_sizes.render() + self.flush_seconds.render()
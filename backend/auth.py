@@ -17,5 +17,3 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 test_password = "hashman123"
-
-print(get_password_hash(test_password))
\ No newline at end of file
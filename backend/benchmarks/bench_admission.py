@@ -0,0 +1,134 @@
+# Load test: latency of the time-critical clinical routes (tPA checks, consultation writes, vitals
+# reads; critical in admission.py) while the app is saturated by user listings and /token logins.
+# The clinical probes arrive at a fixed rate, as clinicians' requests do, however slow the
+# responses get; the flood is FLOODERS clients each sending its next request as soon as the last
+# one is answered or shed, from a process of its own (sharing an event loop with the flood would
+# delay the probes on the client side). Three runs against a fresh server each: the probes alone,
+# with the flood and ADMISSION_CONTROL=false, with the flood and admission control on.
+# The flood process runs at `nice` (default 10): real clients don't share the server's CPU, and on a
+# small machine an unniced load generator starves the server itself; 0 shows that case.
+# Usage (from backend/): python benchmarks/bench_admission.py [flooders] [probes/s] [seconds] [nice]
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from load_test import SHED_STATUSES, SNAPSHOT_DIR, LoadTest, seed, start_server
+from metrics import percentiles
+
+DEFAULT_FLOODERS = 128
+DEFAULT_RATE = 40
+DEFAULT_SECONDS = 20
+DEFAULT_NICE = 10
+WARMUP_SECONDS = 3
+PORT = 8798
+
+CRITICAL = {"patient_tpa": 30, "tpa_eligibility": 10, "post_consultation": 20, "patient_vitals": 25, "worklist": 15}
+FLOOD = {"users_list": 60, "token": 40}
+
+
+async def flood(ready, base_url, accounts, clinician_headers, flooders, warmup, seconds):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        load_test = LoadTest(client, accounts, FLOOD, random.Random(2))
+        load_test.clinician_headers = clinician_headers
+        statuses = Counter()
+
+        async def flooder(deadline):
+            while time.perf_counter() < deadline:
+                route = load_test.rng.choices(load_test.routes, load_test.weights)[0]
+                method, url, options = load_test.request_for(route)
+                try:
+                    statuses[(await client.request(method, url, **options)).status_code] += 1
+                except httpx.HTTPError:
+                    statuses["failed"] += 1
+
+        warmed_up = time.perf_counter() + warmup
+        tasks = [asyncio.create_task(flooder(warmed_up + seconds)) for _ in range(flooders)]
+        await asyncio.sleep(warmup)
+        statuses.clear()
+        ready.set()
+        await asyncio.gather(*tasks)
+        return statuses
+
+
+def flood_process(results, ready, nice, *args):
+    os.nice(nice)
+    results.put(asyncio.run(flood(ready, *args)))
+
+
+async def probe(load_test, latencies, statuses):
+    route = load_test.rng.choices(load_test.routes, load_test.weights)[0]
+    method, url, options = load_test.request_for(route)
+    start = time.perf_counter()
+    try:
+        statuses[(await load_test.client.request(method, url, **options)).status_code] += 1
+    except httpx.HTTPError:
+        statuses["failed"] += 1
+    latencies.append(time.perf_counter() - start)
+
+
+async def run(database_url, accounts, admission, flooders, rate, seconds, nice):
+    os.environ["ADMISSION_CONTROL"] = "true" if admission else "false"
+    server = start_server(database_url, PORT, 1)
+    base_url = f"http://127.0.0.1:{PORT}"
+    flood_statuses = Counter()
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            clinical = LoadTest(client, accounts, CRITICAL, random.Random(1))
+            await clinical.prepare(0)
+            if flooders:
+                context = multiprocessing.get_context("spawn")
+                results, ready = context.Queue(), context.Event()
+                flooding = context.Process(target=flood_process, args=(
+                    results, ready, nice, base_url, accounts, clinical.clinician_headers, flooders, WARMUP_SECONDS,
+                    seconds))
+                flooding.start()
+                await asyncio.to_thread(ready.wait)
+            latencies, statuses, probes = [], Counter(), []
+            started = time.perf_counter()
+            for index in range(int(rate * seconds)):
+                await asyncio.sleep(max(0.0, started + index / rate - time.perf_counter()))
+                probes.append(asyncio.create_task(probe(clinical, latencies, statuses)))
+            await asyncio.gather(*probes)
+            if flooders:
+                flood_statuses = await asyncio.to_thread(results.get)
+                flooding.join()
+    finally:
+        server.terminate()
+        server.wait()
+    served = sum(count for status, count in flood_statuses.items() if status not in SHED_STATUSES)
+    shed = sum(flood_statuses[status] for status in SHED_STATUSES)
+    return latencies, statuses, served / seconds, shed / seconds
+
+
+def main(flooders, rate, seconds, nice):
+    database_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    accounts = seed(database_path, 5000, 10, SNAPSHOT_DIR)
+    print(f"critical probes at {rate}/s for {seconds} s; flood of {flooders} clients (GET /users/, POST /token) "
+          f"at nice {nice}")
+    print(f"{'run':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'failed':>8} {'flood ok/s':>11} "
+          f"{'flood shed/s':>13}")
+    for label, admission, clients in (("probes alone", True, 0), ("flood, admission off", False, flooders),
+                                      ("flood, admission on", True, flooders)):
+        latencies, statuses, served, shed = asyncio.run(
+            run(f"sqlite:///{database_path}", accounts, admission, clients, rate, seconds, nice))
+        summary = percentiles(sorted(latencies))
+        failed = sum(count for status, count in statuses.items() if status != 200)
+        print(f"{label:<26} {summary['p50']!s:>9} {summary['p95']!s:>9} {summary['p99']!s:>9} {failed:>8} "
+              f"{served:>11.1f} {shed:>13.1f}")
+
+
+if __name__ == "__main__":
+    args = [float(arg) for arg in sys.argv[1:]]
+    main(int(args[0]) if args else DEFAULT_FLOODERS, args[1] if len(args) > 1 else DEFAULT_RATE,
+         args[2] if len(args) > 2 else DEFAULT_SECONDS, int(args[3]) if len(args) > 3 else DEFAULT_NICE)
@@ -0,0 +1,77 @@
+# Benchmark: throughput of an async handler running its vitals query through the blocking
+# Session(engine) (the old path) vs the AsyncSession path, at increasing client concurrency.
+# Usage (from backend/): python benchmarks/bench_async_db.py [clients ...]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import Session, select
+
+import main
+from models import User, Vitals
+from metrics import percentiles
+
+DEFAULT_CLIENTS = [50, 200, 1000]
+REQUESTS_PER_CLIENT = 10
+PATIENTS = 1000
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/blocking/{user_id}/vitals")
+async def blocking_vitals(user_id: str):
+    with Session(main.engine) as session:
+        return session.exec(select(Vitals).where(Vitals.user_id == user_id)).first()
+
+
+@bench_app.get("/async/{user_id}/vitals")
+async def async_vitals(user_id: str, session: main.AsyncSessionDep):
+    return (await session.exec(select(Vitals).where(Vitals.user_id == user_id))).first()
+
+
+def seed():
+    with Session(main.engine) as session:
+        users = [User(name="p", username=f"p{i}", gender="Male", hashed_password="x", role="Patient")
+                 for i in range(PATIENTS)]
+        session.add_all(users)
+        session.add_all([Vitals(user_id=user.id, blood_pressure_systolic=140) for user in users])
+        session.commit()
+        return [user.id for user in users]
+
+
+async def client_loop(client, path, user_ids, offset, latencies):
+    for i in range(REQUESTS_PER_CLIENT):
+        user_id = user_ids[(offset + i) % len(user_ids)]
+        start = time.perf_counter()
+        response = await client.get(f"/{path}/{user_id}/vitals")
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+
+
+async def run(clients_list):
+    user_ids = seed()
+    transport = httpx.ASGITransport(app=bench_app)
+    limits = httpx.Limits(max_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits) as client:
+        for clients in clients_list:
+            for path in ("blocking", "async"):
+                latencies = []
+                start = time.perf_counter()
+                await asyncio.gather(*(client_loop(client, path, user_ids, n * REQUESTS_PER_CLIENT, latencies)
+                                       for n in range(clients)))
+                elapsed = time.perf_counter() - start
+                print(f"{clients:>5} clients  {path:<9} {len(latencies) / elapsed:9,.0f} req/s   "
+                      f"p50 {percentiles(sorted(latencies))['p50']:>9} ms   p99 {percentiles(sorted(latencies))['p99']:>9} ms")
+    await main.async_engine.dispose()
+
+
+if __name__ == "__main__":
+    clients_list = [int(arg) for arg in sys.argv[1:]] or DEFAULT_CLIENTS
+    asyncio.run(run(clients_list))
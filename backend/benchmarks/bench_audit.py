@@ -0,0 +1,136 @@
+# Benchmark: the PHI audit trail (audit.py).
+#  1. In process, against a SQLite file: what a handler pays per AuditTrail.record() call (one
+#     patient, a worklist page of 50, a cohort screening page of 1000), what writing each event in
+#     a transaction of its own would cost instead, and how many events/s the flusher writes.
+#  2. The "dashboard" load test (worklist, vitals, cohort tPA screening, logins) against the app
+#     with AUDIT_TRAIL=false and =true, alternating, ROUNDS times each (medians are reported: on a
+#     small machine single runs vary by 20%): per-route latency, and the audit rows in the table
+#     after each server was stopped with SIGTERM against the events it recorded (flush on shutdown).
+# Usage (from backend/): python benchmarks/bench_audit.py [concurrency] [seconds]
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+import httpx
+
+from load_test import SCENARIOS, SNAPSHOT_DIR, LoadTest, seed, start_server, summarize
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_SECONDS = 20
+WARMUP_SECONDS = 3
+ROUNDS = 3
+EVENTS = 200_000
+PAGE_SIZES = (1, 50, 1000)
+SYNC_WRITES = 2_000
+PORT = 8797
+
+
+def in_process():
+    from sqlalchemy import insert
+
+    from audit import AuditTrail
+    from database import create_db_engine
+    from migrations import migrate
+    from models import AuditEvent, Role
+
+    engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'audit.db')}")
+    migrate(engine)
+    actor = SimpleNamespace(id=str(uuid4()), role=Role.neurologist)
+    patients = [str(uuid4()) for _ in range(5000)]
+
+    trail = AuditTrail(engine, enabled=True, buffer_size=EVENTS * len(PAGE_SIZES))
+    trail.start()
+    record_us = {}
+    started = time.perf_counter()
+    for size in PAGE_SIZES:
+        calls = EVENTS // size
+        pages = [patients[i:i + size] for i in range(0, len(patients), size)]
+        start = time.perf_counter()
+        for i in range(calls):
+            trail.record(actor, "read", "worklist", pages[i % len(pages)])
+        record_us[size] = (time.perf_counter() - start) / calls * 1e6
+    while trail.written < trail.recorded:
+        time.sleep(0.01)
+    drained = time.perf_counter() - started
+    trail.close()
+
+    start = time.perf_counter()
+    for i in range(SYNC_WRITES):
+        with engine.begin() as conn:
+            conn.execute(insert(AuditEvent).values(occurred_at=datetime.now(timezone.utc), actor_id=actor.id, actor_role=actor.role,
+                                                   action="read", resource="vitals", patient_id=patients[i]))
+    synchronous = (time.perf_counter() - start) / SYNC_WRITES
+    engine.dispose()
+
+    for size, us in record_us.items():
+        print(f"record(), {size:>4} patients:     {us:8.2f} us")
+    print(f"own INSERT + commit per event: {synchronous * 1e6:8.0f} us")
+    print(f"flusher: {trail.written:,} events written, {trail.written / drained:,.0f} events/s "
+          f"({trail.flush_sizes.render()[-1].split()[-1]} INSERTs)")
+
+
+async def load(database_path, accounts, audit, concurrency, seconds):
+    os.environ["AUDIT_TRAIL"] = "true" if audit else "false"
+    server = start_server(f"sqlite:///{database_path}", PORT, 1)
+    try:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client:
+            load_test = LoadTest(client, accounts, SCENARIOS["dashboard"], random.Random(1))
+            await load_test.prepare(0)
+            await load_test.run(concurrency, WARMUP_SECONDS)
+            load_test.latencies.clear()
+            load_test.errors.clear()
+            elapsed = await load_test.run(concurrency, seconds)
+            recorded = (await client.get("/audit/stats", headers=load_test.clinician_headers[0])).json()["recorded"]
+    finally:
+        server.terminate()
+        server.wait()
+    routes, total = summarize(load_test.latencies, load_test.errors, load_test.shed, elapsed)
+    return routes, total, recorded
+
+
+def median(runs, route, field):
+    return round(statistics.median(routes.get(route, total)[field] if route != "TOTAL" else total[field]
+                                   for routes, total in runs), 2)
+
+
+def main(concurrency, seconds):
+    in_process()
+
+    database_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    accounts = seed(database_path, 5000, 10, SNAPSHOT_DIR)
+    runs = {False: [], True: []}
+    recorded = stored = 0
+    for _ in range(ROUNDS):
+        for audit in (False, True):
+            with sqlite3.connect(database_path) as conn:
+                before = conn.execute("SELECT COUNT(*) FROM auditevent").fetchone()[0]
+            routes, total, events = asyncio.run(load(database_path, accounts, audit, concurrency, seconds))
+            with sqlite3.connect(database_path) as conn:
+                stored += conn.execute("SELECT COUNT(*) FROM auditevent").fetchone()[0] - before
+            recorded += events if audit else 0
+            runs[audit].append((routes, total))
+
+    print(f"\ndashboard scenario, {concurrency} clients, {seconds} s per run, median of {ROUNDS} runs")
+    print(f"{'route':<17} {'p50 off':>9} {'p50 on':>9} {'p99 off':>9} {'p99 on':>9} {'req/s off':>10} {'req/s on':>10}")
+    for route in [*runs[True][0][0], "TOTAL"]:
+        print(f"{route:<17} {median(runs[False], route, 'p50_ms'):>9} {median(runs[True], route, 'p50_ms'):>9} "
+              f"{median(runs[False], route, 'p99_ms'):>9} {median(runs[True], route, 'p99_ms'):>9} "
+              f"{median(runs[False], route, 'throughput_rps'):>10} {median(runs[True], route, 'throughput_rps'):>10}")
+    print(f"audit events recorded {recorded:,}, in the table after SIGTERM {stored:,}")
+
+
+if __name__ == "__main__":
+    args = [float(arg) for arg in sys.argv[1:]]
+    main(int(args[0]) if args else DEFAULT_CONCURRENCY, args[1] if len(args) > 1 else DEFAULT_SECONDS)
@@ -0,0 +1,57 @@
+# Benchmark: the dashboard figures computed over every patient (one aggregate query, the best the
+# browser-side computation could do) vs read from the cohort rollups, at several cohort sizes, plus
+# what keeping the rollups current adds to each single-patient write.
+# Usage (from backend/): python benchmarks/bench_cohort_stats.py [patients ...]
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from cohort import generate_cohort
+from cohort_stats import contributions_statement, read_cohort_stats, track_cohort_stats
+from database import create_db_engine
+from migrations import migrate
+from models import Role, User
+
+DEFAULT_SIZES = [10_000, 50_000, 200_000]
+REPEATS = 7
+WRITES = 500
+
+
+def median_ms(fn, repeats=REPEATS):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run(size):
+    engine = create_db_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    migrate(engine)
+    generate_cohort(engine, size, hashed_password="x")
+    with engine.connect() as conn:
+        full = median_ms(lambda: conn.execute(contributions_statement()).all())
+        rollups = median_ms(lambda: read_cohort_stats(conn, Role.patient, "age_band"))
+        patient_ids = list(conn.execute(select(User.id).where(User.role == Role.patient).limit(WRITES)).scalars())
+    with engine.begin() as conn:
+        start = time.perf_counter()
+        for user_id in patient_ids:
+            with track_cohort_stats(conn, [user_id]):
+                pass
+        tracking = (time.perf_counter() - start) / len(patient_ids) * 1000
+    engine.dispose()
+    print(f"{size:>9,} {full:12.1f} {rollups:12.2f} {full / rollups:9.0f}x {tracking:14.2f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'patients':>9} {'full ms':>12} {'rollups ms':>12} {'speedup':>10} {'per write ms':>14}")
+    for size in sizes:
+        run(size)
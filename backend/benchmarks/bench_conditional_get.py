@@ -0,0 +1,71 @@
+# Benchmark: dashboard polling of the per-patient reads with the response cache cleared before
+# every request (the old rebuild-every-time path), with the cache warm, and with If-None-Match
+# answered by 304.
+# Usage (from backend/): python benchmarks/bench_conditional_get.py [polls]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "warning")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+import httpx
+from sqlmodel import Session
+
+import main
+from metrics import percentiles
+from models import LabResult, NeurologistConsultation, User, Vitals
+
+RESOURCES = ["", "/vitals", "/results", "/consultations"]
+
+
+async def poll(client, headers, patient_id, polls, mode):
+    etags = {}
+    latencies = []
+    for _ in range(polls):
+        for resource in RESOURCES:
+            if mode == "uncached":
+                main.response_cache.clear()
+            request_headers = dict(headers)
+            if mode == "304" and resource in etags:
+                request_headers["If-None-Match"] = etags[resource]
+            start = time.perf_counter()
+            response = await client.get(f"/users/{patient_id}{resource}", headers=request_headers)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code in (200, 304), response.text
+            etags[resource] = response.headers["etag"]
+    return sorted(latencies)
+
+
+async def run(polls):
+    main.create_db_and_tables()
+    with Session(main.engine) as session:
+        patient = User(name="p", username="p", age=70, gender="Male", hashed_password="x", role="Patient")
+        session.add(patient)
+        session.add(User(name="n", username="neuro", gender="Male", hashed_password="x", role="Neurologist"))
+        session.flush()
+        session.add(Vitals(user_id=patient.id, blood_pressure_systolic=170, chief_complaint="Left-sided weakness"))
+        session.add(LabResult(user_id=patient.id, cbc="normal", bmp_glucose=110))
+        for _ in range(5):
+            session.add(NeurologistConsultation(user_id=patient.id, diagnosis="Ischemic stroke",
+                                                treatment_plan="tPA recommended if no contraindications."))
+        session.commit()
+        patient_id = patient.id
+    headers = {"Authorization": f"Bearer {main.create_access_token({'sub': 'neuro'})}"}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await poll(client, headers, patient_id, 20, "warm")  # warm up imports and token cache
+        for mode in ("uncached", "cached", "304"):
+            start = time.perf_counter()
+            latencies = await poll(client, headers, patient_id, polls, mode)
+            elapsed = time.perf_counter() - start
+            stats = percentiles(latencies)
+            print(f"{mode:<9} {len(latencies) / elapsed:8,.0f} req/s   p50 {stats['p50']:6} ms   p99 {stats['p99']:6} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
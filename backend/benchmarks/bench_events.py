@@ -0,0 +1,105 @@
+# Benchmark: 1k concurrent /events subscribers (all patients, the ward view) on a real uvicorn
+# server, plus a few stalled clients that never read. Measures delivery latency from the start
+# of each POST /users/me/vitals until every live subscriber has received its event.
+# httpx.ASGITransport buffers streamed responses, so this talks HTTP over sockets instead.
+# Usage (from backend/): python benchmarks/bench_events.py [subscribers] [events]
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-bench-secret-key")
+
+import httpx
+from sqlmodel import Session
+
+import main
+from metrics import percentiles
+from models import User
+
+PORT = 8766
+STALLED = 10
+
+
+async def subscriber(token, received, ready):
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    writer.write(f"GET /events HTTP/1.1\r\nHost: bench\r\nAuthorization: Bearer {token}\r\n\r\n".encode())
+    await writer.drain()
+    ready.release()
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        if line.startswith(b"event: vitals"):
+            received.append(time.perf_counter())
+
+
+async def stalled_subscriber(token):
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    writer.write(f"GET /events HTTP/1.1\r\nHost: bench\r\nAuthorization: Bearer {token}\r\n\r\n".encode())
+    await writer.drain()
+    await asyncio.Event().wait()  # connected, never reads
+
+
+async def run(subscribers, events):
+    with Session(main.engine) as session:
+        session.add(User(name="p", username="p", age=70, gender="Male", hashed_password="x", role="Patient"))
+        session.add(User(name="n", username="neuro", gender="Male", hashed_password="x", role="Neurologist"))
+        session.commit()
+    clinician = main.create_access_token({"sub": "neuro"})
+    staff = {"Authorization": f"Bearer {clinician}"}
+    patient = {"Authorization": f"Bearer {main.create_access_token({'sub': 'p'})}"}
+
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=30) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/events/stats", headers=staff)
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+
+            received = []
+            ready = asyncio.Semaphore(0)
+            tasks = [asyncio.create_task(subscriber(clinician, received, ready)) for _ in range(subscribers)]
+            tasks += [asyncio.create_task(stalled_subscriber(clinician)) for _ in range(STALLED)]
+            for _ in range(subscribers):
+                await ready.acquire()
+            while (await client.get("/events/stats", headers=staff)).json()["subscribers"] < subscribers + STALLED:
+                await asyncio.sleep(0.1)
+
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(events):
+                received.clear()
+                sent_at = time.perf_counter()
+                await client.post("/users/me/vitals", json={"blood_pressure_systolic": 170}, headers=patient)
+                while len(received) < subscribers:
+                    await asyncio.sleep(0.001)
+                latencies.extend(at - sent_at for at in received)
+            elapsed = time.perf_counter() - start
+            stats = (await client.get("/events/stats", headers=staff)).json()
+            for task in tasks:
+                task.cancel()
+    finally:
+        server.terminate()
+
+    delivered = percentiles(sorted(latencies))
+    print(f"{subscribers:,} subscribers (+{STALLED} stalled)   {events} events   "
+          f"{subscribers * events / elapsed:9,.0f} deliveries/s   "
+          f"latency p50 {delivered['p50']} ms  p99 {delivered['p99']} ms   "
+          f"overflows {stats['overflows']}")
+
+
+if __name__ == "__main__":
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, 8192), hard))
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+                    int(sys.argv[2]) if len(sys.argv) > 2 else 50))
@@ -0,0 +1,54 @@
+# Benchmark: the clinical dataset export (export.py) per format at several cohort sizes: rows/sec,
+# and the peak Python memory allocated while exporting (tracemalloc, in a second pass), which should
+# stay flat as the row count grows. Parquet and Arrow are skipped when pyarrow isn't installed.
+# Usage (from backend/): python benchmarks/bench_export.py [patients ...]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cohort import generate_cohort
+from database import create_db_engine
+from export import EXPORT_MEDIA_TYPES, export_columns, export_statement, pyarrow, stream_export
+from migrations import migrate
+
+DEFAULT_SIZES = [20_000, 100_000]
+
+
+def export(engine, export_format):
+    columns = export_columns(None, export_format)
+    done = {}
+    size = 0
+    for chunk in stream_export(engine, export_statement(columns), columns, export_format,
+                               on_done=lambda rows, seconds: done.update(rows=rows)):
+        size += len(chunk)
+    return done["rows"], size
+
+
+def run(size):
+    engine = create_db_engine("sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    migrate(engine)
+    generate_cohort(engine, size, hashed_password="x")
+    for export_format in EXPORT_MEDIA_TYPES:
+        if export_format != "csv" and pyarrow is None:
+            continue
+        start = time.perf_counter()
+        rows, output = export(engine, export_format)
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        export(engine, export_format)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{size:>9,} {export_format:<8} {rows:>9,} {rows / elapsed:>10,.0f} {output / 1e6:>9.1f} "
+              f"{peak / 1e6:>9.1f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    print(f"{'patients':>9} {'format':<8} {'rows':>9} {'rows/s':>10} {'out MB':>9} {'peak MB':>9}")
+    for size in sizes:
+        run(size)
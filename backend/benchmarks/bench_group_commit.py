@@ -0,0 +1,115 @@
+# Benchmark: a surge of concurrent vitals submissions on SQLite, each handler committing its own
+# transaction (the default) vs the group-commit WriteCoordinator. Every write is what
+# POST /users/me/vitals does: append an observation, update the snapshot and re-evaluate the
+# stored tPA eligibility. Several worker processes write to one database file at once, as
+# under `server.py --workers N`. Reports writes/s, latency percentiles and failed writes
+# ("database is locked" once a write waits longer than SQLITE_BUSY_TIMEOUT_MS).
+# Usage (from backend/): python benchmarks/bench_group_commit.py [workers] [clients_per_worker] [writes_per_client]
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+PATIENTS = 2_000
+
+
+def seed(url):
+    from sqlalchemy import insert
+
+    from database import create_db_engine
+    from migrations import migrate
+    from models import Role, User
+
+    engine = create_db_engine(url)
+    migrate(engine)
+    ids = [str(uuid4()) for _ in range(PATIENTS)]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=user_id, name="Patient", username=f"{user_id}@bench.test", age=60,
+                                          gender="Male", hashed_password="x", role=Role.patient) for user_id in ids])
+    engine.dispose()
+    return ids
+
+
+def run_worker(url, mode, patient_ids, clients, writes, results):
+    from database import create_async_db_engine, create_db_engine
+    from eligibility import refresh_tpa_eligibility
+    from vitals_series import record_vitals_observations
+    from write_coordinator import WriteCoordinator
+
+    async def main():
+        engine, async_engine = create_db_engine(url), create_async_db_engine(url)
+        coordinator = WriteCoordinator(engine, async_engine, enabled=mode == "group_commit")
+        rng = random.Random(os.getpid())
+        latencies, errors = [], []
+
+        async def client():
+            for _ in range(writes):
+                user_id = rng.choice(patient_ids)
+
+                def write(conn):
+                    record_vitals_observations(conn, [{
+                        "user_id": user_id, "blood_pressure_systolic": rng.randint(100, 200),
+                        "blood_pressure_diastolic": rng.randint(60, 120), "heart_rate": rng.randint(50, 130),
+                        "oxygen_saturation": rng.randint(88, 100), "nihss_score": rng.randint(0, 20),
+                        "inr_score": round(rng.uniform(0.8, 3.0), 2),
+                    }])
+                    refresh_tpa_eligibility(conn, [user_id])
+
+                start = time.perf_counter()
+                try:
+                    await coordinator.run(write)
+                    latencies.append(time.perf_counter() - start)
+                except Exception as exc:
+                    errors.append(type(exc).__name__)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        await coordinator.close()
+        await async_engine.dispose()
+        engine.dispose()
+        results.put({"latencies": latencies, "errors": len(errors), "elapsed": elapsed})
+
+    asyncio.run(main())
+
+
+def run(mode, workers, clients, writes):
+    from metrics import percentiles
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    url = f"sqlite:///{path}"
+    patient_ids = seed(url)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=run_worker, args=(url, mode, patient_ids, clients, writes, results))
+                 for _ in range(workers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome["latencies"])
+    errors = sum(outcome["errors"] for outcome in outcomes)
+    stats = percentiles(latencies)
+    print(f"{mode:<13} {len(latencies) / max(outcome['elapsed'] for outcome in outcomes):9,.0f} writes/s   "
+          f"p50 {stats['p50']:8} ms   p95 {stats['p95']:8} ms   p99 {stats['p99']:8} ms   "
+          f"failed {errors:,}/{workers * clients * writes:,}   ({elapsed:.1f} s)")
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    writes = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    print(f"{workers} workers x {clients} concurrent clients x {writes} writes")
+    for mode in ("per_request", "group_commit"):
+        run(mode, workers, clients, writes)
@@ -0,0 +1,96 @@
+# Benchmark: write amplification and lookup cost of the legacy index set (index=True on
+# nearly every column) vs the index set from migration 2.
+# Usage (from backend/): python benchmarks/bench_indexes.py [patients]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlmodel import SQLModel, create_engine, insert
+
+from migrations import LEGACY_INDEXES
+from models import LabResult, NeurologistConsultation, Role, User, Vitals
+
+LOOKUPS = 2000
+
+
+def make_engine(legacy: bool):
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    if legacy:
+        with engine.begin() as conn:
+            for table, columns in LEGACY_INDEXES.items():
+                for column in columns:
+                    conn.execute(text(f"CREATE INDEX ix_{table}_{column} ON {table} ({column})"))
+            # the legacy schema had none of the new lookup indexes
+            for name in ("ix_user_username", "ix_user_role_id", "ix_labresult_user_id_created_at",
+                         "ix_neurologistconsultation_user_id"):
+                conn.execute(text(f"DROP INDEX {name}"))
+    return engine
+
+
+def insert_rows(engine, patients, rng):
+    user_ids = [str(uuid4()) for _ in range(patients)]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=user_id, name="p", username=user_id, gender="male",
+                                         hashed_password="x", role=Role.patient.name) for user_id in user_ids])
+
+    # One transaction per observation, like the POST handlers
+    now = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    for user_id in user_ids:
+        with engine.begin() as conn:
+            conn.execute(insert(Vitals), dict(
+                id=str(uuid4()), user_id=user_id, chief_complaint="Sudden weakness " * 4,
+                medical_history="Hypertension, atrial fibrillation", blood_pressure_systolic=rng.randint(100, 200),
+                blood_pressure_diastolic=rng.randint(60, 120), heart_rate=rng.randint(50, 120),
+                respiratory_rate=rng.randint(10, 24), oxygen_saturation=rng.randint(88, 100),
+                significant_head_trauma=False, recent_surgery=False, recent_myocardial_infarction=False,
+                recent_hemorrhage=False, platelet_count=rng.randint(50_000, 450_000),
+                nihss_score=rng.randint(0, 20), inr_score=rng.uniform(0.8, 3.5)))
+        for hours in range(3):
+            with engine.begin() as conn:
+                conn.execute(insert(LabResult), dict(
+                    id=str(uuid4()), user_id=user_id, cbc="normal", bmp_glucose=rng.uniform(40, 450),
+                    creatinine=rng.uniform(0.5, 2), coagulation="normal", created_at=now - timedelta(hours=hours)))
+        with engine.begin() as conn:
+            conn.execute(insert(NeurologistConsultation), dict(
+                id=str(uuid4()), user_id=user_id, tpa_approval=True, diagnosis="Ischemic stroke " * 4,
+                treatment_plan="tPA recommended if no contraindications."))
+    return user_ids, time.perf_counter() - start
+
+
+def lookups(engine, user_ids, rng):
+    sample = [rng.choice(user_ids) for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        for user_id in sample:
+            conn.execute(text("SELECT * FROM labresult WHERE user_id = :u ORDER BY created_at DESC LIMIT 1"),
+                         {"u": user_id}).first()
+            conn.execute(text("SELECT * FROM neurologistconsultation WHERE user_id = :u"), {"u": user_id}).all()
+            conn.execute(text('SELECT * FROM "user" WHERE username = :u'), {"u": user_id}).first()
+    return time.perf_counter() - start
+
+
+def run(patients):
+    for label, legacy in (("legacy", True), ("current", False)):
+        rng = random.Random(7)
+        engine = make_engine(legacy)
+        with engine.connect() as conn:
+            index_count = conn.execute(text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'")).scalar()
+        user_ids, insert_time = insert_rows(engine, patients, rng)
+        lookup_time = lookups(engine, user_ids, rng)
+        size = os.path.getsize(engine.url.database)
+        print(f"{label:<8} indexes {index_count:>3}   inserts {patients * 5 / insert_time:8,.0f} rows/s   "
+              f"lookups {LOOKUPS / lookup_time:8,.0f} patients/s   file {size / 1e6:6.1f} MB")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,94 @@
+# Benchmark: streamed bulk ingest of lab results, as NDJSON or as one JSON array — throughput and
+# memory growth.
+# The app is driven over raw ASGI rather than httpx.ASGITransport, which buffers the whole
+# response body client-side and would hide whether the server itself stays flat.
+# Usage (from backend/): python benchmarks/bench_ingest.py [rows] [ndjson|json]
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "warning")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from sqlmodel import Session
+
+import main
+from models import User
+
+PATIENTS = 1000
+ROWS_PER_BODY_CHUNK = 100
+MEDIA_TYPES = {"ndjson": b"application/x-ndjson", "json": b"application/json"}
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def body_chunks(user_ids, rows, body_format):
+    array = body_format == "json"
+    if array:
+        yield b"["
+    for start in range(0, rows, ROWS_PER_BODY_CHUNK):
+        yield b"".join(
+            ((b"," if array and i else b"")
+             + json.dumps({"user_id": user_ids[i % len(user_ids)], "cbc": "normal", "bmp_glucose": 90 + i % 50,
+                           "creatinine": 1.0, "coagulation": "normal"}).encode()
+             + b"\n")
+            for i in range(start, min(start + ROWS_PER_BODY_CHUNK, rows))
+        )
+    if array:
+        yield b"]"
+
+
+async def run(rows, body_format):
+    main.create_db_and_tables()
+    with Session(main.engine) as session:
+        users = [User(name="p", username=f"p{i}", gender="Male", hashed_password="x", role="Patient")
+                 for i in range(PATIENTS)]
+        session.add_all(users)
+        session.add(User(name="n", username="neuro", gender="Male", hashed_password="x", role="Neurologist"))
+        session.commit()
+        user_ids = [user.id for user in users]
+    token = main.create_access_token({"sub": "neuro"})
+
+    chunks = body_chunks(user_ids, rows, body_format)
+    body_done = False
+
+    async def receive():
+        nonlocal body_done
+        if body_done:
+            await asyncio.Event().wait()  # the client never disconnects
+        chunk = next(chunks, None)
+        if chunk is None:
+            body_done = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    created = 0
+
+    async def send(message):
+        nonlocal created
+        if message["type"] == "http.response.body":
+            created += message.get("body", b"").count(b'"created"')
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/ingest/results", "raw_path": b"/ingest/results", "query_string": b"",
+             "root_path": "", "client": ("127.0.0.1", 0), "server": ("bench", 80),
+             "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode()),
+                         (b"content-type", MEDIA_TYPES[body_format])]}
+
+    rss_before = max_rss_mb()
+    start = time.perf_counter()
+    await main.app(scope, receive, send)
+    elapsed = time.perf_counter() - start
+    print(f"{body_format:<6} {rows:>9,} rows   {created:>9,} created   {rows / elapsed:9,.0f} rows/s   "
+          f"max RSS {rss_before:6.1f} -> {max_rss_mb():6.1f} MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000, sys.argv[2] if len(sys.argv) > 2 else "ndjson"))
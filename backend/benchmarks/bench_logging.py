@@ -0,0 +1,83 @@
+# Benchmark: the old per-request print(user) against the queue-based structured logging, with
+# the process output piped to a reader that keeps up, and to one that falls behind like a
+# congested log shipper (~200 KB/s). Threads stand in for the threadpool that runs the sync
+# endpoints; each "request" does ~0.5 ms of work and logs one line. Output is unbuffered, as
+# in a container with PYTHONUNBUFFERED=1.
+# Usage (from backend/): python benchmarks/bench_logging.py [threads] [requests_per_thread]
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+READERS = {
+    "fast sink": "import sys\nwhile sys.stdin.buffer.read1(65536):\n    pass\n",
+    "slow sink": "import sys, time\nwhile sys.stdin.buffer.read1(4096):\n    time.sleep(0.02)\n",
+}
+
+
+def run_mode(mode, threads, requests):
+    import logging
+
+    from metrics import percentiles
+    from models import User
+
+    user = User(id="0d5b0f6e-2c5c-4e8f-9a57-5a1f8f3e0b2a", name="John Doe", username="john@example.com", age=71,
+                gender="Male", role="Patient", hashed_password="$2b$12$" + "x" * 53)
+    if mode == "logging":
+        from logs import configure_logging
+        configure_logging(stream=sys.stdout)
+    logger = logging.getLogger("bench")
+    latencies = [[] for _ in range(threads)]
+
+    def worker(samples):
+        for _ in range(requests):
+            start = time.perf_counter()
+            sum(range(20000))  # the request's own work
+            if mode == "print":
+                print(user, flush=True)
+            else:
+                logger.info("user lookup", extra={"username": user.username, "found": True})
+            samples.append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(samples,)) for samples in latencies]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stats = percentiles(sorted(sample for samples in latencies for sample in samples))
+    result = {"mode": mode, "throughput": threads * requests / elapsed, **stats}
+    if mode == "logging":
+        from logs import logging_stats
+        result["dropped"] = logging_stats()["dropped"]
+    sys.stderr.write(json.dumps(result) + "\n")
+
+
+def main(threads, requests):
+    for sink, reader_code in READERS.items():
+        for mode in ("print", "logging"):
+            run_against(sink, reader_code, mode, threads, requests)
+
+
+def run_against(sink, reader_code, mode, threads, requests):
+    reader = subprocess.Popen([sys.executable, "-c", reader_code], stdin=subprocess.PIPE)
+    bench = subprocess.run([sys.executable, __file__, "--mode", mode, str(threads), str(requests)],
+                           stdout=reader.stdin, stderr=subprocess.PIPE, text=True)
+    reader.stdin.close()
+    reader.kill()
+    result = json.loads(bench.stderr.strip().splitlines()[-1])
+    dropped = f"   dropped {result['dropped']:,}" if "dropped" in result else ""
+    print(f"{sink:<10} {mode:<8} {result['throughput']:9,.0f} req/s   p50 {result['p50']:7} ms   "
+          f"p99 {result['p99']:7} ms{dropped}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--mode"]:
+        run_mode(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 16, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
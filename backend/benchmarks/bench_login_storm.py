@@ -0,0 +1,74 @@
+# Load test: p99 of a regular endpoint while a burst of /token logins is in flight,
+# with bcrypt inline on the event loop vs on the password hashing pool.
+# Usage (from backend/): python benchmarks/bench_login_storm.py [logins] [probes]
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+import httpx
+
+import main
+from metrics import percentiles
+from password_pool import PasswordHashingPool
+
+PASSWORD = "storm-password"
+
+
+async def probe_latencies(client, headers, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.get("/worklist", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+        await asyncio.sleep(0.005)
+    return sorted(latencies)
+
+
+async def login(client):
+    response = await client.post("/token", data={"username": "storm@example.com", "password": PASSWORD})
+    return response.status_code
+
+
+async def run_mode(client, headers, pool, logins, probes):
+    main.password_pool = pool
+    quiet = await probe_latencies(client, headers, probes)
+
+    start = time.perf_counter()
+    storm = asyncio.gather(*(login(client) for _ in range(logins)))
+    loaded = await probe_latencies(client, headers, probes)
+    statuses = await storm
+    elapsed = time.perf_counter() - start
+
+    print(f"{'pool' if pool.size else 'inline':<7} quiet p99 {percentiles(quiet)['p99']:>8} ms   "
+          f"storm p99 {percentiles(loaded)['p99']:>8} ms   "
+          f"logins ok {statuses.count(200)}/{logins} (503: {statuses.count(503)}) in {elapsed:.2f}s")
+
+
+async def run(logins, probes):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for username, role in (("storm@example.com", "Patient"), ("probe@example.com", "Neurologist")):
+            await client.post("/users", json={"name": username, "username": username, "age": 50,
+                                              "gender": "Female", "password": PASSWORD, "role": role})
+        response = await client.post("/token", data={"username": "probe@example.com", "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        inline = PasswordHashingPool(main.pwd_context, size=0, queue_limit=0)
+        pooled = PasswordHashingPool(main.pwd_context, size=main.PASSWORD_POOL_SIZE,
+                                     queue_limit=main.PASSWORD_POOL_QUEUE_LIMIT)
+        await run_mode(client, headers, inline, logins, probes)
+        await run_mode(client, headers, pooled, logins, probes)
+        print("pool stats:", pooled.stats())
+        pooled.shutdown()
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    probes = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    asyncio.run(run(logins, probes))
@@ -0,0 +1,63 @@
+# Benchmark: latency of a deep /users/role/Patient-style page with OFFSET vs a keyset cursor,
+# and time-to-first-row / memory of streaming the whole listing through a server-side cursor.
+# Usage (from backend/): python benchmarks/bench_pagination.py [patients]
+import os
+import resource
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel, insert, select
+
+from database import create_db_engine
+from models import Role, User, UserPublic
+from pagination import stream_ndjson
+
+PAGE = 100
+REPEATS = 20
+
+
+def populated_engine(patients):
+    engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=str(uuid4()), name="p", username=f"p{i}", gender="Male",
+                                         hashed_password="x", role=Role.patient) for i in range(patients)])
+    return engine
+
+
+def timed_ms(func):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        func()
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def main(patients):
+    engine = populated_engine(patients)
+    statement = select(User).where(User.role == Role.patient).order_by(User.id)
+    with Session(engine) as session:
+        ids = session.exec(select(User.id).where(User.role == Role.patient).order_by(User.id)).all()
+        for depth in (0.01, 0.5, 0.99):
+            offset = int(len(ids) * depth)
+            offset_ms = timed_ms(lambda: session.exec(statement.offset(offset).limit(PAGE)).all())
+            keyset_ms = timed_ms(lambda: session.exec(statement.where(User.id > ids[offset - 1]).limit(PAGE)).all())
+            print(f"page at {offset:>9,}   offset {offset_ms:8.2f} ms   keyset {keyset_ms:8.2f} ms")
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    lines = stream_ndjson(engine, select(User).where(User.role == Role.patient), User.id, None, UserPublic)
+    next(lines)
+    first_row_ms = (time.perf_counter() - start) * 1000
+    count = 1 + sum(1 for _ in lines)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"stream {count:,} rows   first row {first_row_ms:.1f} ms   total {elapsed:.2f} s   "
+          f"max RSS {rss_before:.1f} -> {rss_after:.1f} MB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
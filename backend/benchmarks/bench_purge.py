@@ -0,0 +1,63 @@
+# Benchmark: the old per-user delete_all_users loop (three child DELETEs plus session.delete
+# per user, one request-long transaction) vs purge_users (batched set-based DELETEs on user,
+# children removed by ON DELETE CASCADE).
+# Usage (from backend/): python benchmarks/bench_purge.py [users]
+import os
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel, delete, insert, select
+
+from database import create_db_engine
+from models import LabResult, NeurologistConsultation, Role, User, Vitals
+from purge import purge_users
+
+
+def populated_engine(users):
+    engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    user_ids = [str(uuid4()) for _ in range(users)]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=user_id, name="p", username=user_id, gender="Male",
+                                         hashed_password="x", role=Role.patient) for user_id in user_ids])
+        conn.execute(insert(Vitals), [dict(id=str(uuid4()), user_id=user_id) for user_id in user_ids])
+        conn.execute(insert(LabResult), [dict(id=str(uuid4()), user_id=user_id, cbc="normal")
+                                         for user_id in user_ids])
+        conn.execute(insert(NeurologistConsultation), [dict(id=str(uuid4()), user_id=user_id, diagnosis="x")
+                                                       for user_id in user_ids])
+    return engine
+
+
+def per_user_loop(engine):
+    with Session(engine) as session:
+        users = session.exec(select(User)).all()
+        for user in users:
+            session.exec(delete(Vitals).where(Vitals.user_id == user.id))
+            session.exec(delete(LabResult).where(LabResult.user_id == user.id))
+            session.exec(delete(NeurologistConsultation).where(NeurologistConsultation.user_id == user.id))
+            session.delete(user)
+        session.commit()
+        return len(users)
+
+
+def remaining_rows(engine):
+    with Session(engine) as session:
+        return sum(len(session.exec(select(table.id)).all())
+                   for table in (User, Vitals, LabResult, NeurologistConsultation))
+
+
+def main(users):
+    for name, purge in (("per-user loop", per_user_loop), ("purge_users", purge_users)):
+        engine = populated_engine(users)
+        start = time.perf_counter()
+        deleted = purge(engine)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14} {deleted:>8,} users   {elapsed:8.2f} s   rows left {remaining_rows(engine)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,130 @@
+# Benchmark: clinical full-text search (search.py) over 1M notes (one vitals snapshot and one
+# consultation per patient) vs what it replaces: fetching every note and matching in Python, and a
+# LIKE '%term%' scan in SQL. Notes are written through the normal tables, so the FTS5 triggers
+# index them; the load rate is reported too. Latencies are medians over REPEATS runs.
+# Usage (from backend/): python benchmarks/bench_search.py [notes]
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, or_, select, text
+
+from database import create_db_engine
+from migrations import migrate
+from models import NeurologistConsultation, Role, User, Vitals
+from search import search_patients
+
+DEFAULT_NOTES = 1_000_000
+CHUNK_SIZE = 20_000
+REPEATS = 5
+
+COMPLAINTS = ["sudden weakness", "slurred speech", "facial droop", "severe headache", "vision loss",
+              "dizziness", "confusion", "numbness in the left arm", "loss of balance", "aphasia"]
+HISTORY = ["hypertension", "type 2 diabetes", "hyperlipidemia", "prior stroke", "smoker",
+           "atrial fibrillation", "coronary artery disease", "chronic kidney disease", "migraine",
+           "obesity", "sleep apnea", "carotid stenosis", "on warfarin", "on apixaban"]
+DIAGNOSES = ["ischemic stroke", "hemorrhagic stroke", "transient ischemic attack", "stroke mimic",
+             "cardioembolic stroke", "lacunar infarct", "large vessel occlusion"]
+PLANS = ["tPA if no contraindications", "thrombectomy", "antiplatelet therapy", "anticoagulation",
+         "blood pressure control", "admit to stroke unit", "repeat imaging in 24 hours"]
+# Rare words (a few hundred notes each), so the searches span common to rare terms
+RARE = [f"moyamoya{i}" for i in range(2000)]
+
+QUERIES = [
+    ("common term", "stroke", None),
+    ("two-word phrase", "atrial fibrillation", None),
+    ("short prefix", "hyp", None),
+    ("field-restricted", "warfarin", ["medical_history"]),
+    ("rare term", "moyamoya1234", None),
+]
+
+
+def note(rng, phrases, count):
+    words = rng.sample(phrases, count)
+    if rng.random() < 0.2:
+        words.append(rng.choice(RARE))
+    return ", ".join(words)
+
+
+def load(engine, notes, rng):
+    patients = notes // 2
+    start = time.perf_counter()
+    for offset in range(0, patients, CHUNK_SIZE):
+        users, vitals, consultations = [], [], []
+        for _ in range(min(CHUNK_SIZE, patients - offset)):
+            user_id = str(uuid4())
+            users.append(dict(id=user_id, name="Patient", username=user_id, age=rng.randint(20, 95),
+                              gender="Male", hashed_password="x", role=Role.patient))
+            vitals.append(dict(id=str(uuid4()), user_id=user_id, chief_complaint=note(rng, COMPLAINTS, 2),
+                               medical_history=note(rng, HISTORY, 3)))
+            consultations.append(dict(id=str(uuid4()), user_id=user_id, diagnosis=note(rng, DIAGNOSES, 1),
+                                      treatment_plan=note(rng, PLANS, 2)))
+        with engine.begin() as conn:
+            conn.execute(insert(User), users)
+            conn.execute(insert(Vitals), vitals)
+            conn.execute(insert(NeurologistConsultation), consultations)
+    return patients * 2 / (time.perf_counter() - start)
+
+
+def median_ms(fn):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def python_scan(conn, query):
+    # The old way: fetch every note, match in Python
+    words = query.split()
+    matches = set()
+    for table, fields in ((Vitals, ("chief_complaint", "medical_history")),
+                          (NeurologistConsultation, ("diagnosis", "treatment_plan"))):
+        for row in conn.execute(select(table.user_id, *[getattr(table, field) for field in fields])):
+            body = " ".join(value or "" for value in row[1:]).lower()
+            if all(word in body for word in words):
+                matches.add(row[0])
+    return matches
+
+
+def like_scan(conn, query):
+    pattern = f"%{query}%"
+    return conn.execute(
+        select(Vitals.user_id).where(or_(Vitals.chief_complaint.like(pattern), Vitals.medical_history.like(pattern)))
+        .union(select(NeurologistConsultation.user_id).where(or_(
+            NeurologistConsultation.diagnosis.like(pattern), NeurologistConsultation.treatment_plan.like(pattern))))
+        .limit(20)
+    ).all()
+
+
+def main(notes):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_db_engine(f"sqlite:///{path}")
+    migrate(engine)
+    rate = load(engine, notes, random.Random(42))
+    print(f"{notes:,} notes indexed through the triggers at {rate:,.0f} notes/s, "
+          f"database {os.path.getsize(path) / 1e6:,.0f} MB")
+    with engine.connect() as conn:
+        matching = conn.execute(text("SELECT COUNT(*) FROM clinical_search WHERE clinical_search MATCH '\"stroke\"*'")).scalar()
+        print(f"'stroke' matches {matching:,} notes")
+        print(f"{'query':<18} {'q':<22} {'fts p50 ms':>11} {'100 hits ms':>12} {'LIKE ms':>10}")
+        for label, query, fields in QUERIES:
+            fts = median_ms(lambda: search_patients(conn, query, fields, limit=20))
+            deep = median_ms(lambda: search_patients(conn, query, fields, limit=100))
+            like = median_ms(lambda: like_scan(conn, query))
+            print(f"{label:<18} {query:<22} {fts:11.1f} {deep:12.1f} {like:10.1f}")
+        start = time.perf_counter()
+        python_scan(conn, "atrial fibrillation")
+        print(f"python full scan for 'atrial fibrillation': {(time.perf_counter() - start) * 1000:,.0f} ms")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NOTES)
@@ -0,0 +1,83 @@
+# Benchmark: serialization cost per route on the default path (ORM objects, validated and
+# serialized again through response_model / TypeAdapter) vs FAST_RESPONSES (public columns
+# only, row tuples encoded directly) at 1k and 10k items. The response cache is cleared before
+# every request so each one builds its body; both paths must return identical bytes.
+# Usage (from backend/): python benchmarks/bench_serialization.py [repeats]
+import os
+import statistics
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("SECRET_KEY", "bench-secret-key-with-enough-length")
+os.environ.setdefault("LOG_LEVEL", "warning")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import fast_responses
+import main
+from models import NeurologistConsultation, Role, User
+
+SIZES = [1_000, 10_000]
+
+
+def seed():
+    users = [dict(id=str(uuid4()), name=f"Patient {i}", username=f"patient{i}@bench.test", age=20 + i % 70,
+                  gender="Female" if i % 2 else "Male", hashed_password="x", role=Role.patient)
+             for i in range(max(SIZES))]
+    users.append(dict(id=str(uuid4()), name="Dr. Bench", username="doctor@bench.test", age=50, gender="Male",
+                      hashed_password="x", role=Role.doctor))
+    with main.engine.begin() as conn:
+        conn.execute(insert(User), users)
+        for size, user in zip(SIZES, users):
+            conn.execute(insert(NeurologistConsultation), [
+                dict(id=str(uuid4()), user_id=user["id"], tpa_approval=i % 3 == 0, diagnosis="Ischemic stroke",
+                     treatment_plan="tPA if no contraindications; recheck NIHSS every 15 minutes")
+                for i in range(size)
+            ])
+    return users
+
+
+def routes(users):
+    yield "/users/role/{role}", 1_000, "/users/role/Patient?limit=1000"
+    yield "/users/role/{role}", 10_000, "/users/role/Patient?stream=true"
+    for size, user in zip(SIZES, users):
+        yield "/users/{user_id}/consultations", size, f"/users/{user['id']}/consultations"
+
+
+def measure(client, url, headers, repeats):
+    samples, body = [], None
+    for _ in range(repeats):
+        main.response_cache.clear()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+        body = response.content
+    return statistics.median(samples), body
+
+
+def main_(repeats):
+    with TestClient(main.app) as client:
+        users = seed()
+        headers = {"Authorization": f"Bearer {main.create_access_token({'sub': 'doctor@bench.test'})}"}
+        print(f"{'route':<32} {'items':>7} {'default ms':>11} {'fast ms':>9} {'speedup':>8}")
+        for route, size, url in routes(users):
+            timings, bodies = [], []
+            for fast in (False, True):
+                fast_responses.FAST_RESPONSES = fast
+                measure(client, url, headers, 1)
+                elapsed, body = measure(client, url, headers, repeats)
+                timings.append(elapsed)
+                bodies.append(body)
+            assert bodies[0] == bodies[1], f"{url}: the fast path changed the response body"
+            print(f"{route:<32} {size:>7,} {timings[0] * 1000:11.1f} {timings[1] * 1000:9.1f} "
+                  f"{timings[0] / timings[1]:7.1f}x")
+
+
+if __name__ == "__main__":
+    main_(int(sys.argv[1]) if len(sys.argv) > 1 else 7)
@@ -0,0 +1,118 @@
+# Benchmark: scalar is_eligible_for_tpa loop vs the set-based backfill and reading the stored
+# eligibility (eligibility.py), plus one patient's check: the three lookups and the
+# scalar function the endpoint used to run, against one primary-key read of the stored row.
+# Usage (from backend/): python benchmarks/bench_tpa_screening.py [rows ...]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, SQLModel, create_engine, insert, select
+
+from eligibility import refresh_all_tpa_eligibility
+from models import LabResult, Role, TpaEligibility, User, Vitals
+from utils import is_eligible_for_tpa
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+LOOKUPS = 2_000
+CHUNK_SIZE = 50_000
+
+
+def build_cohort(engine, size, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        for start in range(0, size, CHUNK_SIZE):
+            users, vitals, labs = [], [], []
+            for _ in range(start, min(start + CHUNK_SIZE, size)):
+                user_id = str(uuid4())
+                users.append(dict(id=user_id, name="Patient", username=user_id, age=rng.randint(12, 95),
+                                  gender="male", hashed_password="x", role=Role.patient.name))
+                vitals.append(dict(
+                    id=str(uuid4()), user_id=user_id,
+                    blood_pressure_systolic=rng.randint(100, 200), blood_pressure_diastolic=rng.randint(60, 120),
+                    oxygen_saturation=rng.randint(88, 100),
+                    significant_head_trauma=rng.random() < 0.05, recent_surgery=rng.random() < 0.05,
+                    recent_myocardial_infarction=rng.random() < 0.05, recent_hemorrhage=rng.random() < 0.05,
+                    platelet_count=rng.randint(50_000, 450_000), nihss_score=rng.randint(0, 20),
+                    inr_score=round(rng.uniform(0.8, 3.5), 2),
+                ))
+                labs.append(dict(id=str(uuid4()), user_id=user_id, bmp_glucose=rng.uniform(40, 450),
+                                 coagulation=rng.choice(["normal", "abnormal"]), created_at=now))
+            conn.execute(insert(User), users)
+            conn.execute(insert(Vitals), vitals)
+            conn.execute(insert(LabResult), labs)
+
+
+def screen_scalar(engine):
+    # Load the ORM rows once, then run the per-patient Python checks
+    with Session(engine) as session:
+        patients = session.exec(
+            select(User).options(selectinload(User.vitals), selectinload(User.lab_results))
+        ).all()
+        return {p.id: is_eligible_for_tpa(p.vitals, p.lab_results, p) for p in patients}
+
+
+def screen_stored(engine):
+    with Session(engine) as session:
+        return dict(session.exec(select(TpaEligibility.user_id, TpaEligibility.eligible)).all())
+
+
+def check_computed(session, user_id):
+    user = session.get(User, user_id)
+    vitals = session.exec(select(Vitals).where(Vitals.user_id == user_id)).first()
+    lab_result = session.exec(select(LabResult).where(LabResult.user_id == user_id)).first()
+    return is_eligible_for_tpa(vitals, lab_result, user)
+
+
+def check_stored(session, user_id):
+    return session.get(TpaEligibility, user_id).eligible
+
+
+def run(size):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    build_cohort(engine, size)
+
+    results = {}
+    start = time.perf_counter()
+    results["scalar"] = screen_scalar(engine)
+    elapsed = time.perf_counter() - start
+    print(f"{size:>9,} rows  {'scalar':<11} {elapsed:8.3f}s  {size / elapsed:12,.0f} rows/s")
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        refresh_all_tpa_eligibility(conn)
+    elapsed = time.perf_counter() - start
+    print(f"{size:>9,} rows  {'backfill':<11} {elapsed:8.3f}s  {size / elapsed:12,.0f} rows/s  (once)")
+    start = time.perf_counter()
+    results["stored"] = screen_stored(engine)
+    elapsed = time.perf_counter() - start
+    print(f"{size:>9,} rows  {'stored':<11} {elapsed:8.3f}s  {size / elapsed:12,.0f} rows/s")
+
+    assert results["stored"] == results["scalar"], "stored eligibility disagrees with is_eligible_for_tpa"
+
+    user_ids = random.Random(7).sample(sorted(results["stored"]), min(LOOKUPS, size))
+    for name, check in (("check", check_computed), ("check_stored", check_stored)):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            for user_id in user_ids:
+                assert check(session, user_id) == results["stored"][user_id]
+                session.expunge_all()
+            elapsed = time.perf_counter() - start
+        print(f"{size:>9,} rows  {name:<12} {elapsed / len(user_ids) * 1e6:7.0f} us/patient")
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
@@ -0,0 +1,74 @@
+# Benchmark: vitals series reads — a 1-hour range query, a 24-hour downsample into 15-minute
+# buckets, and the current-vitals snapshot lookup, for patients with a day of per-minute
+# observations each.
+# Usage (from backend/): python benchmarks/bench_vitals_series.py [patients]
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session, SQLModel, insert, select
+
+from database import create_db_engine
+from models import Role, User, Vitals, VitalsObservation
+from vitals_series import downsample, vitals_range_statement
+
+OBSERVATIONS_PER_PATIENT = 24 * 60
+REPEATS = 50
+START = datetime(2026, 10, 17, tzinfo=timezone.utc)
+
+
+def populated_engine(patients, rng):
+    engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    user_ids = [str(uuid4()) for _ in range(patients)]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [dict(id=user_id, name="p", username=user_id, gender="Male",
+                                         hashed_password="x", role=Role.patient) for user_id in user_ids])
+        conn.execute(insert(Vitals), [dict(id=str(uuid4()), user_id=user_id, blood_pressure_systolic=150,
+                                           observed_at=START + timedelta(days=1)) for user_id in user_ids])
+        for user_id in user_ids:
+            conn.execute(insert(VitalsObservation), [
+                dict(user_id=user_id, observed_at=START + timedelta(minutes=minute),
+                     blood_pressure_systolic=rng.randint(120, 190), blood_pressure_diastolic=rng.randint(70, 115),
+                     heart_rate=rng.randint(55, 120), nihss_score=rng.randint(0, 20))
+                for minute in range(OBSERVATIONS_PER_PATIENT)
+            ])
+    return engine, user_ids
+
+
+def timed_ms(func):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func()
+    return (time.perf_counter() - start) / REPEATS * 1000, result
+
+
+def main(patients):
+    rng = random.Random(7)
+    engine, user_ids = populated_engine(patients, rng)
+    user_id = user_ids[len(user_ids) // 2]
+    with Session(engine) as session:
+        range_ms, rows = timed_ms(lambda: session.exec(
+            vitals_range_statement(user_id, START + timedelta(hours=12), START + timedelta(hours=13))).all())
+        print(f"1 h range query        {range_ms:8.2f} ms   {len(rows)} observations")
+
+        downsample_ms, buckets = timed_ms(lambda: downsample(
+            session.exec(vitals_range_statement(user_id, START, START + timedelta(days=1))),
+            timedelta(minutes=15), origin=START))
+        print(f"24 h -> 15 min buckets {downsample_ms:8.2f} ms   {len(buckets)} buckets")
+
+        current_ms, _ = timed_ms(lambda: session.exec(select(Vitals).where(Vitals.user_id == user_id)).first())
+        print(f"current vitals         {current_ms:8.2f} ms")
+
+    print(f"{patients * OBSERVATIONS_PER_PATIENT:,} observations, "
+          f"{os.path.getsize(engine.url.database) / (patients * OBSERVATIONS_PER_PATIENT):.0f} bytes/observation on disk")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
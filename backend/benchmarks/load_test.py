@@ -0,0 +1,340 @@
+# Load test: boots the app with uvicorn against a local SQLite file holding a synthetic cohort
+# (cohort.py, restored from a snapshot after the first run), replays a weighted mix of real routes
+# at a fixed concurrency, reports throughput and p50/p95/p99 per route, and saves the run as JSON. With --compare it diffs against an earlier run and exits 1 on a regression.
+#
+# Usage (from backend/):
+#   python benchmarks/load_test.py                                  # "mixed" scenario, 16 clients, 20 s
+#   python benchmarks/load_test.py --scenario dashboard --concurrency 64 --duration 60
+#   python benchmarks/load_test.py --output before.json
+#   python benchmarks/load_test.py --compare before.json --threshold 0.15
+#   python benchmarks/load_test.py --url http://staging:8000 --accounts accounts.json   # an already running server
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+SNAPSHOT_DIR = os.path.join(BACKEND_DIR, "benchmarks", "snapshots")
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+from cohort import COHORT_PASSWORD as PASSWORD
+
+# Route weights per scenario; each request picks one route at random with these weights
+SCENARIOS = {
+    # clinicians polling their dashboards
+    "dashboard": {"worklist": 60, "patient_vitals": 25, "tpa_eligibility": 10, "token": 5},
+    # patients and monitors submitting data
+    "writes": {"post_vitals": 50, "post_results": 40, "token": 10},
+    # a realistic ED shift: mostly reads, a steady trickle of writes and logins
+    "mixed": {"worklist": 35, "patient_vitals": 15, "post_vitals": 20, "post_results": 15,
+              "tpa_eligibility": 10, "token": 5},
+}
+# Responses of requests turned away by admission control (admission.py), counted apart from errors
+SHED_STATUSES = (429, 503)
+
+
+def vitals_payload(rng):
+    return {
+        "chief_complaint": "Sudden left-sided weakness",
+        "blood_pressure_systolic": rng.randint(110, 200),
+        "blood_pressure_diastolic": rng.randint(60, 120),
+        "heart_rate": rng.randint(55, 120),
+        "respiratory_rate": rng.randint(12, 24),
+        "oxygen_saturation": rng.randint(90, 100),
+        "platelet_count": rng.randint(90000, 400000),
+    }
+
+
+def consultation_payload(rng):
+    return {"tpa_approval": rng.random() < 0.5, "diagnosis": "Ischemic stroke",
+            "treatment_plan": rng.choice(["tPA", "thrombectomy", "antiplatelet therapy"])}
+
+
+def lab_payload(rng):
+    return {"cbc": "normal", "bmp_glucose": rng.randint(60, 300), "creatinine": round(rng.uniform(0.6, 1.6), 2),
+            "coagulation": rng.choice(["normal", "normal", "abnormal"])}
+
+
+# Gives the run a synthetic cohort (see cohort.py), restored from a snapshot when one exists,
+# and returns the accounts the mix logs in as
+def seed(database_path, patients, clinicians, snapshot_dir):
+    import sqlite3
+
+    from cohort import load_cohort
+
+    load_cohort(database_path, patients, seed=0, snapshot_dir=snapshot_dir)
+    with sqlite3.connect(database_path) as conn:
+        rows = conn.execute("SELECT id, username, role FROM user ORDER BY username").fetchall()
+    staff = [{"username": username, "role": role} for _, username, role in rows if role != "patient"]
+    neurologists = [account for account in staff if account["role"] == "neurologist"][:max(1, clinicians // 2)]
+    doctors = [account for account in staff if account["role"] != "neurologist"][:clinicians - len(neurologists)]
+    return {
+        "patients": [{"id": id, "username": username} for id, username, role in rows if role == "patient"],
+        "clinicians": doctors + neurologists,
+    }
+
+
+def start_server(database_url, port, workers):
+    env = {**os.environ, "DATABASE_URL": database_url}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    for _ in range(200):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+
+async def login(client, username):
+    response = await client.post("/token", data={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+class LoadTest:
+    def __init__(self, client, accounts, weights, rng):
+        self.client = client
+        self.accounts = accounts
+        self.routes = list(weights)
+        self.weights = list(weights.values())
+        self.rng = rng
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.shed = defaultdict(int)
+        self.patient_headers = {}
+        self.clinician_headers = []
+        self.neurologist_headers = []
+
+    async def prepare(self, logged_in_patients):
+        for clinician in self.accounts["clinicians"]:
+            headers = await login(self.client, clinician["username"])
+            self.clinician_headers.append(headers)
+            if clinician.get("role") == "neurologist":
+                self.neurologist_headers.append(headers)
+        for patient in self.accounts["patients"][:logged_in_patients]:
+            self.patient_headers[patient["id"]] = await login(self.client, patient["username"])
+
+    def request_for(self, route):
+        rng = self.rng
+        patient = rng.choice(self.accounts["patients"])
+        clinician = rng.choice(self.clinician_headers)
+        if route == "worklist":
+            return "GET", "/worklist", {"headers": clinician, "params": {"limit": 50}}
+        if route == "patient_vitals":
+            return "GET", f"/users/{patient['id']}/vitals", {"headers": clinician}
+        if route == "tpa_eligibility":
+            return "GET", "/tpa-eligibility", {"headers": clinician, "params": {"limit": 1000}}
+        if route == "token":
+            return "POST", "/token", {"data": {"username": patient["username"], "password": PASSWORD}}
+        if route == "users_list":
+            return "GET", "/users/", {"params": {"limit": 100}}
+        if route == "patient_tpa":
+            return "GET", f"/users/{patient['id']}/tpa-eligibility", {"headers": clinician}
+        if route == "post_consultation":
+            return "POST", f"/users/{patient['id']}/consultations", {
+                "headers": rng.choice(self.neurologist_headers or self.clinician_headers),
+                "json": consultation_payload(rng)}
+        patient_id = rng.choice(list(self.patient_headers))
+        if route == "post_vitals":
+            return "POST", "/users/me/vitals", {"headers": self.patient_headers[patient_id], "json": vitals_payload(rng)}
+        if route == "post_results":
+            return "POST", "/users/me/results", {"headers": self.patient_headers[patient_id], "json": lab_payload(rng)}
+        raise ValueError(f"unknown route {route}")
+
+    async def worker(self, deadline):
+        while time.perf_counter() < deadline:
+            route = self.rng.choices(self.routes, self.weights)[0]
+            method, url, options = self.request_for(route)
+            start = time.perf_counter()
+            shed = False
+            try:
+                response = await self.client.request(method, url, **options)
+                shed = response.status_code in SHED_STATUSES
+                failed = response.status_code >= 400 and not shed
+            except httpx.HTTPError:
+                failed = True
+            self.latencies[route].append(time.perf_counter() - start)
+            if failed:
+                self.errors[route] += 1
+            if shed:
+                self.shed[route] += 1
+
+    async def run(self, concurrency, duration):
+        deadline = time.perf_counter() + duration
+        start = time.perf_counter()
+        await asyncio.gather(*(self.worker(deadline) for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+def summarize(latencies, errors, shed, elapsed):
+    from metrics import percentiles
+
+    def stats(samples, error_count, shed_count):
+        samples = sorted(samples)
+        return {
+            "requests": len(samples),
+            "errors": error_count,
+            "shed": shed_count,
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 2) if samples else None,
+            **{f"{name}_ms": value for name, value in percentiles(samples).items()},
+        }
+
+    routes = {route: stats(samples, errors[route], shed[route]) for route, samples in sorted(latencies.items())}
+    everything = [sample for samples in latencies.values() for sample in samples]
+    return routes, stats(everything, sum(errors.values()), sum(shed.values()))
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result):
+    print(f"\nscenario {result['config']['scenario']}   concurrency {result['config']['concurrency']}   "
+          f"{result['elapsed_s']} s   revision {result['revision']}")
+    print(f"{'route':<17} {'requests':>9} {'errors':>7} {'shed':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9}")
+    for route, stats in [*result["routes"].items(), ("TOTAL", result["total"])]:
+        print(f"{route:<17} {stats['requests']:>9} {stats['errors']:>7} {stats.get('shed', 0):>7} "
+              f"{stats['throughput_rps']:>9} "
+              f"{stats['p50_ms']!s:>9} {stats['p95_ms']!s:>9} {stats['p99_ms']!s:>9}")
+
+
+# A route regresses when its p95 grows, or its throughput or error-free share drops, by more
+# than `threshold` (a fraction) relative to the baseline run
+def compare(result, baseline, threshold):
+    regressions = []
+    print(f"\ncompared with {baseline['revision']} ({baseline['started_at']}), threshold {threshold:.0%}")
+    print(f"{'route':<16} {'p95 ms':>19} {'req/s':>21}")
+    for route, stats in [*result["routes"].items(), ("TOTAL", result["total"])]:
+        before = baseline["total"] if route == "TOTAL" else baseline["routes"].get(route)
+        if before is None or not before["requests"]:
+            continue
+        p95_change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0
+        rps_change = (stats["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"]
+        error_rate = stats["errors"] / stats["requests"] if stats["requests"] else 0
+        before_error_rate = before["errors"] / before["requests"]
+        flags = []
+        if p95_change > threshold:
+            flags.append("p95")
+        if rps_change < -threshold:
+            flags.append("throughput")
+        if error_rate - before_error_rate > threshold:
+            flags.append("errors")
+        if flags:
+            regressions.append((route, flags))
+        print(f"{route:<16} {before['p95_ms']:>8} -> {stats['p95_ms']:<8} {before['throughput_rps']:>9} -> "
+              f"{stats['throughput_rps']:<9} {'REGRESSION: ' + ', '.join(flags) if flags else ''}")
+    return regressions
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    server = None
+    if args.url:
+        base_url = args.url
+        with open(args.accounts) as f:
+            accounts = json.load(f)
+    else:
+        database_path = os.path.join(tempfile.mkdtemp(), "load.db")
+        database_url = f"sqlite:///{database_path}"
+        accounts = seed(database_path, args.patients, args.clinicians, args.snapshot_dir)
+        server = start_server(database_url, args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            load_test = LoadTest(client, accounts, SCENARIOS[args.scenario], rng)
+            await load_test.prepare(min(args.logged_in_patients, len(accounts["patients"])))
+            if args.warmup:
+                await load_test.run(args.concurrency, args.warmup)
+                load_test.latencies.clear()
+                load_test.errors.clear()
+                load_test.shed.clear()
+            started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            elapsed = await load_test.run(args.concurrency, args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    routes, total = summarize(load_test.latencies, load_test.errors, load_test.shed, elapsed)
+    return {
+        "started_at": started_at,
+        "revision": git_revision(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {name: getattr(args, name) for name in
+                   ("scenario", "concurrency", "duration", "warmup", "patients", "clinicians", "workers", "seed")},
+        "elapsed_s": round(elapsed, 2),
+        "routes": routes,
+        "total": total,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a route mix against the app and report per-route latency.")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before the run")
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--clinicians", type=int, default=10, help="clinicians logged in for the reads")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="where cohort snapshots are kept")
+    parser.add_argument("--logged-in-patients", type=int, default=50, help="patients posting vitals/labs")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="load an already running server instead of booting one")
+    parser.add_argument("--accounts", help="with --url: JSON file of {patients: [{id, username}], clinicians: [{username, role}]}")
+    parser.add_argument("--output", help="where to save the JSON result (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", help="JSON result of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed fractional regression")
+    args = parser.parse_args(argv)
+    if args.url and not args.accounts:
+        parser.error("--url needs --accounts")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(main_async(args))
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{result['started_at'].replace(':', '')}-{args.scenario}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nsaved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
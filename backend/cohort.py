@@ -0,0 +1,260 @@
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from passlib.hash import bcrypt
+from sqlalchemy import insert
+
+from cohort_stats import update_cohort_stats
+from eligibility import refresh_tpa_eligibility
+from migrations import LATEST_VERSION, migrate
+from models import LabResult, NeurologistConsultation, Role, User, Vitals, VitalsObservation
+
+#Synthetic cohorts for capacity testing. The same (size, seed) always produces the same rows:
+#ids come from the seeded RNG and timestamps count back from a fixed epoch, not from now().
+#Every account shares one password hash, computed once, so a million users cost one bcrypt.
+
+COHORT_CHUNK_SIZE = int(os.getenv("COHORT_CHUNK_SIZE", 5000))
+COHORT_PASSWORD = os.getenv("COHORT_PASSWORD", "cohort-password")
+COHORT_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+#Bump when the generated data changes, so stale snapshots are not reused
+COHORT_FORMAT = 1
+
+CHIEF_COMPLAINTS = [
+    ("Sudden left-sided weakness", 25), ("Sudden right-sided weakness", 25), ("Slurred speech", 15),
+    ("Facial droop", 12), ("Sudden vision loss", 6), ("Sudden severe headache", 5), ("Confusion", 7),
+    ("Dizziness and loss of balance", 5),
+]
+MEDICAL_HISTORY = [
+    ("Hypertension", 35), ("Hypertension, diabetes", 15), ("Atrial fibrillation", 12),
+    ("Prior stroke", 8), ("Hyperlipidemia", 10), ("Coronary artery disease", 8), ("None", 12),
+]
+CBC_RESULTS = [("normal", 82), ("anemia", 9), ("leukocytosis", 6), ("thrombocytopenia", 3)]
+DIAGNOSES = [
+    ("Ischemic stroke", 60), ("Transient ischemic attack", 15), ("Hemorrhagic stroke", 12),
+    ("Stroke mimic (seizure)", 5), ("Stroke mimic (migraine)", 4), ("Stroke mimic (hypoglycemia)", 4),
+]
+#NIHSS is skewed towards minor strokes: (low, high, weight)
+NIHSS_BANDS = [(0, 4, 45), (5, 15, 35), (16, 20, 12), (21, 42, 8)]
+
+
+def _weighted(options):
+    values, weights = zip(*options)
+    return list(values), list(weights)
+
+
+_COMPLAINTS, _DIAGNOSES, _HISTORY, _CBC = (_weighted(o) for o in (CHIEF_COMPLAINTS, DIAGNOSES, MEDICAL_HISTORY, CBC_RESULTS))
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(UUID(int=rng.getrandbits(128), version=4))
+
+
+class CohortGenerator:
+    # observations: vitals observations per patient, 15 minutes apart; the snapshot is the last one
+    def __init__(self, seed: int, hashed_password: str, observations: int = 4):
+        self.rng = random.Random(seed)
+        self.clinician_rng = random.Random(f"{seed}-clinicians")
+        self.hashed_password = hashed_password
+        self.observations = max(1, observations)
+
+    def patient(self, index: int) -> dict:
+        rng = self.rng
+        user_id = _uuid(rng)
+        # Onset spread over the year before the epoch; the series ends at arrival
+        arrived_at = COHORT_EPOCH - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        age = rng.randint(1, 17) if rng.random() < 0.02 else _clamp(round(rng.gauss(71, 13)), 18, 104)
+        anticoagulated = rng.random() < 0.12
+        rows = {
+            "user": dict(id=user_id, name=f"Patient {index}", username=f"patient{index}@cohort.test", age=age,
+                         gender=rng.choice(["Male", "Female"]), hashed_password=self.hashed_password,
+                         role=Role.patient),
+            "observations": [],
+        }
+
+        low, high = rng.choices([(low, high) for low, high, _ in NIHSS_BANDS], [w for _, _, w in NIHSS_BANDS])[0]
+        nihss = rng.randint(low, high)
+        inr = round(_clamp(rng.gauss(2.4, 0.6) if anticoagulated else rng.gauss(1.05, 0.1), 0.8, 6.0), 2)
+        systolic, diastolic = rng.gauss(158, 24), rng.gauss(89, 14)
+        for step in range(self.observations):
+            observed_at = arrived_at - timedelta(minutes=15 * (self.observations - 1 - step))
+            # Each recheck drifts a little from the previous one
+            systolic, diastolic = systolic + rng.gauss(-1, 6), diastolic + rng.gauss(-0.5, 4)
+            rows["observations"].append(dict(
+                user_id=user_id, observed_at=observed_at,
+                blood_pressure_systolic=round(_clamp(systolic, 80, 260)),
+                blood_pressure_diastolic=round(_clamp(diastolic, 40, 150)),
+                heart_rate=round(_clamp(rng.gauss(84, 15), 35, 180)),
+                respiratory_rate=round(_clamp(rng.gauss(17, 3), 8, 40)),
+                oxygen_saturation=round(_clamp(rng.gauss(96.5, 2.2), 75, 100)),
+                nihss_score=_clamp(nihss + rng.randint(-1, 1), 0, 42),
+                inr_score=inr,
+            ))
+
+        rows["vitals"] = dict(
+            id=_uuid(rng), user_id=user_id,
+            chief_complaint=rng.choices(*_COMPLAINTS)[0],
+            medical_history=rng.choices(*_HISTORY)[0],
+            significant_head_trauma=rng.random() < 0.03,
+            recent_surgery=rng.random() < 0.05,
+            recent_myocardial_infarction=rng.random() < 0.03,
+            recent_hemorrhage=rng.random() < 0.02,
+            platelet_count=round(_clamp(rng.gauss(250_000, 65_000), 15_000, 700_000)),
+            **{key: value for key, value in rows["observations"][-1].items() if key != "user_id"},
+        )
+
+        # Admission labs, plus a repeat panel for about a third of patients
+        rows["lab_results"] = []
+        for repeat in range(2 if rng.random() < 0.35 else 1):
+            glucose = rng.lognormvariate(4.8, 0.3) if rng.random() < 0.97 else rng.uniform(30, 50)
+            rows["lab_results"].append(dict(
+                id=_uuid(rng), user_id=user_id,
+                cbc=rng.choices(*_CBC)[0],
+                bmp_glucose=round(_clamp(glucose, 20, 900), 1),
+                creatinine=round(_clamp(rng.gauss(1.05, 0.35), 0.3, 8.0), 2),
+                coagulation="abnormal" if inr >= 1.7 or rng.random() < 0.03 else "normal",
+                created_at=arrived_at + timedelta(minutes=20 + 180 * repeat + rng.randint(0, 25)),
+            ))
+
+        rows["consultations"] = []
+        if rng.random() < 0.4:
+            diagnosis = rng.choices(*_DIAGNOSES)[0]
+            approved = diagnosis == "Ischemic stroke" and nihss >= 4 and not anticoagulated and rng.random() < 0.7
+            rows["consultations"].append(dict(
+                id=_uuid(rng), user_id=user_id, diagnosis=diagnosis, tpa_approval=approved,
+                treatment_plan="Alteplase 0.9 mg/kg, BP < 180/105 for 24 h." if approved
+                else "Antiplatelet therapy, admit to stroke unit.",
+            ))
+        return rows
+
+    # Clinicians draw from their own RNG, so a smaller cohort is a prefix of a larger one
+    def clinician(self, index: int, role: Role) -> dict:
+        rng = self.clinician_rng
+        return dict(id=_uuid(rng), name=f"Dr. {role.value} {index}",
+                    username=f"{role.value.lower()}{index}@cohort.test", age=rng.randint(28, 67),
+                    gender=rng.choice(["Male", "Female"]), hashed_password=self.hashed_password, role=role)
+
+
+# Generates `size` patients (plus one doctor and one neurologist per 100 patients) into the
+# database behind `engine`, which must be empty and migrated. One bulk INSERT per table per
+# chunk of `chunk_size` patients, one transaction per chunk, which also stores the chunk's tPA
+# eligibility and adds the chunk to the cohort rollups. on_progress(patients) is called after
+# each chunk. Returns the number of users written.
+def generate_cohort(engine, size: int, seed: int = 0, chunk_size: int = COHORT_CHUNK_SIZE,
+                    hashed_password: str | None = None, observations: int = 4, on_progress=None) -> int:
+    generator = CohortGenerator(seed, hashed_password or bcrypt.hash(COHORT_PASSWORD), observations)
+    clinicians = max(1, size // 100)
+    with engine.begin() as conn:
+        rows = [generator.clinician(i, role) for i in range(clinicians) for role in (Role.doctor, Role.neurologist)]
+        conn.execute(insert(User), rows)
+        update_cohort_stats(conn, [row["id"] for row in rows])
+
+    for start in range(0, size, chunk_size):
+        tables = {User: [], Vitals: [], VitalsObservation: [], LabResult: [], NeurologistConsultation: []}
+        for index in range(start, min(size, start + chunk_size)):
+            rows = generator.patient(index)
+            tables[User].append(rows["user"])
+            tables[Vitals].append(rows["vitals"])
+            tables[VitalsObservation].extend(rows["observations"])
+            tables[LabResult].extend(rows["lab_results"])
+            tables[NeurologistConsultation].extend(rows["consultations"])
+        with engine.begin() as conn:
+            for table, rows in tables.items():
+                if rows:
+                    conn.execute(insert(table), rows)
+            refresh_tpa_eligibility(conn, [user["id"] for user in tables[User]])
+            update_cohort_stats(conn, [user["id"] for user in tables[User]])
+        if on_progress is not None:
+            on_progress(min(size, start + chunk_size))
+    return size + 2 * clinicians
+
+
+def snapshot_path(directory: str, size: int, seed: int, observations: int = 4) -> str:
+    return os.path.join(directory, f"cohort-s{LATEST_VERSION}-f{COHORT_FORMAT}-{size}x{observations}-seed{seed}.db")
+
+
+# Copies a SQLite database into a single compacted file (no -wal/-shm), safe while it is open
+def write_snapshot(database_path: str, snapshot: str):
+    os.makedirs(os.path.dirname(os.path.abspath(snapshot)), exist_ok=True)
+    partial = snapshot + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    with sqlite3.connect(database_path) as conn:
+        conn.execute("VACUUM INTO ?", (partial,))
+    os.replace(partial, snapshot)
+
+
+def restore_snapshot(snapshot: str, database_path: str):
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+    shutil.copyfile(snapshot, database_path)
+
+
+# Gives `database_path` the cohort for (size, seed): a file copy when a snapshot for it is
+# already in `snapshot_dir`, otherwise generates it and leaves a snapshot for next time.
+# Returns True when the snapshot was reused.
+def load_cohort(database_path: str, size: int, seed: int = 0, snapshot_dir: str | None = None,
+                observations: int = 4, on_progress=None) -> bool:
+    from database import create_db_engine
+
+    snapshot = snapshot_path(snapshot_dir, size, seed, observations) if snapshot_dir else None
+    if snapshot and os.path.exists(snapshot):
+        restore_snapshot(snapshot, database_path)
+        return True
+    if os.path.exists(database_path):
+        raise FileExistsError(f"{database_path} already exists; cohorts are generated into a new database")
+
+    engine = create_db_engine(f"sqlite:///{database_path}")
+    try:
+        migrate(engine)
+        generate_cohort(engine, size, seed, observations=observations, on_progress=on_progress)
+    finally:
+        engine.dispose()
+    if snapshot:
+        write_snapshot(database_path, snapshot)
+    return False
+
+
+if __name__ == "__main__":
+    # python cohort.py SIZE [--seed N] [--observations N] [--snapshot-dir DIR]
+    #   generates SIZE patients into DATABASE_URL (an empty database), or, with --snapshot-dir,
+    #   into a fresh SQLite file at DATABASE_URL via a reusable snapshot
+    import argparse
+    from dotenv import load_dotenv
+    from database import create_db_engine
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic patient cohort.")
+    parser.add_argument("size", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--observations", type=int, default=4, help="vitals observations per patient")
+    parser.add_argument("--snapshot-dir", help="reuse or write a SQLite snapshot here (SQLite only)")
+    args = parser.parse_args()
+
+    def progress(done):
+        print(f"\r{done:,}/{args.size:,} patients", end="", file=sys.stderr, flush=True)
+
+    url = os.getenv("DATABASE_URL")
+    start = time.perf_counter()
+    if args.snapshot_dir:
+        if not url.startswith("sqlite:///"):
+            sys.exit("--snapshot-dir needs a sqlite:/// DATABASE_URL")
+        reused = load_cohort(url.removeprefix("sqlite:///"), args.size, args.seed, args.snapshot_dir,
+                             args.observations, progress)
+        print(f"\n{'restored snapshot' if reused else 'generated and snapshotted'} "
+              f"in {time.perf_counter() - start:.1f} s")
+    else:
+        engine = create_db_engine(url)
+        migrate(engine)
+        users = generate_cohort(engine, args.size, args.seed, observations=args.observations, on_progress=progress)
+        print(f"\n{users:,} users in {time.perf_counter() - start:.1f} s")
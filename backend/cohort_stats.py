@@ -0,0 +1,171 @@
+import sys
+from contextlib import contextmanager
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+
+from models import CohortRollup, CohortStats, NeurologistConsultation, Role, TpaEligibility, User, Vitals
+
+#Cohort statistics from rollups. CohortRollup holds counters and sums per (role, age band); every
+#write that changes a user's contribution (the user itself, their vitals snapshot, stored
+#eligibility or consultations) applies the difference in the same transaction, so GET /stats
+#reads a handful of rows however many patients there are. recompute_cohort_stats rebuilds the
+#rollups from scratch (migration 5, a changed tPA rule set, `python cohort_stats.py`).
+#The before/after diff needs the users' rows to stay put in between: SQLite runs one write
+#transaction at a time, and server databases (READ COMMITTED, where two transactions could diff
+#against the same "before") lock the users' rows first with SELECT ... FOR UPDATE.
+
+#Lower bound and label of each age band; users without an age are "unknown"
+AGE_BANDS = [(0, "0-17"), (18, "18-39"), (40, "40-59"), (60, "60-79"), (80, "80+")]
+UNKNOWN_AGE_BAND = "unknown"
+ROLLUP_FIELDS = ("users", "pending", "eligible", "approved", "denied", "nihss_sum", "nihss_count")
+
+
+def age_band_expression(age):
+    bands = [(age < upper, label) for (_, label), (upper, _) in zip(AGE_BANDS, AGE_BANDS[1:])]
+    return case((age.is_(None), UNKNOWN_AGE_BAND), *bands, else_=AGE_BANDS[-1][1])
+
+
+def contributions_statement(user_ids=None):
+    # Consultation counts per user, joined once (a patient can have several consultations)
+    consultations = select(
+        NeurologistConsultation.user_id,
+        func.sum(case((NeurologistConsultation.tpa_approval.is_(True), 1), else_=0)).label("approved"),
+        func.sum(case((NeurologistConsultation.tpa_approval.is_(False), 1), else_=0)).label("denied"),
+    ).group_by(NeurologistConsultation.user_id)
+    if user_ids is not None:
+        consultations = consultations.where(NeurologistConsultation.user_id.in_(user_ids))
+    consultations = consultations.subquery()
+
+    age_band = age_band_expression(User.age)
+    statement = (
+        select(
+            User.role,
+            age_band.label("age_band"),
+            func.count().label("users"),
+            # Patients no neurologist has seen yet
+            func.sum(case(((User.role == Role.patient) & consultations.c.user_id.is_(None), 1), else_=0)).label("pending"),
+            func.sum(case((TpaEligibility.eligible.is_(True), 1), else_=0)).label("eligible"),
+            func.coalesce(func.sum(consultations.c.approved), 0).label("approved"),
+            func.coalesce(func.sum(consultations.c.denied), 0).label("denied"),
+            func.coalesce(func.sum(Vitals.nihss_score), 0).label("nihss_sum"),
+            func.count(Vitals.nihss_score).label("nihss_count"),
+        )
+        .select_from(User)
+        .outerjoin(TpaEligibility, TpaEligibility.user_id == User.id)
+        .outerjoin(Vitals, Vitals.user_id == User.id)
+        .outerjoin(consultations, consultations.c.user_id == User.id)
+        .group_by(User.role, age_band)
+    )
+    if user_ids is not None:
+        statement = statement.where(User.id.in_(user_ids))
+    return statement
+
+
+#Built once and reused, like the eligibility statements
+_contributions_statement = contributions_statement(bindparam("user_ids", expanding=True))
+_update_statement = (
+    update(CohortRollup)
+    .where(CohortRollup.role == bindparam("key_role"), CohortRollup.age_band == bindparam("key_age_band"))
+    .values({field: getattr(CohortRollup, field) + bindparam(field) for field in ROLLUP_FIELDS})
+)
+
+
+# Locks the users' rows until the end of the transaction (server databases; in id order, so two
+# transactions locking overlapping batches can't deadlock)
+def lock_users(conn, user_ids):
+    if conn.dialect.name == "sqlite":
+        return
+    conn.execute(select(User.id).where(User.id.in_(sorted(user_ids))).order_by(User.id).with_for_update())
+
+
+# What the given users currently add to the rollups: {(role, age_band): (users, pending, ...)}.
+# Only called inside the write transaction that changes them, whose rows it locks.
+def cohort_contributions(conn, user_ids) -> dict:
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    lock_users(conn, user_ids)
+    rows = conn.execute(_contributions_statement, {"user_ids": user_ids})
+    return {(row.role, row.age_band): tuple(getattr(row, field) for field in ROLLUP_FIELDS) for row in rows}
+
+
+# Applies the change in the given users' contribution since `before` (cohort_contributions taken
+# earlier in the same transaction; None for users that didn't exist yet). Async callers use
+# `await conn.run_sync(update_cohort_stats, user_ids, before)`.
+def update_cohort_stats(conn, user_ids, before: dict | None = None):
+    after = cohort_contributions(conn, user_ids)
+    before = before or {}
+    for key in after.keys() | before.keys():
+        new, old = after.get(key, (0,) * len(ROLLUP_FIELDS)), before.get(key, (0,) * len(ROLLUP_FIELDS))
+        delta = dict(zip(ROLLUP_FIELDS, (a - b for a, b in zip(new, old))))
+        if not any(delta.values()):
+            continue
+        role, age_band = key
+        updated = conn.execute(_update_statement, {"key_role": role, "key_age_band": age_band, **delta}).rowcount
+        if not updated:
+            conn.execute(insert(CohortRollup), {"role": role, "age_band": age_band, **delta})
+
+
+# Wraps writes that change the given users: their contribution before and after is diffed
+@contextmanager
+def track_cohort_stats(conn, user_ids):
+    user_ids = list(dict.fromkeys(user_ids))
+    before = cohort_contributions(conn, user_ids)
+    yield
+    update_cohort_stats(conn, user_ids, before)
+
+
+# Rebuilds every rollup from the users, inside the caller's transaction. Returns the rows written.
+def recompute_cohort_stats(conn) -> int:
+    rows = [{"role": row.role, "age_band": row.age_band, **{field: getattr(row, field) for field in ROLLUP_FIELDS}}
+            for row in conn.execute(contributions_statement())]
+    conn.execute(delete(CohortRollup))
+    if rows:
+        conn.execute(insert(CohortRollup), rows)
+    return len(rows)
+
+
+# GET /stats: the rollups of `role` (every role when None), summed overall or per role/age band
+def read_cohort_stats(conn, role: Role | None = None, group_by: str | None = None) -> list[CohortStats]:
+    statement = select(CohortRollup)
+    if role is not None:
+        statement = statement.where(CohortRollup.role == role)
+    groups = {}
+    for rollup in conn.execute(statement):
+        group = None if group_by is None else getattr(rollup, group_by)
+        totals = groups.setdefault(group.value if isinstance(group, Role) else group, dict.fromkeys(ROLLUP_FIELDS, 0))
+        for field in ROLLUP_FIELDS:
+            totals[field] += getattr(rollup, field)
+    if group_by is None and not groups:
+        groups[None] = dict.fromkeys(ROLLUP_FIELDS, 0)
+    return [
+        CohortStats(
+            group=group, users=totals["users"], pending=totals["pending"], eligible=totals["eligible"],
+            approved=totals["approved"], denied=totals["denied"],
+            average_nihss=round(totals["nihss_sum"] / totals["nihss_count"], 2) if totals["nihss_count"] else None,
+        )
+        for group, totals in sorted(groups.items(), key=lambda item: _group_order(group_by, item[0]))
+    ]
+
+
+def _group_order(group_by: str | None, group):
+    if group_by == "age_band":
+        labels = [label for _, label in AGE_BANDS] + [UNKNOWN_AGE_BAND]
+        return labels.index(group) if group in labels else len(labels)
+    if group_by == "role":
+        return [role.value for role in Role].index(group)
+    return 0
+
+
+if __name__ == "__main__":
+    # python cohort_stats.py --recompute   rebuild the rollups of DATABASE_URL from scratch
+    import os
+    from dotenv import load_dotenv
+    from database import create_db_engine
+
+    load_dotenv()
+    if "--recompute" not in sys.argv:
+        sys.exit("usage: python cohort_stats.py --recompute")
+    engine = create_db_engine(os.getenv("DATABASE_URL"))
+    with engine.begin() as conn:
+        print(f"recomputed {recompute_cohort_stats(conn)} cohort rollup rows")
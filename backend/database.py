@@ -0,0 +1,105 @@
+import os
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel import create_engine
+
+from metrics import LatencyRecorder
+
+#SQLite profile: WAL lets readers and the single writer work concurrently
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+
+#Pool settings; recycle/pre-ping only apply to server databases (Postgres etc.)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+#Time spent waiting for a pooled connection, per engine ("sync" / "async")
+pool_checkout_wait = {"sync": LatencyRecorder(), "async": LatencyRecorder()}
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def async_database_url(url: str) -> str:
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://") or url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+
+def timed_pool_class(base, recorder: LatencyRecorder):
+    class TimedPool(base):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                recorder.record(time.perf_counter() - start)
+
+    return TimedPool
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Off by default in SQLite; needed for the ON DELETE CASCADE foreign keys
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+def engine_options(url: str, pool_base, checkout_wait: LatencyRecorder) -> dict:
+    if is_sqlite(url):
+        if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+            return {"connect_args": {"check_same_thread": False}}
+        options = {"connect_args": {"check_same_thread": False}}
+    else:
+        options = {"pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": DB_POOL_PRE_PING}
+    options.update(
+        poolclass=timed_pool_class(pool_base, checkout_wait),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+#A forked worker (gunicorn --preload and the like) must not reuse the parent's pooled connections:
+#give the child a fresh, empty pool without closing the parent's connections under it
+def dispose_after_fork(sync_engine):
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=lambda: sync_engine.dispose(close=False))
+
+
+#Engine factory: picks the SQLite or server-database profile from the URL
+def create_db_engine(url: str):
+    engine = create_engine(url, **engine_options(url, QueuePool, pool_checkout_wait["sync"]))
+    if is_sqlite(url):
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    dispose_after_fork(engine)
+    return engine
+
+
+def create_async_db_engine(url: str):
+    async_url = async_database_url(url)
+    engine = create_async_engine(async_url, **engine_options(url, AsyncAdaptedQueuePool, pool_checkout_wait["async"]))
+    if is_sqlite(url):
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    dispose_after_fork(engine.sync_engine)
+    return engine
+
+
+def pool_stats(engine, name: str) -> dict:
+    return {"status": engine.pool.status(), "checkout_wait_ms": pool_checkout_wait[name].stats()}
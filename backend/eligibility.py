@@ -0,0 +1,89 @@
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, delete, func, insert, select
+
+from cohort_stats import recompute_cohort_stats
+from models import LabResult, Role, TpaEligibility, User
+from utils import TPA_RULES_VERSION, tpa_criteria, tpa_criteria_statement
+
+#Materialized tPA eligibility. Each patient's row in TpaEligibility is recomputed in the same
+#transaction that writes their vitals or lab results (the POST handlers, bulk ingest, cohort
+#generation), and for every patient when TPA_RULES_VERSION changes, so reads never evaluate
+#the criteria: the eligibility endpoints and the worklist read (or join) the stored row.
+
+ELIGIBILITY_REFRESH_BATCH_SIZE = int(os.getenv("ELIGIBILITY_REFRESH_BATCH_SIZE", 5000))
+
+#Reported instead of the criteria when a patient can't be evaluated yet
+MISSING_DATA_CRITERIA = ("missing_vitals", "missing_lab_result")
+#Checked in this order; each is a boolean column of tpa_criteria_statement()
+TPA_CRITERIA_NAMES = [name for name, _ in tpa_criteria(LabResult)]
+
+
+#Built once and reused: constructing the criteria expressions costs more than running the query
+#for a single patient
+_criteria_statement = tpa_criteria_statement(bindparam("user_ids", expanding=True))
+_delete_statement = delete(TpaEligibility).where(TpaEligibility.user_id.in_(bindparam("user_ids", expanding=True)))
+
+
+def failed_criteria(row) -> list[str]:
+    missing = [name for name, present in zip(MISSING_DATA_CRITERIA, (row.has_vitals, row.has_lab_result))
+               if not present]
+    if missing:
+        return missing
+    return [name for name in TPA_CRITERIA_NAMES if getattr(row, name)]
+
+
+def has_missing_data(criteria: list[str]) -> bool:
+    return any(name in MISSING_DATA_CRITERIA for name in criteria)
+
+
+# Re-evaluates the given patients (ids of other roles are ignored) on `conn`, a sync Connection;
+# async callers use `await conn.run_sync(refresh_tpa_eligibility, user_ids)`. Returns the
+# number of rows written.
+def refresh_tpa_eligibility(conn, user_ids) -> int:
+    user_ids = list(dict.fromkeys(user_ids))
+    evaluated_at = datetime.now(timezone.utc)
+    written = 0
+    for start in range(0, len(user_ids), ELIGIBILITY_REFRESH_BATCH_SIZE):
+        batch = user_ids[start:start + ELIGIBILITY_REFRESH_BATCH_SIZE]
+        rows = []
+        for row in conn.execute(_criteria_statement, {"user_ids": batch}):
+            criteria = failed_criteria(row)
+            rows.append({"user_id": row.id, "eligible": not criteria, "failed_criteria": criteria,
+                         "rules_version": TPA_RULES_VERSION, "evaluated_at": evaluated_at})
+        conn.execute(_delete_statement, {"user_ids": batch})
+        if rows:
+            conn.execute(insert(TpaEligibility), rows)
+        written += len(rows)
+    return written
+
+
+# Every patient, a batch at a time in id order (ix_user_role_id), inside the caller's transaction
+def refresh_all_tpa_eligibility(conn) -> int:
+    written, after = 0, None
+    while True:
+        statement = select(User.id).where(User.role == Role.patient).order_by(User.id)
+        if after is not None:
+            statement = statement.where(User.id > after)
+        batch = list(conn.execute(statement.limit(ELIGIBILITY_REFRESH_BATCH_SIZE)).scalars())
+        if not batch:
+            return written
+        written += refresh_tpa_eligibility(conn, batch)
+        after = batch[-1]
+
+
+# Startup check (two index lookups on ix_tpaeligibility_rules_version): when any stored row
+# was evaluated under another rule set, everyone is re-evaluated and the cohort rollups, which
+# count eligible patients, are rebuilt. Returns the rows written.
+def refresh_stale_tpa_eligibility(engine) -> int:
+    with engine.connect() as conn:
+        # Separate MIN and MAX queries: SQLite only answers each from the index on its own
+        versions = [conn.execute(select(aggregate(TpaEligibility.rules_version))).scalar()
+                    for aggregate in (func.min, func.max)]
+    if all(version in (None, TPA_RULES_VERSION) for version in versions):
+        return 0
+    with engine.begin() as conn:
+        written = refresh_all_tpa_eligibility(conn)
+        recompute_cohort_stats(conn)
+        return written
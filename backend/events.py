@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from itertools import count
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 256))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", 15))
+
+
+# One connected dashboard. `patient_ids` of None means every patient.
+class Subscriber:
+    def __init__(self, patient_ids: frozenset | None, queue_size: int):
+        self.patient_ids = patient_ids
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflows = 0
+        self.closed = False
+
+    # Backpressure: a subscriber that can't keep up loses its backlog and gets a single
+    # "resync" event instead (refetch, then carry on), so publishers never wait on it.
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((event[0], "resync", None, json.dumps({"reason": "subscriber too slow"})))
+
+    # Replaces the backlog with a final "resync" event; the stream ends after sending it
+    def close(self, reason: str):
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait((0, "resync", None, json.dumps({"reason": reason})))
+
+
+# In-process pub/sub for dashboard delta events. Must be used from the event loop thread.
+# Subscribers are indexed by patient id, so a publish only touches the ones that asked for it.
+class EventBroker:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.published = 0
+        self.closed = False
+        self._sequence = count(1)
+        self._by_patient = defaultdict(set)
+        self._everything = set()
+
+    def subscribe(self, patient_ids=None) -> Subscriber:
+        subscriber = Subscriber(frozenset(patient_ids) if patient_ids else None, self.queue_size)
+        if subscriber.patient_ids is None:
+            self._everything.add(subscriber)
+        else:
+            for patient_id in subscriber.patient_ids:
+                self._by_patient[patient_id].add(subscriber)
+        if self.closed:
+            subscriber.close("server shutting down")
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber.patient_ids is None:
+            self._everything.discard(subscriber)
+            return
+        for patient_id in subscriber.patient_ids:
+            subscribers = self._by_patient.get(patient_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_patient[patient_id]
+
+    # `data` is serialized once and shared by every matching subscriber
+    def publish(self, event_type: str, patient_id: str, data: dict):
+        event = (next(self._sequence), event_type, patient_id, json.dumps({"patient_id": patient_id, **data}, default=str))
+        self.published += 1
+        for subscriber in self._everything:
+            subscriber.offer(event)
+        for subscriber in self._by_patient.get(patient_id, ()):
+            subscriber.offer(event)
+
+    # Ends every open stream, so a draining worker isn't held open by dashboards until the
+    # graceful-shutdown timeout; clients reconnect (to another worker) and refetch.
+    def close(self):
+        self.closed = True
+        for subscriber in self._everything.union(*self._by_patient.values()):
+            subscriber.close("server shutting down")
+
+    def stats(self) -> dict:
+        subscribers = self._everything.union(*self._by_patient.values())
+        return {
+            "subscribers": len(subscribers),
+            "published": self.published,
+            "overflows": sum(subscriber.overflows for subscriber in subscribers),
+        }
+
+
+# Server-sent events for one new subscriber, with a comment line as heartbeat while idle so
+# proxies keep the connection open. Unsubscribes when the client goes away.
+async def sse_stream(broker: EventBroker, patient_ids=None, heartbeat_seconds: float = EVENT_HEARTBEAT_SECONDS):
+    subscriber = broker.subscribe(patient_ids)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                sequence, event_type, _, data = await asyncio.wait_for(subscriber.queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield f"id: {sequence}\nevent: {event_type}\ndata: {data}\n\n"
+            if subscriber.closed and subscriber.queue.empty():
+                return
+    finally:
+        broker.unsubscribe(subscriber)
@@ -0,0 +1,270 @@
+import csv
+import io
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from sqlalchemy import case, func, select
+from sqlalchemy.sql.functions import aggregate_strings
+
+from models import LabResult, NeurologistConsultation, Role, User, Vitals
+from vitals_series import as_utc
+
+
+# pyarrow (optional: pip install pyarrow, for Parquet and Arrow exports), or None without it.
+# Imported on the first export that needs it rather than with the app: it adds to every cold start.
+@lru_cache(maxsize=None)
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+#Clinical dataset export for registry submissions: one row per lab result of every patient (a
+#patient without lab results gets one row with empty lab columns unless a date filter applies),
+#joined with the patient, their current vitals snapshot and their consultations summed up. Rows
+#come off a server-side cursor EXPORT_BATCH_SIZE at a time and each batch is written out (a CSV
+#chunk, a Parquet row group or an Arrow record batch) before the next is fetched, so memory stays
+#bounded however many rows there are.
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 5000))
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+logger = logging.getLogger(__name__)
+
+#Consultations per patient: counts, tPA decisions and the diagnoses given
+_consultations = (
+    select(
+        NeurologistConsultation.user_id,
+        func.count().label("consultations"),
+        func.sum(case((NeurologistConsultation.tpa_approval.is_(True), 1), else_=0)).label("tpa_approvals"),
+        func.sum(case((NeurologistConsultation.tpa_approval.is_(False), 1), else_=0)).label("tpa_denials"),
+        aggregate_strings(NeurologistConsultation.diagnosis, "; ").label("diagnoses"),
+    )
+    .group_by(NeurologistConsultation.user_id)
+    .subquery("consultations")
+)
+
+#name: (source table, expression, column type), in export order
+EXPORT_COLUMNS = {
+    "user_id": (User, User.id, "string"),
+    "name": (User, User.name, "string"),
+    "username": (User, User.username, "string"),
+    "age": (User, User.age, "int"),
+    "gender": (User, User.gender, "enum"),
+    "chief_complaint": (Vitals, Vitals.chief_complaint, "string"),
+    "medical_history": (Vitals, Vitals.medical_history, "string"),
+    "blood_pressure_systolic": (Vitals, Vitals.blood_pressure_systolic, "int"),
+    "blood_pressure_diastolic": (Vitals, Vitals.blood_pressure_diastolic, "int"),
+    "heart_rate": (Vitals, Vitals.heart_rate, "int"),
+    "respiratory_rate": (Vitals, Vitals.respiratory_rate, "int"),
+    "oxygen_saturation": (Vitals, Vitals.oxygen_saturation, "int"),
+    "significant_head_trauma": (Vitals, Vitals.significant_head_trauma, "bool"),
+    "recent_surgery": (Vitals, Vitals.recent_surgery, "bool"),
+    "recent_myocardial_infarction": (Vitals, Vitals.recent_myocardial_infarction, "bool"),
+    "recent_hemorrhage": (Vitals, Vitals.recent_hemorrhage, "bool"),
+    "platelet_count": (Vitals, Vitals.platelet_count, "int"),
+    "nihss_score": (Vitals, Vitals.nihss_score, "int"),
+    "inr_score": (Vitals, Vitals.inr_score, "float"),
+    "vitals_observed_at": (Vitals, Vitals.observed_at, "timestamp"),
+    "lab_result_id": (LabResult, LabResult.id, "string"),
+    "cbc": (LabResult, LabResult.cbc, "string"),
+    "bmp_glucose": (LabResult, LabResult.bmp_glucose, "float"),
+    "creatinine": (LabResult, LabResult.creatinine, "float"),
+    "coagulation": (LabResult, LabResult.coagulation, "string"),
+    "lab_created_at": (LabResult, LabResult.created_at, "timestamp"),
+    "consultations": (_consultations, func.coalesce(_consultations.c.consultations, 0), "int"),
+    "tpa_approvals": (_consultations, func.coalesce(_consultations.c.tpa_approvals, 0), "int"),
+    "tpa_denials": (_consultations, func.coalesce(_consultations.c.tpa_denials, 0), "int"),
+    "diagnoses": (_consultations, _consultations.c.diagnoses, "string"),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+# Checks the requested columns (every column when none are given) and format
+def export_columns(columns: list[str] | None, export_format: str) -> list[str]:
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise ExportError(f"Unknown format {export_format!r}; expected one of {', '.join(EXPORT_MEDIA_TYPES)}.")
+    if export_format != "csv" and _pyarrow() is None:
+        raise ExportError(f"The {export_format} format needs pyarrow (pip install pyarrow).")
+    columns = list(dict.fromkeys(columns or EXPORT_COLUMNS))
+    unknown = [name for name in columns if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ExportError(f"Unknown columns: {', '.join(unknown)}.")
+    return columns
+
+
+# Rows in (patient id, lab result time) order; lab results in [start, end) when given. Vitals and
+# consultations are only joined when one of their columns is selected.
+def export_statement(columns: list[str], start: datetime | None = None, end: datetime | None = None):
+    statement = (
+        select(*[EXPORT_COLUMNS[name][1].label(name) for name in columns])
+        .select_from(User)
+        .outerjoin(LabResult, LabResult.user_id == User.id)
+        .where(User.role == Role.patient)
+    )
+    sources = {EXPORT_COLUMNS[name][0] for name in columns}
+    if Vitals in sources:
+        statement = statement.outerjoin(Vitals, Vitals.user_id == User.id)
+    if _consultations in sources:
+        statement = statement.outerjoin(_consultations, _consultations.c.user_id == User.id)
+    if start is not None:
+        statement = statement.where(LabResult.created_at >= as_utc(start))
+    if end is not None:
+        statement = statement.where(LabResult.created_at < as_utc(end))
+    return statement.order_by(User.id, LabResult.created_at)
+
+
+def _enum_value(value):
+    return None if value is None else value.value
+
+
+#Only these column types need converting; csv writes strings and numbers as they are, None as ""
+_CSV_CONVERTERS = {
+    "enum": _enum_value,
+    "bool": lambda value: None if value is None else ("true" if value else "false"),
+    "timestamp": lambda value: None if value is None else as_utc(value).isoformat(),
+}
+
+
+def _converters(columns, converters) -> list[tuple[int, object]]:
+    return [(index, converters[EXPORT_COLUMNS[name][2]]) for index, name in enumerate(columns)
+            if EXPORT_COLUMNS[name][2] in converters]
+
+
+def _csv_rows(rows, converters):
+    for row in rows:
+        row = list(row)
+        for index, convert in converters:
+            row[index] = convert(row[index])
+        yield row
+
+
+def _csv_chunks(columns, batches):
+    converters = _converters(columns, _CSV_CONVERTERS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(_csv_rows(rows, converters) if converters else rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+# File object pyarrow writes into; whatever was written since the last take() goes out as a chunk
+class _ChunkSink(io.RawIOBase):
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        chunk, self._chunks = b"".join(self._chunks), []
+        return chunk
+
+
+def _arrow_schema(pyarrow, columns):
+    types = {"string": pyarrow.string(), "enum": pyarrow.string(), "int": pyarrow.int64(),
+             "float": pyarrow.float64(), "bool": pyarrow.bool_(), "timestamp": pyarrow.timestamp("us", tz="UTC")}
+    return pyarrow.schema([(name, types[EXPORT_COLUMNS[name][2]]) for name in columns])
+
+
+def _arrow_chunks(columns, batches, export_format):
+    pyarrow = _pyarrow()
+    schema = _arrow_schema(pyarrow, columns)
+    converters = _converters(columns, {"enum": _enum_value})
+    sink = _ChunkSink()
+    if export_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+    for rows in batches:
+        values = [list(column) for column in zip(*rows)]
+        for index, convert in converters:
+            values[index] = [convert(value) for value in values[index]]
+        writer.write_batch(pyarrow.RecordBatch.from_arrays(values, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+# Body chunks of the export of `statement` (built by export_statement for `columns`), read on a
+# connection of its own through a server-side cursor. Logs the row count and rows/sec when done;
+# on_done(rows, seconds) is called too.
+def stream_export(engine, statement, columns: list[str], export_format: str, on_done=None):
+    started = time.perf_counter()
+    rows = 0
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(statement)
+
+        def batches():
+            nonlocal rows
+            for batch in result.partitions():
+                rows += len(batch)
+                yield batch
+
+        if export_format == "csv":
+            yield from _csv_chunks(columns, batches())
+        else:
+            yield from _arrow_chunks(columns, batches(), export_format)
+    seconds = time.perf_counter() - started
+    logger.info("export: %d rows as %s in %.2f s (%.0f rows/s)", rows, export_format, seconds,
+                rows / seconds if seconds else 0.0,
+                extra={"rows": rows, "format": export_format, "seconds": round(seconds, 3)})
+    if on_done is not None:
+        on_done(rows, seconds)
+
+
+if __name__ == "__main__":
+    # python export.py [--format csv|parquet|arrow] [--columns a,b,...] [--start ISO] [--end ISO] [-o FILE]
+    import argparse
+    from dotenv import load_dotenv
+    from database import create_db_engine
+
+    parser = argparse.ArgumentParser(description="Export the clinical dataset.")
+    parser.add_argument("--format", default="csv", choices=list(EXPORT_MEDIA_TYPES))
+    parser.add_argument("--columns", help=f"comma-separated subset of: {', '.join(EXPORT_COLUMNS)}")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="lab results created at or after")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="lab results created before")
+    parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    try:
+        columns = export_columns(args.columns.split(",") if args.columns else None, args.format)
+    except ExportError as e:
+        sys.exit(str(e))
+    engine = create_db_engine(os.getenv("DATABASE_URL"))
+    statement = export_statement(columns, args.start, args.end)
+
+    def report(rows, seconds):
+        print(f"exported {rows:,} rows in {seconds:.2f} s ({rows / seconds if seconds else 0:,.0f} rows/s)",
+              file=sys.stderr)
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    with output:
+        for chunk in stream_export(engine, statement, columns, args.format, on_done=report):
+            output.write(chunk)
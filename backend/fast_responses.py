@@ -0,0 +1,51 @@
+import os
+
+from fastapi import Response
+from pydantic_core import to_json
+from sqlalchemy.engine import Row
+from sqlmodel import select
+
+from response_cache import serialize
+
+#Opt-in fast path for the list and detail reads (FAST_RESPONSES=true). The endpoints select only
+#their public schema's columns and encode the row tuples directly, instead of loading ORM objects
+#that FastAPI validates and serializes again through response_model. The rows are encoded by
+#pydantic's own serializer (datetimes, enums and floats written as response_model writes them),
+#so the bodies are byte-for-byte the same as on the default path.
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "false").lower() == "true"
+
+
+def dumps(value) -> bytes:
+    return to_json(value)
+
+
+# select(table), or on the fast path just the columns of `public_model`, in its field order
+def public_select(table, public_model):
+    if not FAST_RESPONSES:
+        return select(table)
+    return select(*[getattr(table, name) for name in public_model.model_fields])
+
+
+def _public_dict(public_model, value) -> dict:
+    if isinstance(value, Row):
+        return value._asdict()
+    return {name: getattr(value, name) for name in public_model.model_fields}
+
+
+# JSON body for a public_select result (a row or a list of rows) or an ORM object
+def encode(public_model, value) -> bytes:
+    if not FAST_RESPONSES:
+        return serialize(list[public_model] if isinstance(value, list) else public_model, value)
+    if isinstance(value, list):
+        return dumps([_public_dict(public_model, item) for item in value])
+    return dumps(_public_dict(public_model, value))
+
+
+# What a list/detail endpoint returns: the value itself on the default path (FastAPI applies
+# response_model), an already-encoded response on the fast path. Headers set on the endpoint's
+# injected `response` (e.g. X-Next-Cursor) are carried over.
+def json_response(public_model, value, response: Response | None = None):
+    if not FAST_RESPONSES:
+        return value
+    headers = dict(response.headers) if response is not None else None
+    return Response(encode(public_model, value), media_type="application/json", headers=headers)
@@ -0,0 +1,190 @@
+import codecs
+import json
+import os
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from models import Role, User
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 1000))
+INGEST_MAX_RECORD_SIZE = int(os.getenv("INGEST_MAX_RECORD_SIZE", 64 * 1024))
+
+RECORD_TOO_LARGE = f"record larger than INGEST_MAX_RECORD_SIZE ({INGEST_MAX_RECORD_SIZE} characters)"
+
+_decoder = json.JSONDecoder()
+
+
+# Yields decoded records from the request body without buffering it: a body whose first
+# non-whitespace byte is "[" is a JSON array, parsed one element at a time as it arrives; anything
+# else is NDJSON, parsed line by line. Memory holds one record (at most INGEST_MAX_RECORD_SIZE
+# characters) plus one network chunk, however large the upload.
+async def iter_records(request):
+    chunks = request.stream()
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+    if head.lstrip().startswith(b"["):
+        async for item in _iter_array(head, chunks):
+            yield item
+        return
+    if head.strip() and request.headers.get("content-type", "").startswith("application/json"):
+        yield None, "expected a JSON array"
+        return
+
+    buffer, skipping = head, False
+    while True:
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif len(line) > INGEST_MAX_RECORD_SIZE:
+                yield None, RECORD_TOO_LARGE
+            elif line.strip():
+                yield _decode_line(line)
+        if len(buffer) > INGEST_MAX_RECORD_SIZE:
+            # the rest of an oversized line is dropped up to its newline
+            if not skipping:
+                yield None, RECORD_TOO_LARGE
+            buffer, skipping = b"", True
+        chunk = await anext(chunks, None)
+        if chunk is None:
+            break
+        buffer += chunk
+    if buffer.strip() and not skipping:
+        yield _decode_line(buffer)
+
+
+# Elements of a JSON array, decoded from `head` (which starts with "[") and the chunks after it.
+# A malformed array can't be resynchronised like NDJSON lines: it ends with one error row.
+async def _iter_array(head: bytes, chunks):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    text = decoder.decode(head).lstrip()[1:]
+    eof = False
+    first, expecting_value = True, True
+
+    async def read():
+        nonlocal text, eof
+        chunk = await anext(chunks, None)
+        if chunk is None:
+            eof = True
+            text += decoder.decode(b"", final=True)
+        else:
+            text += decoder.decode(chunk)
+
+    try:
+        while True:
+            text = text.lstrip()
+            if not text:
+                if eof:
+                    yield None, "invalid JSON: unterminated array"
+                    return
+                await read()
+                continue
+            if not expecting_value:
+                if text[0] == "]":
+                    break
+                if text[0] != ",":
+                    yield None, "invalid JSON: expected ',' or ']' between array elements"
+                    return
+                text, expecting_value = text[1:], True
+                continue
+            if first and text[0] == "]":
+                break
+            try:
+                record, end = _decoder.raw_decode(text)
+            except json.JSONDecodeError as e:
+                if eof or len(text) > INGEST_MAX_RECORD_SIZE:
+                    yield None, RECORD_TOO_LARGE if not eof else f"invalid JSON: {e}"
+                    return
+                await read()
+                continue
+            if end == len(text) and not eof:
+                # a number or literal at the end of the chunk may continue in the next one
+                await read()
+                continue
+            text, first, expecting_value = text[end:], False, False
+            yield record, None
+
+        text = text[1:]
+        while not text.strip() and not eof:
+            await read()
+        if text.strip():
+            yield None, "invalid JSON: data after the array"
+    except UnicodeDecodeError as e:
+        yield None, f"invalid JSON: {e}"
+
+
+def _decode_line(line: bytes):
+    try:
+        return json.loads(line), None
+    except json.JSONDecodeError as e:
+        return None, f"invalid JSON: {e}"
+
+
+# Validates records incrementally against `schema` and writes them one chunk (and one
+# transaction) at a time. Yields a status dict per input row, in input order.
+# `write(conn, items)` stores a chunk of validated rows and returns their ids, in order.
+# `on_commit(user_ids)` is called with the patients a chunk wrote to, once it has committed.
+async def ingest_records(request, engine, schema, write, on_commit=None):
+    row_number = 0
+    chunk = []
+    async for record, error in iter_records(request):
+        row_number += 1
+        if error is None:
+            try:
+                chunk.append((row_number, schema.model_validate(record)))
+            except ValidationError as e:
+                error = e.errors(include_url=False, include_context=False, include_input=False)
+        if error is not None:
+            chunk.append((row_number, error))
+        if len(chunk) >= INGEST_CHUNK_SIZE:
+            for status in await _write_chunk(engine, chunk, write, on_commit):
+                yield status
+            chunk = []
+    if chunk:
+        for status in await _write_chunk(engine, chunk, write, on_commit):
+            yield status
+
+
+# Chunk writer doing one bulk INSERT into `table`
+def bulk_insert(table):
+    async def write(conn, items):
+        # build through the table model so column defaults (id, created_at) apply
+        rows = [table(**item.model_dump(exclude_none=True)).model_dump() for item in items]
+        await conn.execute(insert(table), rows)
+        return [values["id"] for values in rows]
+
+    return write
+
+
+async def _write_chunk(engine, chunk, write, on_commit):
+    valid = [(row, item) for row, item in chunk if not isinstance(item, (str, list))]
+    user_ids = {item.user_id for _, item in valid}
+
+    statuses = {}
+    accepted = []
+    async with engine.begin() as conn:
+        known = set((await conn.execute(
+            select(User.id).where(User.id.in_(user_ids), User.role == Role.patient)
+        )).scalars())
+
+        for row, item in valid:
+            if item.user_id not in known:
+                statuses[row] = {"row": row, "status": "error", "detail": "unknown patient"}
+            else:
+                accepted.append((row, item))
+        if accepted:
+            ids = await write(conn, [item for _, item in accepted])
+            for (row, _), id in zip(accepted, ids):
+                statuses[row] = {"row": row, "status": "created", "id": id}
+
+    if accepted and on_commit is not None:
+        on_commit({item.user_id for _, item in accepted})
+
+    for row, item in chunk:
+        if row not in statuses:
+            statuses[row] = {"row": row, "status": "error", "detail": item}
+    return [statuses[row] for row, _ in chunk]
@@ -0,0 +1,151 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from metrics import Counter, Gauge, Histogram
+
+#Requests slower than this are logged with their query breakdown (0 = off)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 0))
+#Requests issuing more SQL statements than this are counted and logged as likely N+1 loops
+N_PLUS_ONE_QUERY_THRESHOLD = int(os.getenv("N_PLUS_ONE_QUERY_THRESHOLD", 20))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+#One structured record per request, subject to the per-route levels and sampling in logs.py
+access_logger = logging.getLogger("access")
+
+
+# SQL issued while serving one request, grouped by statement text
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = defaultdict(lambda: [0, 0.0])
+
+    def record(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = self.statements[statement]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def breakdown(self, top: int = 5) -> str:
+        heaviest = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return "; ".join(f"{count}x {seconds * 1000:.1f} ms {' '.join(statement.split())[:200]}"
+                         for statement, (count, seconds) in heaviest)
+
+
+#Set by the middleware for the duration of a request. Sync endpoints and the async engine's
+#greenlets run in a copy of the request's context, so they see the same RequestStats.
+current_request_stats: ContextVar[RequestStats | None] = ContextVar("current_request_stats", default=None)
+
+
+# Times every statement on `engine` (a sync Engine; pass AsyncEngine.sync_engine for async)
+# and adds it to the current request's stats. Statements outside a request are not counted.
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+        if started:
+            started.pop()
+
+
+class RequestMetrics:
+    def __init__(self):
+        labels = ("method", "route")
+        self.requests = Counter("http_requests_total", "Requests served.", ("method", "route", "status"))
+        self.in_progress = Gauge("http_requests_in_progress", "Requests being served.")
+        self.duration = Histogram("http_request_duration_seconds",
+                                  "Time until the last byte of the response was sent.", labels, LATENCY_BUCKETS)
+        self.db_queries = Histogram("http_request_db_queries", "SQL statements per request.", labels,
+                                    QUERY_COUNT_BUCKETS)
+        self.db_duration = Histogram("http_request_db_duration_seconds", "Time spent in SQL per request.", labels,
+                                     LATENCY_BUCKETS)
+        self.query_heavy = Counter("http_requests_query_heavy_total",
+                                   f"Requests with more than {N_PLUS_ONE_QUERY_THRESHOLD} SQL statements.", labels)
+
+    def observe(self, method: str, route: str, status_code: int, seconds: float, stats: RequestStats, streamed: bool):
+        labels = (method, route)
+        self.requests.inc((method, route, str(status_code)))
+        access_logger.info("%s %s %d", method, route, status_code, extra={
+            "method": method, "status": status_code, "duration_ms": round(seconds * 1000, 2),
+            "db_queries": stats.queries, "db_ms": round(stats.db_seconds * 1000, 2),
+        })
+        # An SSE stream lasts as long as the client stays connected, which says nothing about latency
+        if not streamed:
+            self.duration.observe(labels, seconds)
+        self.db_queries.observe(labels, stats.queries)
+        self.db_duration.observe(labels, stats.db_seconds)
+        if stats.queries > N_PLUS_ONE_QUERY_THRESHOLD:
+            self.query_heavy.inc(labels)
+            logger.warning("%s %s issued %d SQL statements (%.1f ms): %s", method, route, stats.queries,
+                           stats.db_seconds * 1000, stats.breakdown(), extra={"db_queries": stats.queries})
+        elif SLOW_REQUEST_MS and not streamed and seconds * 1000 >= SLOW_REQUEST_MS:
+            logger.warning("slow request %s %s %d took %.1f ms, %d SQL statements (%.1f ms): %s", method, route,
+                           status_code, seconds * 1000, stats.queries, stats.db_seconds * 1000, stats.breakdown(),
+                           extra={"duration_ms": round(seconds * 1000, 2), "db_queries": stats.queries})
+
+    def render(self) -> str:
+        metrics = (self.requests, self.in_progress, self.duration, self.db_queries, self.db_duration, self.query_heavy)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+# Pure ASGI (BaseHTTPMiddleware would buffer the streamed responses). Latency and query counts
+# are taken when the last body chunk is sent, so background tasks run afterwards don't count.
+# Routes are labelled by their path template ("/users/{user_id}"), unmatched paths as "unmatched".
+class RequestMetricsMiddleware:
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        response = {"status": 500, "streamed": False, "done": False}
+
+        def finish():
+            if response["done"]:
+                return
+            response["done"] = True
+            route = scope.get("route")
+            self.metrics.observe(scope["method"], getattr(route, "path", "unmatched"), response["status"],
+                                 time.perf_counter() - start, stats, response["streamed"])
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["streamed"] = any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                           for name, value in message.get("headers", ()))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        self.metrics.in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            self.metrics.in_progress.dec()
+            current_request_stats.reset(token)
+            finish()
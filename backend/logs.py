@@ -0,0 +1,239 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from uuid import uuid4
+
+#Structured logging: request threads and the event loop only put records on a bounded queue;
+#a listener thread formats them (JSON lines by default) and writes them out. When the queue is
+#full records are dropped and counted rather than blocking the request.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+#Per-route minimum levels and sampling rates for records logged while serving a request,
+#e.g. LOG_ROUTE_LEVELS="/metrics=WARNING,/events=WARNING" LOG_ROUTE_SAMPLING="/worklist=0.1".
+#Sampling is decided once per request and never drops WARNING and above.
+LOG_ROUTE_LEVELS = os.getenv("LOG_ROUTE_LEVELS", "/metrics=WARNING")
+LOG_ROUTE_SAMPLING = os.getenv("LOG_ROUTE_SAMPLING", "")
+#Keys whose values are always replaced, in extra fields and in logged dicts/models
+LOG_REDACT_FIELDS = os.getenv(
+    "LOG_REDACT_FIELDS",
+    "password,hashed_password,access_token,token,authorization,secret_key,cookie",
+)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+REDACTED = "[REDACTED]"
+
+#Bearer tokens, JWTs and bcrypt hashes that end up inside free-text messages
+SECRET_PATTERNS = [
+    re.compile(r"(?i)bearer\s+[\w\-.=]+"),
+    re.compile(r"eyJ[\w\-]+\.[\w\-]+\.[\w\-]+"),
+    re.compile(r"\$2[abxy]?\$\d{2}\$[./A-Za-z0-9]{53}"),
+]
+
+#Attributes every LogRecord has; anything else on a record came from `extra=` (except uvicorn's
+#ANSI-coloured copy of its message)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "color_message"}
+
+
+def _parse_routes(spec: str, convert) -> dict:
+    routes = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, value = item.rpartition("=")
+        routes[route] = convert(value)
+    return routes
+
+
+ROUTE_LEVELS = _parse_routes(LOG_ROUTE_LEVELS, lambda value: logging.getLevelName(value.upper()))
+ROUTE_SAMPLING = _parse_routes(LOG_ROUTE_SAMPLING, float)
+REDACT_FIELDS = frozenset(field.strip().lower() for field in LOG_REDACT_FIELDS.split(",") if field.strip())
+
+
+def redact(value):
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in REDACT_FIELDS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if hasattr(value, "model_dump"):
+        return redact(value.model_dump(mode="json"))
+    if isinstance(value, str):
+        for pattern in SECRET_PATTERNS:
+            value = pattern.sub(REDACTED, value)
+        return value
+    return value
+
+
+# The request a log record belongs to. The route is read from the ASGI scope when first needed,
+# since routing happens after the middleware has set the context.
+class RequestContext:
+    def __init__(self, request_id: str, scope: dict):
+        self.request_id = request_id
+        self.scope = scope
+        self._sampled = None
+
+    @property
+    def route(self) -> str | None:
+        route = self.scope.get("route")
+        return getattr(route, "path", None)
+
+    @property
+    def sampled(self) -> bool:
+        if self._sampled is None:
+            rate = ROUTE_SAMPLING.get(self.route, 1.0)
+            self._sampled = rate >= 1.0 or random.random() < rate
+        return self._sampled
+
+
+current_request: ContextVar[RequestContext | None] = ContextVar("current_request", default=None)
+
+
+# Runs in the logging caller, before the record is queued: stamps the request id and route
+# and applies the per-route levels and sampling
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        context = current_request.get()
+        if context is None:
+            return True
+        record.request_id = context.request_id
+        route = context.route
+        if route is not None:
+            record.route = route
+            if record.levelno < ROUTE_LEVELS.get(route, logging.NOTSET):
+                return False
+        return record.levelno >= logging.WARNING or context.sampled
+
+
+# Never blocks: a full queue drops the record
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    # Renders the (redacted) message and exception here, while the arguments are still in scope,
+    # but leaves the JSON formatting (and the write) to the listener thread
+    def prepare(self, record):
+        if isinstance(record.args, dict):
+            record.args = redact(record.args)
+        elif record.args:
+            record.args = tuple(redact(arg) for arg in record.args)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = REDACTED if key.lower() in REDACT_FIELDS else redact(value)
+        if record.exc_text:
+            entry["exception"] = redact(record.exc_text)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        line = redact(super().format(record))
+        extra = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        return f"{line} {json.dumps(redact(extra), default=str)}" if extra else line
+
+
+_handler: NonBlockingQueueHandler | None = None
+_listener: QueueListener | None = None
+
+
+# Routes every logger through one queue handler on the root logger. Idempotent; uvicorn's own
+# loggers are made to propagate here too, so the whole process logs in one format.
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT, stream=None) -> NonBlockingQueueHandler:
+    global _handler, _listener
+    if _handler is not None:
+        return _handler
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    _handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _handler.addFilter(RequestContextFilter())
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(level)
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    # Replaced by the structured "access" records from instrumentation.py
+    logging.getLogger("uvicorn.access").disabled = True
+    # SQLAlchemy's pool (and database.TimedPool, named after its class) logs every dispose at INFO
+    for name in ("sqlalchemy", "database"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return _handler
+
+
+# Flushes whatever is still queued
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict:
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
+
+
+# Gives every request an id (the client's X-Request-ID if it sent one), echoes it on the
+# response and makes it, and the route, available to every record logged while serving it.
+class RequestContextMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = current_request.set(RequestContext(request_id, scope))
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            current_request.reset(token)
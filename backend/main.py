@@ -1,21 +1,56 @@
+import time
+#Start of the import phase reported in the startup timings
+_import_started = time.perf_counter()
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+import logging
 import os
+import json
+import tempfile
 import jwt
 from models import *
-import uvicorn
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from jwt.exceptions import InvalidTokenError
-from typing import Optional, List, Type
+from typing import Literal, Optional, List
 from typing import Annotated
 from passlib.context import CryptContext
-from fastapi import Depends, FastAPI, HTTPException, Query, status
-from sqlmodel import Field, Session, SQLModel, create_engine, select, delete
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlmodel import Session, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel.ext.asyncio.session import AsyncSession
 import random
-from utils import is_eligible_for_tpa
+from cohort_stats import cohort_contributions, read_cohort_stats, track_cohort_stats, update_cohort_stats
+from export import EXPORT_MEDIA_TYPES, ExportError, export_columns, export_statement, stream_export
+from eligibility import has_missing_data, refresh_stale_tpa_eligibility, refresh_tpa_eligibility
+from cache import TTLCache
+from password_pool import PasswordHashingPool
+from database import create_async_db_engine, create_db_engine, pool_stats
+from migrations import migrate
+from search import SearchError, search_patients
+from ingest import bulk_insert, ingest_records
+from vitals_series import as_utc, downsample, record_vitals_observations, vitals_range_statement
+from purge import PurgeJobRegistry, count_users, purge_users
+from response_cache import ResponseCache, version_statement
+from fast_responses import encode, json_response, public_select
+from write_coordinator import WriteCoordinator
+from audit import AuditTrail
+from admission import ADMISSION_CONTROL, AdmissionControlMiddleware, AdmissionController
+from events import EventBroker, sse_stream
+from pagination import NEXT_CURSOR_HEADER, STREAM_BATCH_SIZE, keyset_page, stream_ndjson
+from instrumentation import RequestMetrics, RequestMetricsMiddleware, instrument_engine
+from metrics import Gauge
+from server import on_drain
+from logs import RequestContextMiddleware, configure_logging, logging_stats
 
 load_dotenv()
+#Queue-based structured logging for the whole process (see logs.py)
+configure_logging()
 
 #Secret key in .env files to encapsulate our private secrets and variables
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -23,10 +58,34 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 DATABASE_URL = os.getenv("DATABASE_URL")
 SUCCESSFUL_ELIGIBILITY_MESSAGE = "tPA administration, and admission to the ICU"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", 60))
+PASSWORD_POOL_SIZE = int(os.getenv("PASSWORD_POOL_SIZE", os.cpu_count() or 1))
+PASSWORD_POOL_QUEUE_LIMIT = int(os.getenv("PASSWORD_POOL_QUEUE_LIMIT", 64))
+PASSWORD_POOL_NICE = int(os.getenv("PASSWORD_POOL_NICE", 10))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 10000))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 300))
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+#Verified tokens -> resolved User, so authenticated requests skip the JWT decode and user lookup.
+#Entries expire with the token's exp (capped at TOKEN_CACHE_TTL_SECONDS)
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl_seconds=TOKEN_CACHE_TTL_SECONDS)
+
+#Serialized per-patient GET responses (user, vitals, results, consultations) with ETags. Each is
+#served only while its version read from the database is unchanged, so writes through other
+#workers are seen at once; the POST/DELETE handlers also drop this worker's entries after committing
+response_cache = ResponseCache(maxsize=RESPONSE_CACHE_SIZE, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS)
+
+#Delta events for the clinician dashboards, streamed at GET /events. Streams end as soon as
+#the worker starts draining, so shutdown doesn't wait on them
+event_broker = EventBroker()
+on_drain(event_broker.close)
+
+#Background DELETE /users/?background=true jobs, polled at /purge-jobs/{job_id}
+purge_jobs = PurgeJobRegistry()
+
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -38,13 +97,13 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+#bcrypt work for request handlers runs here, off the event loop
+password_pool = PasswordHashingPool(pwd_context, size=PASSWORD_POOL_SIZE, queue_limit=PASSWORD_POOL_QUEUE_LIMIT,
+                                    nice=PASSWORD_POOL_NICE)
+
 
 def clear_database():
-    with Session(engine) as session:
-        users = session.exec(select(User)).all()
-        for user in users:
-            session.delete(user)
-        session.commit()
+    purge_users(engine)
 
 #Creating the frontend web links(origins) that can access the backend
 origins = [
@@ -54,15 +113,18 @@ origins = [
 
 
 
-#Database setup
-connect_args = {"check_same_thread": False}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+#Database setup (engine profile is picked from DATABASE_URL, see database.py)
+engine = create_db_engine(DATABASE_URL)
+instrument_engine(engine)
 
 
 #Create database and tables upon startup
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    # Versioned migrations (see migrations.py) instead of a bare create_all
+    migrate(engine)
+    # Re-evaluates the stored tPA eligibility if the rule set changed since it was computed
+    refresh_stale_tpa_eligibility(engine)
 
 
 
@@ -72,6 +134,28 @@ def get_session():
 
 
 SessionDep = Annotated[Session, Depends(get_session)]
+
+
+#Async engine for the async def handlers so queries don't block the event loop
+#(aiosqlite for SQLite, asyncpg for Postgres)
+async_engine = create_async_db_engine(DATABASE_URL)
+instrument_engine(async_engine.sync_engine)
+
+
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+
+#Transactions of the POST handlers; grouped into shared commits with WRITE_COORDINATOR=true
+write_coordinator = WriteCoordinator(engine, async_engine)
+
+#Who read or changed which patient's data, buffered and written in batches (see audit.py)
+audit_trail = AuditTrail(engine)
+
+
 def seed_data():
     users = [
         User(
@@ -150,36 +234,83 @@ def seed_data():
                 session.add(lab_result)
                 session.add(consultation)
 
+        session.flush()
+        refresh_tpa_eligibility(session.connection(), [user.id for user in users])
+        update_cohort_stats(session.connection(), [user.id for user in users])
         session.commit()
 
-def on_startup():
-    create_db_and_tables()
-    #clear_database()
-    #seed_data()
-
+logger = logging.getLogger(__name__)
 
+#Seconds spent in each startup phase of this worker, logged and served at /metrics
+startup_phase_seconds = Gauge("app_startup_phase_seconds", "Seconds spent in each startup phase.", ("phase",))
 
 
-app = FastAPI(on_startup=on_startup())
+# Startup runs once per worker when the server starts it, not on import. With an up-to-date
+# schema the migration step is a version check (server.py migrates once before starting
+# workers); one connection per engine is opened so the first request doesn't pay for it.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    timings = {"import": _import_finished - _import_started}
+    started = time.perf_counter()
+    create_db_and_tables()
+    #clear_database()
+    #seed_data()
+    timings["schema"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with engine.connect():
+        pass
+    async with async_engine.connect():
+        pass
+    timings["connect"] = time.perf_counter() - started
+    audit_trail.start()
+
+    for phase, seconds in timings.items():
+        startup_phase_seconds.inc((phase,), seconds)
+    logger.info("startup: %s", ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in timings.items()))
+    yield
+
+    event_broker.close()
+    await write_coordinator.close()
+    # After the last request, so every access it recorded is written
+    await asyncio.to_thread(audit_trail.close)
+    password_pool.shutdown()
+    engine.dispose()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+#Priority classes per route, concurrency limits and queues (admission.py). Inside CORS, so shed
+#responses carry the CORS headers and browsers can read their Retry-After.
+admission_controller = AdmissionController()
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionControlMiddleware, controller=admission_controller, routes=app.routes)
 app.add_middleware(CORSMiddleware, allow_origins=origins, allow_methods=["*"], allow_headers=["*"],
-                   allow_credentials=True)
+                   allow_credentials=True, expose_headers=[NEXT_CURSOR_HEADER, "Retry-After"])
+#Per-route latency, SQL statement counts and DB time, served at /metrics
+request_metrics = RequestMetrics()
+app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+#Outermost: request ids (X-Request-ID) for every log record, including the metrics middleware's
+app.add_middleware(RequestContextMiddleware)
 
 
 # Code below omitted 👇
 
 
-def get_user(session: SessionDep, username: str) -> Optional[User]:
+async def get_user(session: AsyncSessionDep, username: str) -> Optional[User]:
     statement = select(User).where(User.username == username)
-    user = session.exec(statement).first()
-    print(user)
+    user = (await session.exec(statement)).first()
+    logger.debug("user lookup", extra={"username": username, "found": user is not None})
     return user
 
 
-def authenticate_user(session: SessionDep, username: str, password: str):
-    user = get_user(session, username)
+async def authenticate_user(session: AsyncSessionDep, username: str, password: str):
+    user = await get_user(session, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # Hand the DB connection back to the pool while bcrypt runs; the loaded user stays usable
+    await session.close()
+    if not await password_pool.verify(password, user.hashed_password):
         return False
     return user
 
@@ -197,8 +328,12 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
 async def get_current_user(
         token: Annotated[str, Depends(oauth2_scheme)],
-        session: SessionDep
+        session: AsyncSessionDep
 ):
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -213,10 +348,15 @@ async def get_current_user(
     except InvalidTokenError:
         raise credentials_exception
 
-    user = get_user(session, username=token_data.username)  # ✅ Correct
+    user = await get_user(session, username=token_data.username)  # ✅ Correct
+    # Hand the connection back now; long-lived responses (/events) would otherwise pin it
+    await session.close()
     if user is None:
         raise credentials_exception
-    return user
+    # Cache a detached copy so commits in other requests' sessions can't expire it
+    principal = User.model_validate(user.model_dump())
+    token_cache.set(token, principal, expires_at=payload.get("exp"))
+    return principal
 
 
 async def get_current_active_user(
@@ -225,12 +365,20 @@ async def get_current_active_user(
     return current_user
 
 
+# Operational and destructive endpoints (stats, /metrics, deleting users): clinicians only
+async def get_current_staff_user(
+        current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+    return current_user
+
+
 @app.post("/token")
 async def login_for_access_token(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-        session: SessionDep
+        session: AsyncSessionDep
 ) -> Token:
-    user = authenticate_user(session, form_data.username, form_data.password)
+    user = await authenticate_user(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -244,18 +392,17 @@ async def login_for_access_token(
     return Token(access_token=access_token, token_type="bearer")
 
 
-@app.get("/users/me/", response_model=User, tags=["Users"])
+@app.get("/users/me/", response_model=UserPublic, tags=["Users"])
 async def read_users_me(
         current_user: Annotated[User, Depends(get_current_active_user)],
 ):
-    return current_user
+    return json_response(UserPublic, current_user)
 
 
 @app.post("/users", response_model=UserPublic, tags=["Users"])
-def create_user(user: UserCreate, session: SessionDep) -> UserPublic:
+async def create_user(user: UserCreate) -> UserPublic:
+    hashed_password = await password_pool.hash(user.password)
     try:
-        hashed_password = get_password_hash(user.password)
-        print(hashed_password)
         db_user = User(
             name=user.name,
             username=user.username,
@@ -264,80 +411,175 @@ def create_user(user: UserCreate, session: SessionDep) -> UserPublic:
             hashed_password=hashed_password,  # Replace with hash function later
             role=user.role,
         )
-        session.add(db_user)
-        session.commit()
-        session.refresh(db_user)
 
+        def write(conn):
+            with track_cohort_stats(conn, [db_user.id]):
+                conn.execute(insert(User).values(**db_user.model_dump()))
+
+        await write_coordinator.run(write)
         return db_user
-    except Exception as e:
-        print("Error creating user:", e)
+    except Exception:
+        logger.exception("error creating user", extra={"username": user.username})
         raise HTTPException(status_code=500, detail="Something went wrong")
 
 
 
+# User listings page by id with an opaque cursor (next page token in the X-Next-Cursor header).
+# stream=true returns every remaining user as NDJSON instead of one page.
 @app.get("/users/", response_model=List[UserPublic], tags=["Users"])
 def read_user(
         session: SessionDep,
+        response: Response,
         offset: int = 0,
         limit: Annotated[int, Query(le=100)] = 100,
+        cursor: Optional[str] = None,
+        stream: bool = False,
 ) -> List[UserPublic]:
+    statement = public_select(User, UserPublic)
+    if stream:
+        return StreamingResponse(stream_ndjson(engine, statement, User.id, cursor, UserPublic),
+                                 media_type="application/x-ndjson")
+    if not offset:
+        return json_response(UserPublic, keyset_page(session, statement, User.id, cursor, limit, response), response)
     try:
-
-        users = session.exec(select(User).offset(offset).limit(limit)).all()
-        return users
-    except Exception as e:
-        print("Error getting user", e)
+        # offset paging is kept for existing clients; deep offsets get slower, prefer cursor
+        users = session.exec(statement.order_by(User.id).offset(offset).limit(limit)).all()
+        return json_response(UserPublic, users)
+    except Exception:
+        logger.exception("error listing users")
         raise HTTPException(status_code=500, detail="Something went wrong")
 
 
 @app.get("/users/{user_id}", response_model=UserPublic,  tags=["Users"])
-def read_user(user_id: str, session: SessionDep) -> UserPublic:
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="Hero not found")
-    return user
+def read_user(user_id: str, request: Request, session: SessionDep) -> UserPublic:
+    key = (user_id, "user")
+    version = session.exec(version_statement(*key)).first()
+    entry = response_cache.get(key, version)
+    if entry is None:
+        user = session.exec(public_select(User, UserPublic).where(User.id == user_id)).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="Hero not found")
+        entry = response_cache.store(key, version, encode(UserPublic, user))
+    return response_cache.respond(request, entry)
 
 
 @app.delete("/users/{user_id}", response_model=dict, tags=["Users"])
-def delete_user(user_id: str, session: SessionDep):
+def delete_user(
+    user_id: str,
+    session: SessionDep,
+    current_user: Annotated[User, Depends(get_current_staff_user)],
+):
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Hero not found")
-    session.delete(user)
+    with track_cohort_stats(session.connection(), [user_id]):
+        session.delete(user)
+        session.flush()
     session.commit()
+    audit_trail.record(current_user, "delete", "user", [user_id])
+    token_cache.invalidate_where(lambda token, cached_user: cached_user.id == user_id)
+    response_cache.invalidate(user_id)
     return {"ok": True}
 
 
-@app.delete("/users/", response_model=dict,  tags=["Users"])
-def delete_all_users(session: SessionDep):
-    statement = select(User)
-    users = session.exec(statement).all()
+def clear_user_caches():
+    token_cache.clear()
+    response_cache.clear()
+
 
-    if not users:
+@app.delete("/users/", response_model=dict,  tags=["Users"])
+def delete_all_users(
+    background_tasks: BackgroundTasks,
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_staff_user)],
+    background: bool = Query(False, description="Run the purge as a background job and return its id"),
+):
+    total = count_users(engine)
+    if not total:
         return {"message": "No users to delete."}
 
-    for user in users:
+    if background:
+        job = purge_jobs.start(total)
+        if job is None:
+            raise HTTPException(status_code=409, detail="A purge is already running.")
+        audit_trail.record(current_user, "delete", "user")
+        background_tasks.add_task(job.run, engine, on_done=clear_user_caches)
+        response.status_code = status.HTTP_202_ACCEPTED
+        # The only time the token is sent: GET /purge-jobs/{job_id} needs it in X-Purge-Job-Token
+        return {**job.to_dict(), "token": job.token}
 
-        # manually delete related vitals, labs, consultations
-        session.exec(delete(Vitals).where(Vitals.user_id == user.id))
-        session.exec(delete(LabResult).where(LabResult.user_id == user.id))
-        session.exec(delete(NeurologistConsultation).where(NeurologistConsultation.user_id == user.id))
-        session.delete(user)
+    deleted = purge_users(engine)
+    audit_trail.record(current_user, "delete", "user")
+    clear_user_caches()
+
+    return {"message": f"Deleted {deleted} users."}
+
+
+@app.get("/purge-jobs/{job_id}", response_model=dict, tags=["Users"])
+def get_purge_job(job_id: str, token: Annotated[Optional[str], Header(alias="X-Purge-Job-Token")] = None):
+    job = purge_jobs.get(job_id)
+    if job is None or not job.has_token(token):
+        raise HTTPException(status_code=404, detail="Purge job not found.")
+    return job.to_dict()
+
+
+@app.get("/token/cache-stats", response_model=dict, tags=["Users"], dependencies=[Depends(get_current_staff_user)])
+def get_token_cache_stats():
+    return token_cache.stats()
+
+
+@app.get("/token/hashing-stats", response_model=dict, tags=["Users"], dependencies=[Depends(get_current_staff_user)])
+def get_password_hashing_stats():
+    return password_pool.stats()
+
+
+@app.get("/response-cache/stats", response_model=dict, tags=["Users"], dependencies=[Depends(get_current_staff_user)])
+def get_response_cache_stats():
+    return response_cache.stats()
 
-    session.commit()
 
-    return {"message": f"Deleted {len(users)} users."}
+@app.get("/admission/stats", response_model=dict, tags=["Admission"], dependencies=[Depends(get_current_staff_user)])
+async def get_admission_stats():
+    return {"enabled": ADMISSION_CONTROL, **admission_controller.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False,
+         dependencies=[Depends(get_current_staff_user)])
+def get_metrics():
+    # Prometheus text format; counts are per worker process
+    log_queue = logging_stats()
+    families = (startup_phase_seconds.render() + write_coordinator.render() + admission_controller.render()
+                + audit_trail.render())
+    body = (request_metrics.render() + "\n".join(families) + "\n"
+            f"# TYPE log_records_queued gauge\nlog_records_queued {log_queue['queued']}\n"
+            f"# TYPE log_records_dropped_total counter\nlog_records_dropped_total {log_queue['dropped']}\n")
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/db/pool-stats", response_model=dict, tags=["Database"], dependencies=[Depends(get_current_staff_user)])
+def get_db_pool_stats():
+    return {"sync": pool_stats(engine, "sync"), "async": pool_stats(async_engine, "async")}
 
 
 def verify_role(current_user: User, allowed_roles: list[str]):
     if current_user.role not in allowed_roles:
         raise HTTPException(status_code=403, detail="Operation not permitted for your role.")
 
+
+# Runs a write of a patient's vitals, results or consultations. Foreign keys are enforced, so a
+# patient deleted in the meantime (another worker's token cache may still resolve them) fails the
+# user_id reference: that is a 404, not a 500.
+async def write_patient_data(write):
+    try:
+        await write_coordinator.run(write)
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="Patient not found.")
+
 # VITALS
 @app.post("/users/me/vitals", response_model=VitalsPublic, tags=["Vitals"])
 async def create_vitals_for_user(
     vitals: VitalsCreate,
-    session: SessionDep,
+    session: AsyncSessionDep,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     verify_role(current_user, ["Patient"])
@@ -345,128 +587,553 @@ async def create_vitals_for_user(
     simulated_nihss = random.randint(0, 10)
     simulated_inr = round(random.uniform(0.8, 3.0), 2)
 
-    db_vitals = Vitals(
-        **vitals.dict(),
-        user_id=current_user.id,
-        nihss_score=simulated_nihss,
-        inr_score=simulated_inr
-    )
-    session.add(db_vitals)
-    session.commit()
-    session.refresh(db_vitals)
+    # Appended to the vitals series; the current snapshot is updated with the new values
+    def write(conn):
+        with track_cohort_stats(conn, [current_user.id]):
+            record_vitals_observations(conn, [{
+                **vitals.model_dump(exclude_none=True),
+                "user_id": current_user.id,
+                "nihss_score": simulated_nihss,
+                "inr_score": simulated_inr,
+            }])
+            # Stored eligibility (and the cohort rollups) are updated in the same transaction
+            refresh_tpa_eligibility(conn, [current_user.id])
+
+    await write_patient_data(write)
+    audit_trail.record(current_user, "create", "vitals", [current_user.id])
+    response_cache.invalidate(current_user.id, ["vitals"])
+    db_vitals = (await session.exec(select(Vitals).where(Vitals.user_id == current_user.id))).first()
+    event_broker.publish("vitals", current_user.id, {"vitals": VitalsPublic.model_validate(db_vitals).model_dump(mode="json")})
     return db_vitals
 
 @app.get("/users/{user_id}/vitals", response_model=VitalsPublic, tags=["Vitals"])
 async def get_vitals_for_user(
+    user_id: str,
+    request: Request,
+    session: AsyncSessionDep,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    verify_role(current_user, ["Doctor", "Neurologist", "Patient"])
+    key = (user_id, "vitals")
+    version = (await session.exec(version_statement(*key))).first()
+    entry = response_cache.get(key, version)
+    if entry is None:
+        vitals = (await session.exec(public_select(Vitals, VitalsPublic).where(Vitals.user_id == user_id))).first()
+        if not vitals:
+            raise HTTPException(status_code=404, detail="Vitals not found.")
+        entry = response_cache.store(key, version, encode(VitalsPublic, vitals))
+    # A 304 revalidation is an access too
+    audit_trail.record(current_user, "read", "vitals", [user_id])
+    return response_cache.respond(request, entry)
+
+@app.get("/users/{user_id}/vitals/history", response_model=List[VitalsObservationPublic], tags=["Vitals"])
+async def get_vitals_history_for_user(
+    user_id: str,
+    session: AsyncSessionDep,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Annotated[int, Query(le=10000)] = 1000,
+):
+    verify_role(current_user, ["Doctor", "Neurologist", "Patient"])
+    observations = (await session.exec(vitals_range_statement(user_id, start, end).limit(limit))).all()
+    audit_trail.record(current_user, "read", "vitals_history", [user_id])
+    return observations
+
+
+# Chart view: min/max/last per bucket over [start, end); buckets are aligned to `start` when given
+@app.get("/users/{user_id}/vitals/history/downsampled", response_model=List[VitalsBucket], tags=["Vitals"])
+def get_downsampled_vitals_for_user(
     user_id: str,
     session: SessionDep,
     current_user: Annotated[User, Depends(get_current_active_user)],
+    bucket_seconds: Annotated[int, Query(ge=1)] = 900,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
 ):
     verify_role(current_user, ["Doctor", "Neurologist", "Patient"])
-    vitals = session.exec(select(Vitals).where(Vitals.user_id == user_id)).first()
-    if not vitals:
-        raise HTTPException(status_code=404, detail="Vitals not found.")
-    return vitals
+    observations = session.exec(
+        vitals_range_statement(user_id, start, end).execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    audit_trail.record(current_user, "read", "vitals_history", [user_id])
+    return downsample(observations, timedelta(seconds=bucket_seconds), origin=as_utc(start))
+
+# DASHBOARD EVENTS
+# Server-sent events: "vitals", "results" and "consultations" deltas as the handlers commit, for the
+# given patients (repeat patient_id) or for every patient when none are given. A client that falls
+# behind gets a "resync" event and should refetch.
+@app.get("/events", tags=["Events"])
+async def stream_dashboard_events(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    patient_id: Annotated[Optional[List[str]], Query()] = None,
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+    return StreamingResponse(sse_stream(event_broker, patient_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/events/stats", response_model=dict, tags=["Events"], dependencies=[Depends(get_current_staff_user)])
+async def get_event_stats():
+    return event_broker.stats()
 
 # LAB RESULTS
 @app.post("/users/me/results", response_model=LabResultPublic, tags=["Results"])
 async def create_lab_result_for_user(
 
     lab_result: LabResultCreate,
-    session: SessionDep,
+    session: AsyncSessionDep,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     verify_role(current_user, ["Patient"])
 
     db_lab_result = LabResult(
-        **lab_result.dict(),
+        **lab_result.model_dump(),
         user_id=current_user.id
     )
-    session.add(db_lab_result)
-    session.commit()
-    session.refresh(db_lab_result)
+
+    def write(conn):
+        with track_cohort_stats(conn, [current_user.id]):
+            conn.execute(insert(LabResult).values(**db_lab_result.model_dump()))
+            # Stored eligibility (and the cohort rollups) are updated in the same transaction
+            refresh_tpa_eligibility(conn, [current_user.id])
+
+    await write_patient_data(write)
+    audit_trail.record(current_user, "create", "results", [current_user.id])
+    response_cache.invalidate(current_user.id, ["results"])
+    event_broker.publish("results", current_user.id, {"lab_result": LabResultPublic.model_validate(db_lab_result).model_dump(mode="json")})
     return db_lab_result
 
 @app.get("/users/{user_id}/results", response_model=LabResultPublic,  tags=["Results"])
 async def get_lab_result_for_user(
     user_id: str,
-    session: SessionDep,
+    request: Request,
+    session: AsyncSessionDep,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     #verifies if user is a doctor or neurologist and allows them to perform the request
     verify_role(current_user, ["Doctor", "Neurologist"])
     #verify_role(current_user, ["Doctor", "Neurologist", "Patient"])
-    lab_result = session.exec(select(LabResult).where(LabResult.user_id == user_id)).first()
-    if not lab_result:
-        raise HTTPException(status_code=404, detail="Lab results not found.")
-    return lab_result
+    key = (user_id, "results")
+    version = (await session.exec(version_statement(*key))).first()
+    entry = response_cache.get(key, version)
+    if entry is None:
+        # The latest result, from ix_labresult_user_id_created_at
+        lab_result = (await session.exec(
+            public_select(LabResult, LabResultPublic).where(LabResult.user_id == user_id)
+            .order_by(LabResult.created_at.desc())
+        )).first()
+        if not lab_result:
+            raise HTTPException(status_code=404, detail="Lab results not found.")
+        entry = response_cache.store(key, version, encode(LabResultPublic, lab_result))
+    audit_trail.record(current_user, "read", "results", [user_id])
+    return response_cache.respond(request, entry)
+
+# BULK INGEST
+# Accepts a JSON array or streamed NDJSON (one record per line) for many patients and inserts in
+# chunked bulk statements. The body is consumed while it arrives; per-row statuses are spooled to
+# a temp file and streamed back as NDJSON, so memory stays flat however many rows are sent.
+async def spooled_ndjson_response(statuses):
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode="w+b")
+    async for item in statuses:
+        spool.write(json.dumps(item).encode() + b"\n")
+    spool.seek(0)
+
+    def lines():
+        with spool:
+            yield from spool
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def write_vitals_observations(conn, items):
+    user_ids = {item.user_id for item in items}
+    before = await conn.run_sync(cohort_contributions, user_ids)
+    ids = await conn.run_sync(record_vitals_observations, [item.model_dump(exclude_none=True) for item in items])
+    await conn.run_sync(refresh_tpa_eligibility, user_ids)
+    await conn.run_sync(update_cohort_stats, user_ids, before)
+    return ids
+
+
+insert_lab_results = bulk_insert(LabResult)
+
+
+async def write_lab_results(conn, items):
+    user_ids = {item.user_id for item in items}
+    before = await conn.run_sync(cohort_contributions, user_ids)
+    ids = await insert_lab_results(conn, items)
+    await conn.run_sync(refresh_tpa_eligibility, user_ids)
+    await conn.run_sync(update_cohort_stats, user_ids, before)
+    return ids
+
+
+# Bulk writes send one payload-free event per patient per chunk; dashboards refetch (with ETags)
+def invalidate_responses(user_ids, resource):
+    for user_id in user_ids:
+        response_cache.invalidate(user_id, [resource])
+        event_broker.publish(resource, user_id, {"bulk": True})
+
+
+def ingested(actor, user_ids, resource):
+    audit_trail.record(actor, "create", resource, user_ids)
+    invalidate_responses(user_ids, resource)
+
+
+@app.post("/ingest/vitals", tags=["Vitals"])
+async def ingest_vitals(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+    return await spooled_ndjson_response(ingest_records(
+        request, async_engine, VitalsIngest, write_vitals_observations,
+        on_commit=lambda user_ids: ingested(current_user, user_ids, "vitals"),
+    ))
+
+
+@app.post("/ingest/results", tags=["Results"])
+async def ingest_lab_results(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+    return await spooled_ndjson_response(ingest_records(
+        request, async_engine, LabResultIngest, write_lab_results,
+        on_commit=lambda user_ids: ingested(current_user, user_ids, "results"),
+    ))
+
 
 @app.get("/users/role/{role}", response_model=List[UserPublic], tags=["Users"])
 def get_users_by_role(
     role: Role,
     session: SessionDep,
     current_user: Annotated[User, Depends(get_current_active_user)],
+    response: Response,
+    limit: Annotated[int, Query(le=1000)] = 100,
+    cursor: Optional[str] = None,
+    stream: bool = False,
 ):
     # Optional: restrict to certain roles
     verify_role(current_user, ["Doctor", "Neurologist"])
 
-    users = session.exec(select(User).where(User.role == role)).all()
-    return users
+    # (role, id) is covered by ix_user_role_id
+    statement = public_select(User, UserPublic).where(User.role == role)
+    if stream:
+        return StreamingResponse(stream_ndjson(engine, statement, User.id, cursor, UserPublic),
+                                 media_type="application/x-ndjson")
+    return json_response(UserPublic, keyset_page(session, statement, User.id, cursor, limit, response), response)
 
 # NEUROLOGIST CONSULTATION
 @app.post("/users/{user_id}/consultations", response_model=NeurologistConsultationPublic,  tags=["Consultations"])
 async def create_consultation_for_user(
     user_id: str,
     consultation: NeurologistConsultationCreate,
-    session: SessionDep,
+    session: AsyncSessionDep,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     verify_role(current_user, ["Neurologist"])
 
+    patient = await session.get(User, user_id)
+    # Hand the connection back before the write, which takes its own
+    await session.close()
+    if not patient or patient.role != Role.patient:
+        raise HTTPException(status_code=404, detail="Patient not found.")
+
     db_consultation = NeurologistConsultation(
-        **consultation.dict(),
+        **consultation.model_dump(),
         user_id=user_id
     )
-    session.add(db_consultation)
-    session.commit()
-    session.refresh(db_consultation)
+
+    def write(conn):
+        with track_cohort_stats(conn, [user_id]):
+            conn.execute(insert(NeurologistConsultation).values(**db_consultation.model_dump()))
+
+    await write_patient_data(write)
+    audit_trail.record(current_user, "create", "consultations", [user_id])
+    response_cache.invalidate(user_id, ["consultations"])
+    event_broker.publish("consultations", user_id, {
+        "consultation": NeurologistConsultationPublic.model_validate(db_consultation).model_dump(mode="json")
+    })
     return db_consultation
 
 @app.get("/users/{user_id}/consultations", response_model=List[NeurologistConsultationPublic], tags=["Consultations"])
 async def get_consultations_for_user(
     user_id: str,
-    session: SessionDep,
+    request: Request,
+    session: AsyncSessionDep,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     verify_role(current_user, ["Doctor", "Neurologist"])
 
-    consultations = session.exec(select(NeurologistConsultation).where(NeurologistConsultation.user_id == user_id)).all()
-    return consultations
+    key = (user_id, "consultations")
+    version = (await session.exec(version_statement(*key))).first()
+    entry = response_cache.get(key, version)
+    if entry is None:
+        consultations = (await session.exec(
+            public_select(NeurologistConsultation, NeurologistConsultationPublic)
+            .where(NeurologistConsultation.user_id == user_id)
+        )).all()
+        entry = response_cache.store(key, version, encode(NeurologistConsultationPublic, list(consultations)))
+    audit_trail.record(current_user, "read", "consultations", [user_id])
+    return response_cache.respond(request, entry)
+
 @app.get("/users/{user_id}/tpa-eligibility", response_model=dict)
 async def check_tpa_eligibility(
     user_id: str,
-    session: SessionDep,
+    session: AsyncSessionDep,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
     verify_role(current_user, ["Doctor", "Neurologist"])
 
-    user = session.get(User, user_id)
-    vitals = session.exec(select(Vitals).where(Vitals.user_id == user_id)).first()
-    lab_result = session.exec(select(LabResult).where(LabResult.user_id == user_id)).first()
-
-    if not user or not vitals or not lab_result:
+    # One primary-key read of the stored eligibility (see eligibility.py)
+    eligibility = await session.get(TpaEligibility, user_id)
+    if not eligibility or has_missing_data(eligibility.failed_criteria):
         raise HTTPException(status_code=404, detail="Missing data for eligibility evaluation.")
 
-    eligible = is_eligible_for_tpa(vitals, lab_result, user)
+    audit_trail.record(current_user, "read", "tpa_eligibility", [user_id])
+    return {
+        "eligible_for_tpa": tpa_eligibility_message(eligibility),
+        "failed_criteria": eligibility.failed_criteria,
+        "rules_version": eligibility.rules_version,
+    }
+
+
+def tpa_eligibility_message(eligibility: TpaEligibility) -> str:
     message = "Do not administer tPA"
 
-    if eligible:
+    if eligibility.eligible:
         message = SUCCESSFUL_ELIGIBILITY_MESSAGE
 
-    return {"eligible_for_tpa": message}
+    return message
+
+
+# COHORT SCREENING
+# Reads the stored eligibility of every patient, e.g. the ED census after a protocol change.
+# eligible_only walks ix_tpaeligibility_eligible_user_id; patients without a stored row have
+# no vitals or lab results yet.
+@app.get("/tpa-eligibility", response_model=List[TpaScreeningResult], tags=["Eligibility"])
+def screen_tpa_eligibility(
+    session: SessionDep,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    eligible_only: bool = False,
+    offset: int = 0,
+    limit: Annotated[int, Query(le=10000)] = 1000,
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+
+    if eligible_only:
+        statement = (
+            select(TpaEligibility.user_id, TpaEligibility)
+            .where(TpaEligibility.eligible.is_(True))
+            .order_by(TpaEligibility.user_id)
+        )
+    else:
+        statement = (
+            select(User.id, TpaEligibility)
+            .outerjoin(TpaEligibility, TpaEligibility.user_id == User.id)
+            .where(User.role == Role.patient)
+            .order_by(User.id)
+        )
+    rows = session.exec(statement.offset(offset).limit(limit)).all()
+    audit_trail.record(current_user, "read", "tpa_eligibility", [user_id for user_id, _ in rows])
+
+    results = []
+    for user_id, eligibility in rows:
+        criteria = eligibility.failed_criteria if eligibility else ["missing_vitals", "missing_lab_result"]
+        results.append(TpaScreeningResult(
+            user_id=user_id,
+            eligible=bool(eligibility and eligibility.eligible),
+            failed_criterion=criteria[0] if criteria else None,
+            failed_criteria=criteria,
+            rules_version=eligibility.rules_version if eligibility else None,
+        ))
+    return results
+
+
+# WORKLIST
+# One paginated request for the clinician dashboards instead of users + 4 calls per patient.
+# Relationships are loaded with a fixed number of queries per page, not one per patient, and
+# eligibility is the stored row, joined in (eligible_only pages through the eligible patients).
+# Pages by patient id with an opaque cursor (next page token in the X-Next-Cursor header); a
+# dashboard follows it until there is none to cover the whole census.
+@app.get("/worklist", response_model=List[PatientWorklistItem], tags=["Worklist"])
+def get_patient_worklist(
+    session: SessionDep,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    response: Response,
+    eligible_only: bool = False,
+    offset: int = 0,
+    limit: Annotated[int, Query(le=100)] = 50,
+    cursor: Optional[str] = None,
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+
+    # The page key leads each row, so keyset_page can read it
+    if eligible_only:
+        key_column = TpaEligibility.user_id
+        statement = (
+            select(TpaEligibility.user_id, User, TpaEligibility)
+            .select_from(TpaEligibility)
+            .join(User, User.id == TpaEligibility.user_id)
+            .where(TpaEligibility.eligible.is_(True))
+        )
+    else:
+        key_column = User.id
+        statement = (
+            select(User.id, User, TpaEligibility)
+            .outerjoin(TpaEligibility, TpaEligibility.user_id == User.id)
+            .where(User.role == Role.patient)
+        )
+    statement = statement.options(selectinload(User.vitals), selectinload(User.consultations))
+    if offset:
+        # offset paging is kept for existing clients; deep offsets get slower, prefer cursor
+        rows = session.exec(statement.order_by(key_column).offset(offset).limit(limit)).all()
+    else:
+        rows = keyset_page(session, statement, key_column, cursor, limit, response)
+
+    # Latest lab result per patient on this page, in a single query
+    patient_ids = [patient.id for _, patient, _ in rows]
+    audit_trail.record(current_user, "read", "worklist", patient_ids)
+    latest_labs = {}
+    if patient_ids:
+        lab_results = session.exec(
+            select(LabResult)
+            .where(LabResult.user_id.in_(patient_ids))
+            .order_by(LabResult.user_id, LabResult.created_at.desc())
+        ).all()
+        for lab_result in lab_results:
+            latest_labs.setdefault(lab_result.user_id, lab_result)
+
+    worklist = []
+    for _, patient, eligibility in rows:
+        # Unknown until the patient has both vitals and a lab result
+        eligible_for_tpa = None
+        if eligibility and not has_missing_data(eligibility.failed_criteria):
+            eligible_for_tpa = tpa_eligibility_message(eligibility)
+
+        worklist.append(PatientWorklistItem(
+            id=patient.id,
+            name=patient.name,
+            username=patient.username,
+            age=patient.age,
+            gender=patient.gender,
+            role=patient.role,
+            vitals=patient.vitals,
+            lab_result=latest_labs.get(patient.id),
+            consultations=patient.consultations,
+            eligible_for_tpa=eligible_for_tpa,
+        ))
+    return worklist
+
+
+# COHORT STATISTICS
+# The dashboards' figures from the rollups (see cohort_stats.py), a handful of rows however many
+# patients there are. role=Patient for the patient cards; group_by splits them per role or age band.
+@app.get("/stats", response_model=List[CohortStats], tags=["Stats"])
+def get_cohort_stats(
+    session: SessionDep,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    role: Optional[Role] = None,
+    group_by: Optional[Literal["role", "age_band"]] = None,
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+    return read_cohort_stats(session.connection(), role, group_by)
+
+
+# CLINICAL SEARCH
+# Patients whose complaints, history, diagnoses or treatment plans mention every word of q (each
+# word a prefix), best match first, from the full-text index (see search.py). fields is
+# comma-separated, e.g. fields=medical_history.
+@app.get("/search/patients", response_model=List[PatientSearchResult], tags=["Search"])
+def search_patient_notes(
+    session: SessionDep,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    fields: Optional[str] = None,
+    offset: int = 0,
+    limit: Annotated[int, Query(le=100)] = 20,
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+    try:
+        matches = search_patients(session.connection(), q, fields.split(",") if fields else None, offset, limit)
+    except SearchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    patients = {user.id: user for user in session.exec(select(User).where(User.id.in_([m[0] for m in matches])))}
+    audit_trail.record(current_user, "read", "search", list(patients))
+    return [
+        PatientSearchResult(user_id=user_id, name=patients[user_id].name, age=patients[user_id].age,
+                            score=score, snippet=snippet)
+        for user_id, score, snippet in matches if user_id in patients
+    ]
+
+
+# CLINICAL DATA EXPORT
+# The joined dataset for registry submissions, streamed off a server-side cursor as CSV, Parquet or
+# an Arrow stream (the last two need pyarrow); see export.py. columns is comma-separated; start/end
+# filter on the lab result's created_at.
+@app.get("/export", tags=["Export"])
+def export_dataset(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    export_format: Annotated[str, Query(alias="format")] = "csv",
+    columns: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    verify_role(current_user, ["Doctor", "Neurologist"])
+    try:
+        selected = export_columns(columns.split(",") if columns else None, export_format)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    audit_trail.record(current_user, "read", "export")
+    return StreamingResponse(
+        stream_export(engine, export_statement(selected, start, end), selected, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="clinical-export.{export_format}"'},
+    )
+
+
+# AUDIT TRAIL
+# Accesses to patient data, newest first, for a patient and/or an actor (both indexed); see audit.py.
+# Events reach the table within AUDIT_FLUSH_INTERVAL_MS. Patients can read their own record's trail.
+@app.get("/audit/events", response_model=List[AuditEventPublic], tags=["Audit"])
+def get_audit_events(
+    session: SessionDep,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    response: Response,
+    patient_id: Optional[str] = None,
+    actor_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Annotated[int, Query(le=1000)] = 100,
+    cursor: Optional[str] = None,
+):
+    if current_user.role == Role.patient:
+        if patient_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Patients can only read the audit trail of their own record.")
+    else:
+        verify_role(current_user, ["Doctor", "Neurologist"])
+
+    statement = public_select(AuditEvent, AuditEventPublic)
+    if patient_id is not None:
+        statement = statement.where(AuditEvent.patient_id == patient_id)
+    if actor_id is not None:
+        statement = statement.where(AuditEvent.actor_id == actor_id)
+    if start is not None:
+        statement = statement.where(AuditEvent.occurred_at >= as_utc(start))
+    if end is not None:
+        statement = statement.where(AuditEvent.occurred_at < as_utc(end))
+    events = keyset_page(session, statement, AuditEvent.id, cursor, limit, response, descending=True)
+    return json_response(AuditEventPublic, events, response)
+
+
+@app.get("/audit/stats", response_model=dict, tags=["Audit"], dependencies=[Depends(get_current_staff_user)])
+def get_audit_stats():
+    return audit_trail.stats()
+
+
+_import_finished = time.perf_counter()
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000,
-                reload=True,
-                log_level="debug")
+    # python main.py [--workers N] [--reload]; see server.py
+    import server
+    server.main()
@@ -0,0 +1,110 @@
+from bisect import bisect_left
+from collections import deque
+from threading import Lock
+
+
+# Keeps the last `window` samples (in seconds) plus running totals, and reports
+# millisecond percentiles over the window.
+class LatencyRecorder:
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self._samples.append(seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, maximum = self.count, self.total, self.max
+        return {
+            "count": count,
+            "total_ms": round(total * 1000, 2),
+            "max_ms": round(maximum * 1000, 2),
+            **percentiles(samples),
+        }
+
+
+def percentiles(sorted_values) -> dict:
+    if not sorted_values:
+        return {"p50": None, "p95": None, "p99": None}
+
+    def pick(fraction):
+        index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+        return round(sorted_values[index] * 1000, 2)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+# Prometheus-style metrics, rendered in the text exposition format. Label values are passed
+# as a tuple in the order of `label_names`.
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, label_names: tuple = ()):
+        self.name, self.help, self.label_names = name, help, label_names
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{self.name}{_labels(self.label_names, labels)} {value}" for labels, value in values]
+        return lines
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label_names: tuple, buckets):
+        self.name, self.help, self.label_names = name, help, label_names
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (not cumulative)..., +Inf count, sum]
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], values):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_labels((*self.label_names, 'le'), (*labels, le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
@@ -0,0 +1,281 @@
+import sys
+
+from sqlalchemy import (JSON, Boolean, Column, DateTime, Enum, Float, ForeignKey, Index, Integer, MetaData, String,
+                        Table, inspect, text)
+from sqlmodel import SQLModel
+
+import audit  # noqa: F401  (guards a freshly created auditevent table)
+import models  # noqa: F401  (registers the tables on SQLModel.metadata)
+from cohort_stats import recompute_cohort_stats
+from eligibility import refresh_all_tpa_eligibility
+from search import rebuild_search_index
+
+#Versioned schema migrations, replacing a bare SQLModel.metadata.create_all on startup.
+#  - empty database: create the current schema and stamp it with the latest version
+#  - database created before versioning (tables but no schema_version): treat it as
+#    version 1, the schema as originally shipped, and apply everything after it
+#  - versioned database: apply only the migrations newer than its version
+#Each migration's DDL is frozen below as it was when the migration was written, never taken from
+#models.py or the modules that use the tables, so replaying an old migration always builds the
+#schema of its day. Derived data (stored eligibility, rollups, the search index) is not filled in
+#by the migrations: each names what it left empty and migrate() rebuilds it with the current code
+#once every migration has run, in the same transaction.
+
+SCHEMA_VERSION_TABLE = "schema_version"
+
+#Single-column indexes created by the original models (index=True on almost every field)
+LEGACY_INDEXES = {
+    "vitals": [
+        "chief_complaint", "medical_history", "blood_pressure_systolic", "blood_pressure_diastolic",
+        "heart_rate", "respiratory_rate", "oxygen_saturation", "significant_head_trauma", "recent_surgery",
+        "recent_myocardial_infarction", "recent_hemorrhage", "platelet_count", "nihss_score", "inr_score",
+    ],
+    "labresult": ["cbc", "bmp_glucose", "creatinine", "coagulation"],
+    "neurologistconsultation": ["tpa_approval", "diagnosis", "treatment_plan"],
+}
+
+
+def migration_0002_index_overhaul(conn):
+    # Drop the B-trees no query uses, add the ones main.py actually filters on
+    for table, columns in LEGACY_INDEXES.items():
+        for column in columns:
+            conn.execute(text(f"DROP INDEX IF EXISTS ix_{table}_{column}"))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_user_username ON "user" (username)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_user_role_id ON "user" (role, id)'))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_labresult_user_id_created_at ON labresult (user_id, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_neurologistconsultation_user_id ON neurologistconsultation (user_id)"))
+
+
+#Tables as created by migrations 3-7. "user" is only here to resolve the foreign keys.
+_frozen = MetaData()
+Table("user", _frozen, Column("id", String, primary_key=True))
+_ROLE = Enum("patient", "doctor", "neurologist", name="role")
+
+VITALS_OBSERVED_AT_0003 = Column("observed_at", DateTime(timezone=True))
+
+VITALSOBSERVATION_0003 = Table(
+    "vitalsobservation", _frozen,
+    Column("observed_at", DateTime(timezone=True), nullable=False),
+    *(Column(name, Integer) for name in ("blood_pressure_systolic", "blood_pressure_diastolic", "heart_rate",
+                                         "respiratory_rate", "oxygen_saturation", "nihss_score")),
+    Column("inr_score", Float),
+    Column("id", Integer, primary_key=True),
+    Column("user_id", String, ForeignKey("user.id", ondelete="CASCADE"), nullable=False),
+    Index("ix_vitalsobservation_user_id_observed_at", "user_id", "observed_at"),
+)
+
+TPAELIGIBILITY_0004 = Table(
+    "tpaeligibility", _frozen,
+    Column("user_id", String, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True),
+    Column("eligible", Boolean, nullable=False),
+    Column("failed_criteria", JSON, nullable=False),
+    Column("rules_version", Integer, nullable=False),
+    Column("evaluated_at", DateTime(timezone=True), nullable=False),
+    Index("ix_tpaeligibility_eligible_user_id", "eligible", "user_id"),
+    Index("ix_tpaeligibility_rules_version", "rules_version"),
+)
+
+COHORTROLLUP_0005 = Table(
+    "cohortrollup", _frozen,
+    Column("role", _ROLE, primary_key=True),
+    Column("age_band", String, primary_key=True),
+    *(Column(name, Integer, nullable=False)
+      for name in ("users", "pending", "eligible", "approved", "denied", "nihss_sum", "nihss_count")),
+)
+
+AUDITEVENT_0007 = Table(
+    "auditevent", _frozen,
+    Column("occurred_at", DateTime(timezone=True), nullable=False),
+    Column("actor_id", String),
+    Column("actor_role", _ROLE),
+    Column("action", String, nullable=False),
+    Column("resource", String, nullable=False),
+    Column("patient_id", String),
+    Column("request_id", String),
+    Column("id", Integer, primary_key=True),
+    Index("ix_auditevent_patient_id_id", "patient_id", "id"),
+    Index("ix_auditevent_actor_id_id", "actor_id", "id"),
+)
+
+_SEARCH_REMOVE_0006 = (
+    "DELETE FROM clinical_search WHERE rowid = (SELECT id FROM clinical_search_document WHERE source_id = old.id); "
+    "DELETE FROM clinical_search_document WHERE source_id = old.id;"
+)
+
+
+def _search_add_0006(fields):
+    return (
+        "INSERT INTO clinical_search_document (source_id, user_id) VALUES (new.id, new.user_id); "
+        f"INSERT INTO clinical_search (rowid, {', '.join(fields)}) "
+        f"SELECT id, {', '.join(f'new.{field}' for field in fields)} FROM clinical_search_document "
+        "WHERE source_id = new.id;"
+    )
+
+
+SEARCH_DDL_0006 = {
+    "sqlite": [
+        "CREATE TABLE IF NOT EXISTS clinical_search_document "
+        "(id INTEGER PRIMARY KEY, source_id VARCHAR NOT NULL UNIQUE, user_id VARCHAR NOT NULL)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS clinical_search USING fts5(chief_complaint, medical_history, "
+        "diagnosis, treatment_plan, tokenize = 'unicode61 remove_diacritics 2')",
+        *[statement for table, fields in (("vitals", ("chief_complaint", "medical_history")),
+                                          ("neurologistconsultation", ("diagnosis", "treatment_plan")))
+          for statement in (
+              f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} "
+              f"BEGIN {_search_add_0006(fields)} END",
+              f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} WHEN "
+              + " OR ".join(f"old.{field} IS NOT new.{field}" for field in (*fields, "id", "user_id"))
+              + f" BEGIN {_SEARCH_REMOVE_0006} {_search_add_0006(fields)} END",
+              f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} "
+              f"BEGIN {_SEARCH_REMOVE_0006} END",
+          )],
+    ],
+    "postgresql": [
+        "CREATE INDEX IF NOT EXISTS ix_vitals_search ON vitals USING gin "
+        "(to_tsvector('english', coalesce(chief_complaint, '') || ' ' || coalesce(medical_history, '')))",
+        "CREATE INDEX IF NOT EXISTS ix_neurologistconsultation_search ON neurologistconsultation USING gin "
+        "(to_tsvector('english', coalesce(diagnosis, '') || ' ' || coalesce(treatment_plan, '')))",
+    ],
+}
+
+AUDIT_GUARDS_DDL_0007 = {
+    "sqlite": [
+        "CREATE TRIGGER IF NOT EXISTS auditevent_no_update BEFORE UPDATE ON auditevent "
+        "BEGIN SELECT RAISE(ABORT, 'the audit trail is append-only'); END",
+        "CREATE TRIGGER IF NOT EXISTS auditevent_no_delete BEFORE DELETE ON auditevent "
+        "BEGIN SELECT RAISE(ABORT, 'the audit trail is append-only'); END",
+    ],
+}
+
+
+# ALTER TABLE ... ADD COLUMN with the column's type as the bound dialect spells it
+def _add_column(conn, table: str, column: Column):
+    preparer = conn.dialect.identifier_preparer
+    conn.execute(text(f"ALTER TABLE {preparer.quote(table)} ADD COLUMN {preparer.quote(column.name)} "
+                      f"{column.type.compile(dialect=conn.dialect)}"))
+
+
+def _execute_ddl(conn, statements: dict):
+    for statement in statements.get(conn.dialect.name, []):
+        conn.execute(text(statement))
+
+
+def migration_0003_vitals_series(conn):
+    # Vitals becomes the current snapshot; observations go to an append-only series.
+    # Every existing snapshot seeds its patient's series with one observation.
+    _add_column(conn, "vitals", VITALS_OBSERVED_AT_0003)
+    conn.execute(text("UPDATE vitals SET observed_at = CURRENT_TIMESTAMP"))
+    VITALSOBSERVATION_0003.create(conn, checkfirst=True)
+    conn.execute(text(
+        "INSERT INTO vitalsobservation (user_id, observed_at, blood_pressure_systolic, blood_pressure_diastolic, "
+        "heart_rate, respiratory_rate, oxygen_saturation, nihss_score, inr_score) "
+        "SELECT user_id, observed_at, blood_pressure_systolic, blood_pressure_diastolic, "
+        "heart_rate, respiratory_rate, oxygen_saturation, nihss_score, inr_score FROM vitals"
+    ))
+
+
+def migration_0004_tpa_eligibility(conn):
+    # Stored eligibility per patient, evaluated for everyone already in the database
+    TPAELIGIBILITY_0004.create(conn, checkfirst=True)
+    return ["tpa_eligibility"]
+
+
+def migration_0005_cohort_rollups(conn):
+    # Rollups behind GET /stats, computed from everyone already in the database
+    COHORTROLLUP_0005.create(conn, checkfirst=True)
+    return ["cohort_rollups"]
+
+
+def migration_0006_clinical_search(conn):
+    # Full-text index over complaints, history and diagnoses, filled from the existing notes
+    _execute_ddl(conn, SEARCH_DDL_0006)
+    return ["search_index"]
+
+
+def migration_0007_audit_trail(conn):
+    # Append-only audit trail of access to patient data; it starts empty
+    AUDITEVENT_0007.create(conn, checkfirst=True)
+    _execute_ddl(conn, AUDIT_GUARDS_DDL_0007)
+
+
+MIGRATIONS = [
+    (2, "index overhaul: drop unused column indexes, index the real lookups", migration_0002_index_overhaul),
+    (3, "vitals series: append-only observations, vitals keeps the current snapshot", migration_0003_vitals_series),
+    (4, "tpa eligibility: stored per patient, maintained on every vitals/lab write", migration_0004_tpa_eligibility),
+    (5, "cohort rollups: per role and age band counters behind /stats", migration_0005_cohort_rollups),
+    (6, "clinical search: full-text index over complaints, history and diagnoses", migration_0006_clinical_search),
+    (7, "audit trail: append-only record of who read or changed which patient's data", migration_0007_audit_trail),
+]
+LATEST_VERSION = max([1] + [version for version, _, _ in MIGRATIONS])
+
+#Rebuilds of derived data named by the migrations, in dependency order (the rollups count
+#eligible patients); each takes a sync Connection
+BACKFILLS = {
+    "tpa_eligibility": refresh_all_tpa_eligibility,
+    "cohort_rollups": recompute_cohort_stats,
+    "search_index": rebuild_search_index,
+}
+
+
+def get_schema_version(conn):
+    tables = inspect(conn).get_table_names()
+    if SCHEMA_VERSION_TABLE not in tables:
+        return 1 if "user" in tables else None
+    return conn.execute(text(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE}")).scalar()
+
+
+def stamp(conn, version: int, description: str):
+    conn.execute(
+        text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description) VALUES (:version, :description)"),
+        {"version": version, "description": description},
+    )
+
+
+def migrate(engine) -> list[int]:
+    # Fast path for every start after the first: an up-to-date schema needs no DDL or write lock
+    with engine.connect() as conn:
+        if get_schema_version(conn) == LATEST_VERSION:
+            return []
+
+    applied = []
+    with engine.begin() as conn:
+        version = get_schema_version(conn)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} "
+            "(version INTEGER PRIMARY KEY, description VARCHAR NOT NULL)"
+        ))
+
+        if version is None:
+            SQLModel.metadata.create_all(conn)
+            stamp(conn, LATEST_VERSION, "initial schema")
+            return [LATEST_VERSION]
+
+        if conn.execute(text(f"SELECT COUNT(*) FROM {SCHEMA_VERSION_TABLE}")).scalar() == 0:
+            stamp(conn, 1, "baseline (pre-versioning schema)")
+
+        backfills = set()
+        for migration_version, description, migration in MIGRATIONS:
+            if migration_version > version:
+                backfills.update(migration(conn) or ())
+                stamp(conn, migration_version, description)
+                applied.append(migration_version)
+        for name, backfill in BACKFILLS.items():
+            if name in backfills:
+                backfill(conn)
+    return applied
+
+
+if __name__ == "__main__":
+    # python migrations.py            apply pending migrations to DATABASE_URL
+    # python migrations.py --status   print the current and latest schema version
+    import os
+    from dotenv import load_dotenv
+    from database import create_db_engine
+
+    load_dotenv()
+    engine = create_db_engine(os.getenv("DATABASE_URL"))
+    if "--status" in sys.argv:
+        with engine.connect() as conn:
+            print(f"schema version {get_schema_version(conn)} (latest {LATEST_VERSION})")
+    else:
+        print(f"applied migrations: {migrate(engine) or 'none'}")
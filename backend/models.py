@@ -2,9 +2,10 @@ from typing import Optional, List, Type
 from enum import Enum
 from uuid import UUID, uuid4
 from typing import Annotated
-from pydantic import BaseModel
+from pydantic import AwareDatetime, BaseModel
 from fastapi import Depends, FastAPI, HTTPException, Query
 from sqlmodel import Field, Session, SQLModel, create_engine, select, Relationship
+from sqlalchemy import JSON, Index
 from datetime import datetime, timedelta, timezone
 class Gender(str, Enum):
     male = "Male"
@@ -16,7 +17,7 @@ class Role(str, Enum):
     neurologist = "Neurologist"
 class UserBase(SQLModel):
     name: str
-    username: str
+    username: str = Field(index=True)
     age: Optional[int] = None
     gender: Gender
 
@@ -38,15 +39,18 @@ class User(SQLModel, table=True):
 
 """
 class User(UserBase, table=True):
+    # Role listings, the worklist and cohort screening filter on role and page by id
+    __table_args__ = (Index("ix_user_role_id", "role", "id"),)
+
     id: str = Field(default_factory=lambda: str(uuid4()), primary_key=True)
     hashed_password: str
     role: Role
-    # Relationships
-    vitals: Optional["Vitals"] = Relationship(back_populates="user")
+    # Relationships (passive_deletes: the ON DELETE CASCADE foreign keys remove the child rows)
+    vitals: Optional["Vitals"] = Relationship(back_populates="user", passive_deletes=True)
 
-    lab_results: Optional["LabResult"] = Relationship(back_populates="user")
+    lab_results: Optional["LabResult"] = Relationship(back_populates="user", passive_deletes=True)
 
-    consultations: List["NeurologistConsultation"] = Relationship(back_populates="user")
+    consultations: List["NeurologistConsultation"] = Relationship(back_populates="user", passive_deletes=True)
 
 
 
@@ -70,20 +74,20 @@ class TokenData(BaseModel):
 
 
 class VitalsBase(SQLModel):
-    chief_complaint: Optional[str] = Field(default=None, index=True)
-    medical_history: Optional[str] = Field(default=None, index=True)
-    blood_pressure_systolic: Optional[int] = Field(default=None, index=True)
-    blood_pressure_diastolic: Optional[int] = Field(default=None, index=True)
-    heart_rate: Optional[int] = Field(default=None, index=True)
-    respiratory_rate: Optional[int] = Field(default=None, index=True)
-    oxygen_saturation: Optional[int] = Field(default=None, index=True)
+    chief_complaint: Optional[str] = None
+    medical_history: Optional[str] = None
+    blood_pressure_systolic: Optional[int] = None
+    blood_pressure_diastolic: Optional[int] = None
+    heart_rate: Optional[int] = None
+    respiratory_rate: Optional[int] = None
+    oxygen_saturation: Optional[int] = None
 
     # Exclusion criteria fields
-    significant_head_trauma: Optional[bool] = Field(default=None, index=True)
-    recent_surgery: Optional[bool] = Field(default=None, index=True)
-    recent_myocardial_infarction: Optional[bool] = Field(default=None, index=True)
-    recent_hemorrhage: Optional[bool] = Field(default=None, index=True)
-    platelet_count: Optional[int] = Field(default=None, index=True)
+    significant_head_trauma: Optional[bool] = None
+    recent_surgery: Optional[bool] = None
+    recent_myocardial_infarction: Optional[bool] = None
+    recent_hemorrhage: Optional[bool] = None
+    platelet_count: Optional[int] = None
 
 
 class Vitals(VitalsBase, table=True):
@@ -93,17 +97,64 @@ class Vitals(VitalsBase, table=True):
     user_id: str = Field(foreign_key="user.id", unique=True,  nullable=False, ondelete="CASCADE")
 
     # Simulated Scores
-    nihss_score: Optional[int] = Field(default=None, index=True)
-    inr_score: Optional[float] = Field(default=None, index=True)
+    nihss_score: Optional[int] = None
+    inr_score: Optional[float] = None
+
+    # Time of the latest observation folded into this snapshot (see VitalsObservation)
+    observed_at: Optional[datetime] = None
 
     user: Optional["User"] = Relationship(back_populates="vitals")
 
 class VitalsCreate(VitalsBase):
     pass
 
+# Bulk ingest row (bedside monitors push observations for many patients at once)
+class VitalsIngest(VitalsBase):
+    user_id: str
+    nihss_score: Optional[int] = None
+    inr_score: Optional[float] = None
+    observed_at: Optional[AwareDatetime] = None
+
 class VitalsPublic(VitalsBase):
-    nihss_score: Optional[int] = Field(default=None, index=True)
-    inr_score: Optional[float] = Field(default=None, index=True)
+    nihss_score: Optional[int] = None
+    inr_score: Optional[float] = None
+
+
+# The numeric measurements that are rechecked over time (every 15 minutes during thrombolysis)
+VITALS_SERIES_FIELDS = [
+    "blood_pressure_systolic", "blood_pressure_diastolic", "heart_rate", "respiratory_rate",
+    "oxygen_saturation", "nihss_score", "inr_score",
+]
+
+class VitalsObservationBase(SQLModel):
+    observed_at: datetime
+    blood_pressure_systolic: Optional[int] = None
+    blood_pressure_diastolic: Optional[int] = None
+    heart_rate: Optional[int] = None
+    respiratory_rate: Optional[int] = None
+    oxygen_saturation: Optional[int] = None
+    nihss_score: Optional[int] = None
+    inr_score: Optional[float] = None
+
+# Append-only vitals series: one narrow numeric row per observation. The integer key is
+# SQLite's rowid, so the only secondary index is (user_id, observed_at) for range scans.
+# Vitals keeps the current snapshot for O(1) reads.
+class VitalsObservation(VitalsObservationBase, table=True):
+    __table_args__ = (Index("ix_vitalsobservation_user_id_observed_at", "user_id", "observed_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
+
+class VitalsObservationPublic(VitalsObservationBase):
+    pass
+
+# One downsampling bucket: min/max/last of each series field over [bucket_start, bucket_start + bucket)
+class VitalsBucket(BaseModel):
+    bucket_start: datetime
+    count: int
+    min: dict[str, Optional[float]]
+    max: dict[str, Optional[float]]
+    last: dict[str, Optional[float]]
 
 
 
@@ -111,15 +162,18 @@ class VitalsPublic(VitalsBase):
 
 
 class LabResultBase(SQLModel):
-    cbc: Optional[str] = Field(default=None, index=True)
-    bmp_glucose: Optional[float] = Field(default=None, index=True)
-    creatinine: Optional[float] = Field(default=None, index=True)
-    coagulation: Optional[str] = Field(default=None, index=True)
+    cbc: Optional[str] = None
+    bmp_glucose: Optional[float] = None
+    creatinine: Optional[float] = None
+    coagulation: Optional[str] = None
 
 class LabResultCreate(LabResultBase):
     pass
 
 class LabResult(LabResultBase, table=True):
+    # Latest lab result per patient
+    __table_args__ = (Index("ix_labresult_user_id_created_at", "user_id", "created_at"),)
+
     id: str = Field(default_factory= lambda: str(uuid4()), primary_key=True)
     user_id: str = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
 
@@ -127,25 +181,87 @@ class LabResult(LabResultBase, table=True):
 
     user: Optional["User"] = Relationship(back_populates="lab_results")
 
+# Bulk ingest row (lab interface pushes results for many patients at once)
+class LabResultIngest(LabResultBase):
+    user_id: str
+    created_at: Optional[AwareDatetime] = None
+
 class LabResultPublic(LabResultBase):
     pass
 
 class NeurologistConsultationBase(SQLModel):
-    tpa_approval: Optional[bool] = Field(default=None, index=True)
-    diagnosis: Optional[str] = Field(default=None, index=True)
-    treatment_plan: Optional[str] = Field(default=None, index=True)
+    tpa_approval: Optional[bool] = None
+    diagnosis: Optional[str] = None
+    treatment_plan: Optional[str] = None
 
 class NeurologistConsultation(NeurologistConsultationBase, table=True):
 
 
     id: str = Field(default_factory= lambda: str(uuid4()), primary_key=True)
-    user_id: str = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE")
+    user_id: str = Field(foreign_key="user.id", nullable=False, ondelete="CASCADE", index=True)
 
     user: Optional["User"] = Relationship(back_populates="consultations")
 
 
 
 
+# Stored tPA eligibility per patient, kept current by eligibility.py. failed_criteria lists
+# every criterion the patient fails, in the order they are checked (empty when eligible);
+# rules_version is the TPA_RULES_VERSION they were evaluated under.
+class TpaEligibility(SQLModel, table=True):
+    # "All currently eligible patients" paged by id; the startup check for a changed rule set
+    __table_args__ = (
+        Index("ix_tpaeligibility_eligible_user_id", "eligible", "user_id"),
+        Index("ix_tpaeligibility_rules_version", "rules_version"),
+    )
+
+    user_id: str = Field(foreign_key="user.id", primary_key=True, ondelete="CASCADE")
+    eligible: bool
+    failed_criteria: List[str] = Field(default_factory=list, sa_type=JSON)
+    rules_version: int
+    evaluated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+# Counters and sums per (role, age band) behind GET /stats, kept current by cohort_stats.py.
+# pending counts patients without a consultation; approved/denied count consultations;
+# nihss_sum/nihss_count cover the users whose vitals snapshot has an NIHSS score.
+class CohortRollup(SQLModel, table=True):
+    role: Role = Field(primary_key=True)
+    age_band: str = Field(primary_key=True)
+    users: int = 0
+    pending: int = 0
+    eligible: int = 0
+    approved: int = 0
+    denied: int = 0
+    nihss_sum: int = 0
+    nihss_count: int = 0
+
+
+# Append-only trail of who read or changed which patient's clinical data (see audit.py). No
+# foreign keys: the trail outlives the users it names. patient_id is None for accesses that span
+# every patient (export, purge), actor_id for unauthenticated ones.
+class AuditEventBase(SQLModel):
+    occurred_at: datetime
+    actor_id: Optional[str] = None
+    actor_role: Optional[Role] = None
+    action: str
+    resource: str
+    patient_id: Optional[str] = None
+    request_id: Optional[str] = None
+
+class AuditEvent(AuditEventBase, table=True):
+    # Newest first per patient and per actor; the integer key is SQLite's rowid
+    __table_args__ = (
+        Index("ix_auditevent_patient_id_id", "patient_id", "id"),
+        Index("ix_auditevent_actor_id_id", "actor_id", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+class AuditEventPublic(AuditEventBase):
+    id: int
+
+
 class NeurologistConsultationCreate(NeurologistConsultationBase):
     pass
 
@@ -156,3 +272,41 @@ class NeurologistConsultationPublic(NeurologistConsultationBase):
 
 
 
+
+
+# Worklist Response Model (one row per patient, replaces the per-patient fan-out)
+class PatientWorklistItem(UserPublic):
+    vitals: Optional[VitalsPublic] = None
+    lab_result: Optional[LabResultPublic] = None
+    consultations: List[NeurologistConsultationPublic] = []
+    eligible_for_tpa: Optional[str] = None
+
+
+# Cohort tPA Screening Result (failed_criterion, the first of failed_criteria, is None when the
+# patient is eligible)
+class TpaScreeningResult(BaseModel):
+    user_id: str
+    eligible: bool
+    failed_criterion: Optional[str] = None
+    failed_criteria: List[str] = []
+    rules_version: Optional[int] = None
+
+
+# Cohort statistics for the dashboards, overall or for one group (a role or an age band)
+class CohortStats(BaseModel):
+    group: Optional[str] = None
+    users: int
+    pending: int
+    eligible: int
+    approved: int
+    denied: int
+    average_nihss: Optional[float] = None
+
+
+# Full-text search hit: a patient and the best matching of their notes (see search.py)
+class PatientSearchResult(BaseModel):
+    user_id: str
+    name: str
+    age: Optional[int] = None
+    score: float
+    snippet: str
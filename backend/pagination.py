@@ -0,0 +1,60 @@
+import base64
+import json
+import os
+
+from fastapi import HTTPException, Response
+from sqlalchemy import Integer
+from sqlmodel import Session
+
+from fast_responses import encode
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+
+
+# Opaque keyset cursors: the last key of a page, base64url-encoded so clients treat it as a token.
+def encode_cursor(key: str | int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": key}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_type: type = str) -> str | int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded))["after"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if type(key) is not key_type:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return key
+
+
+# Keyset page over `statement` ordered by `key_column` (a string or integer key; descending=True
+# for newest first): rows strictly after the cursor, limit+1 of them fetched so a full page only
+# gets a next cursor when there really is a next row.
+def keyset_page(session, statement, key_column, cursor: str | None, limit: int, response: Response,
+                descending: bool = False):
+    if cursor is not None:
+        after = decode_cursor(cursor, int if isinstance(key_column.type, Integer) else str)
+        statement = statement.where(key_column < after if descending else key_column > after)
+    order = key_column.desc() if descending else key_column
+    rows = session.exec(statement.order_by(order).limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(rows[-1], key_column.key))
+    return rows
+
+
+# NDJSON lines for every row of `statement` (ordered by `key_column`, after the cursor), read
+# through a server-side cursor STREAM_BATCH_SIZE rows at a time and sent one chunk per batch.
+# Opens its own session so it outlives the request's dependency-scoped one.
+def stream_ndjson(engine, statement, key_column, cursor: str | None, public_model):
+    if cursor is not None:
+        statement = statement.where(key_column > decode_cursor(cursor))
+    statement = statement.order_by(key_column).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    def lines():
+        with Session(engine) as session:
+            for rows in session.exec(statement).partitions():
+                yield b"".join(encode(public_model, row) + b"\n" for row in rows)
+
+    return lines()
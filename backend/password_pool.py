@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, get_native_id
+
+from fastapi import HTTPException, status
+
+from metrics import LatencyRecorder
+
+
+# Runs bcrypt hashing/verification on a dedicated thread pool so logins and signups don't
+# stall the event loop. bcrypt releases the GIL, so threads give real parallelism here.
+# When more than queue_limit jobs are pending, new ones are rejected with 503.
+# A pool size of 0 runs the work inline on the caller (the old behaviour).
+# On Linux the threads run at `nice` (0 = the process's priority): when the CPU is saturated, a
+# burst of logins then can't take it from the request handlers, and bcrypt still gets idle CPU.
+class PasswordHashingPool:
+    def __init__(self, pwd_context, size: int, queue_limit: int, latency_window: int = 1000, nice: int = 0):
+        self.pwd_context = pwd_context
+        self.size = size
+        self.queue_limit = queue_limit
+        self.nice = nice if sys.platform == "linux" else 0
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="bcrypt",
+                                            initializer=self._lower_priority) if size > 0 else None
+        self.wait_times = LatencyRecorder(latency_window)
+        self.run_times = LatencyRecorder(latency_window)
+        self._lock = Lock()
+
+    def _lower_priority(self):
+        if self.nice > 0:
+            # Linux threads are scheduled on their own, so this only affects the calling thread
+            os.setpriority(os.PRIO_PROCESS, get_native_id(),
+                           os.getpriority(os.PRIO_PROCESS, 0) + self.nice)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._submit(self.pwd_context.verify, plain_password, hashed_password)
+
+    async def _submit(self, func, *args):
+        if self._executor is None:
+            return self._timed(func, args, time.perf_counter())
+
+        with self._lock:
+            if self.pending >= self.queue_limit:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Authentication service is busy, please retry.",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, func, args, time.perf_counter())
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _timed(self, func, args, submitted_at: float):
+        started_at = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished_at = time.perf_counter()
+            with self._lock:
+                self.completed += 1
+            self.wait_times.record(started_at - submitted_at)
+            self.run_times.record(finished_at - started_at)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "size": self.size,
+                "queue_limit": self.queue_limit,
+                "nice": self.nice,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+        return {**counters, "queue_wait_ms": self.wait_times.stats(), "run_time_ms": self.run_times.stats()}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
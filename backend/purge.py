@@ -0,0 +1,113 @@
+import os
+import secrets
+import time
+from threading import Lock
+from uuid import uuid4
+
+from sqlalchemy import delete, func, select
+
+from cohort_stats import track_cohort_stats
+from models import User
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", 1000))
+PURGE_JOB_HISTORY = int(os.getenv("PURGE_JOB_HISTORY", 100))
+
+
+# Deletes every user with set-based DELETEs of at most batch_size rows, one transaction per
+# batch. Vitals, lab results and consultations go with them through the ON DELETE CASCADE
+# foreign keys (SQLite enforces those because the engine profile turns on foreign_keys), and the
+# cohort rollups are decremented in the same transaction.
+# on_progress(deleted) is called after each committed batch. Returns the number of users deleted.
+def purge_users(engine, batch_size: int = PURGE_BATCH_SIZE, on_progress=None) -> int:
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            batch = list(conn.execute(select(User.id).limit(batch_size)).scalars())
+            with track_cohort_stats(conn, batch):
+                removed = conn.execute(delete(User).where(User.id.in_(batch))).rowcount if batch else 0
+        if not removed:
+            return deleted
+        deleted += removed
+        if on_progress is not None:
+            on_progress(deleted)
+
+
+def count_users(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(User)).scalar()
+
+
+# A purge running outside the request that started it. Progress is updated after each batch.
+# The status is read with the job's token, handed out once when the job starts: the purge deletes
+# every account, including the one that started it, so no user token could read it afterwards.
+class PurgeJob:
+    def __init__(self, total: int):
+        self.id = str(uuid4())
+        self.token = secrets.token_urlsafe(32)
+        self.status = "pending"
+        self.total = total
+        self.deleted = 0
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def run(self, engine, batch_size: int = PURGE_BATCH_SIZE, on_done=None):
+        self.status = "running"
+        try:
+            purge_users(engine, batch_size, on_progress=self._progress)
+            self.status = "completed"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+            if on_done is not None:
+                on_done()
+
+    def has_token(self, token: str | None) -> bool:
+        return token is not None and secrets.compare_digest(token, self.token)
+
+    def _progress(self, deleted: int):
+        self.deleted = deleted
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "deleted": self.deleted,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# In-process registry of purge jobs, keeping the most recent `history` of them.
+class PurgeJobRegistry:
+    def __init__(self, history: int = PURGE_JOB_HISTORY):
+        self.history = history
+        self._jobs = {}
+        self._lock = Lock()
+
+    # Registers a new job, or returns None while another is still pending or running. Checked and
+    # registered under the lock, so concurrent requests can't both start one.
+    def start(self, total: int) -> PurgeJob | None:
+        job = PurgeJob(total)
+        with self._lock:
+            if self._active() is not None:
+                return None
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                del self._jobs[next(iter(self._jobs))]
+        return job
+
+    def get(self, job_id: str) -> PurgeJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self) -> PurgeJob | None:
+        with self._lock:
+            return self._active()
+
+    def _active(self) -> PurgeJob | None:
+        return next((job for job in self._jobs.values() if job.status in ("pending", "running")), None)
@@ -0,0 +1,117 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import lru_cache
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+
+from cache import TTLCache
+from models import LabResult, NeurologistConsultation, User, Vitals, VitalsObservation
+
+CachedResponse = namedtuple("CachedResponse", ["body", "etag", "last_modified", "version"])
+
+
+@lru_cache(maxsize=None)
+def _adapter(model_type):
+    return TypeAdapter(model_type)
+
+
+# JSON body for `value` shaped by a response model (a model class or e.g. List[Model])
+def serialize(model_type, value) -> bytes:
+    adapter = _adapter(model_type)
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+
+# A version query's row (None when it matched nothing) as a plain, comparable tuple
+def _version(row):
+    return tuple(row) if row is not None else None
+
+
+# Per resource, a cheap indexed read that changes whenever the response would: the handlers run it
+# before building a response, and a cached entry is only served while the database still returns
+# the version it was built at. Writes made by any worker are therefore seen at once. Lab results and
+# consultations are insert-only (removed only with the patient), so count and newest row suffice.
+def version_statement(user_id: str, resource: str):
+    if resource == "user":
+        return select(User.id).where(User.id == user_id)
+    if resource == "vitals":
+        latest_observation = (select(func.max(VitalsObservation.id))
+                              .where(VitalsObservation.user_id == user_id).scalar_subquery())
+        return select(Vitals.id, Vitals.observed_at, latest_observation).where(Vitals.user_id == user_id)
+    if resource == "results":
+        return select(func.count(), func.max(LabResult.created_at)).where(LabResult.user_id == user_id)
+    if resource == "consultations":
+        return select(func.count()).where(NeurologistConsultation.user_id == user_id)
+    raise ValueError(f"unknown resource {resource!r}")
+
+
+# Serialized per-patient GET responses keyed by (user_id, resource), with ETag/Last-Modified,
+# each stored with the database version (see version_statement) it was built at. Reading the
+# version before the data means an entry is never older than its version; one that raced a write
+# is newer, and is simply rebuilt on the next request. The write handlers' invalidate() only frees
+# this worker's entries early; entries expire after ttl_seconds either way.
+class ResponseCache:
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self.stale = 0
+
+    def get(self, key, version) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.version != _version(version):
+            # Changed since it was built, possibly through another worker
+            self.stale += 1
+            return None
+        return entry
+
+    def store(self, key, version, body: bytes) -> CachedResponse:
+        entry = CachedResponse(
+            body=body,
+            etag='"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+            version=_version(version),
+        )
+        self._entries.set(key, entry)
+        return entry
+
+    # Drops the given resources (all of them when None) cached for user_id
+    def invalidate(self, user_id: str, resources=None):
+        if resources is None:
+            self._entries.invalidate_where(lambda key, entry: key[0] == user_id)
+        else:
+            for resource in resources:
+                self._entries.invalidate((user_id, resource))
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "stale": self.stale}
+
+    # 304 when the client's If-None-Match (or, without one, If-Modified-Since) still matches
+    @staticmethod
+    def respond(request, entry: CachedResponse) -> Response:
+        headers = {
+            "ETag": entry.etag,
+            "Last-Modified": format_datetime(entry.last_modified, usegmt=True),
+            "Cache-Control": "private, no-cache",
+        }
+        if not_modified(request, entry):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def not_modified(request, entry: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return entry.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -0,0 +1,187 @@
+import re
+import sys
+
+from sqlalchemy import event, text
+from sqlmodel import SQLModel
+
+#Full-text clinical search over the vitals' chief_complaint/medical_history and the consultations'
+#diagnosis/treatment_plan, ranked, with prefix matching on every search term.
+#  - SQLite: an FTS5 table, clinical_search, with one document per vitals snapshot or consultation.
+#    Its rowids come from clinical_search_document (an INTEGER PRIMARY KEY, so unlike the rowids of
+#    the string-keyed source tables they survive VACUUM). Triggers on vitals and
+#    neurologistconsultation keep it in sync within the writing transaction, whatever the code path
+#    (handlers, bulk ingest, cohort generation, ON DELETE CASCADE).
+#  - Server databases (PostgreSQL): GIN expression indexes on to_tsvector() of the same columns,
+#    which the database maintains itself.
+
+#Searchable fields by source table
+SEARCH_FIELDS = {
+    "vitals": ["chief_complaint", "medical_history"],
+    "neurologistconsultation": ["diagnosis", "treatment_plan"],
+}
+FIELD_TABLES = {field: table for table, fields in SEARCH_FIELDS.items() for field in fields}
+SNIPPET_TOKENS = 12
+
+
+class SearchError(ValueError):
+    pass
+
+
+def _sqlite_triggers(table: str, fields: list[str]) -> list[str]:
+    columns = ", ".join(fields)
+    new_values = ", ".join(f"new.{field}" for field in fields)
+    changed = " OR ".join(f"old.{field} IS NOT new.{field}" for field in fields)
+    remove = (
+        "DELETE FROM clinical_search WHERE rowid = "
+        "(SELECT id FROM clinical_search_document WHERE source_id = old.id); "
+        "DELETE FROM clinical_search_document WHERE source_id = old.id;"
+    )
+    add = (
+        "INSERT INTO clinical_search_document (source_id, user_id) VALUES (new.id, new.user_id); "
+        f"INSERT INTO clinical_search (rowid, {columns}) "
+        f"SELECT id, {new_values} FROM clinical_search_document WHERE source_id = new.id;"
+    )
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN {add} END",
+        # The vitals snapshot is rewritten on every observation; only a text change reindexes it
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} "
+        f"WHEN {changed} OR old.id IS NOT new.id OR old.user_id IS NOT new.user_id BEGIN {remove} {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN {remove} END",
+    ]
+
+
+SQLITE_DDL = [
+    "CREATE TABLE IF NOT EXISTS clinical_search_document "
+    "(id INTEGER PRIMARY KEY, source_id VARCHAR NOT NULL UNIQUE, user_id VARCHAR NOT NULL)",
+    # unicode61 without stemming: prefix queries then match the stored words as typed
+    "CREATE VIRTUAL TABLE IF NOT EXISTS clinical_search USING fts5("
+    + ", ".join(FIELD_TABLES) + ", tokenize = 'unicode61 remove_diacritics 2')",
+    *[trigger for table, fields in SEARCH_FIELDS.items() for trigger in _sqlite_triggers(table, fields)],
+]
+
+
+def _tsvector(fields: list[str]) -> str:
+    return "to_tsvector('english', " + " || ' ' || ".join(f"coalesce({field}, '')" for field in fields) + ")"
+
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} USING gin ({_tsvector(fields)})"
+    for table, fields in SEARCH_FIELDS.items()
+]
+
+
+# Creates the index for the connection's database (empty; see rebuild_search_index)
+def create_search_index(conn):
+    statements = {"sqlite": SQLITE_DDL, "postgresql": POSTGRES_DDL}.get(conn.dialect.name, [])
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+# Reindexes every vitals snapshot and consultation (SQLite; the server index needs no rebuild)
+def rebuild_search_index(conn) -> int:
+    if conn.dialect.name != "sqlite":
+        return 0
+    conn.execute(text("DELETE FROM clinical_search"))
+    conn.execute(text("DELETE FROM clinical_search_document"))
+    for table, fields in SEARCH_FIELDS.items():
+        columns = ", ".join(fields)
+        conn.execute(text(f"INSERT INTO clinical_search_document (source_id, user_id) SELECT id, user_id FROM {table}"))
+        conn.execute(text(
+            f"INSERT INTO clinical_search (rowid, {columns}) "
+            f"SELECT d.id, {', '.join(f's.{field}' for field in fields)} "
+            f"FROM {table} s JOIN clinical_search_document d ON d.source_id = s.id"
+        ))
+    return conn.execute(text("SELECT COUNT(*) FROM clinical_search_document")).scalar()
+
+
+# A fresh database (SQLModel.metadata.create_all) gets the index with its tables
+@event.listens_for(SQLModel.metadata, "after_create")
+def _create_search_index_with_tables(target, connection, **kw):
+    create_search_index(connection)
+
+
+# The words of `query`, each matched as a prefix ("atrial fib" finds "atrial fibrillation")
+def search_terms(query: str) -> list[str]:
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        raise SearchError("The search query has no words.")
+    return terms
+
+
+def search_fields(fields: list[str] | None) -> list[str]:
+    fields = list(dict.fromkeys(fields or FIELD_TABLES))
+    unknown = [field for field in fields if field not in FIELD_TABLES]
+    if unknown:
+        raise SearchError(f"Unknown search fields: {', '.join(unknown)}; expected some of {', '.join(FIELD_TABLES)}.")
+    return fields
+
+
+def _sqlite_matches(conn, terms, fields):
+    match = " ".join(f'"{term}"*' for term in terms)
+    if len(fields) < len(FIELD_TABLES):
+        match = "{" + " ".join(fields) + "} : (" + match + ")"
+    # FTS5 sorts by rank itself; snippets are only built for the rows actually fetched
+    return conn.execute(text(
+        "SELECT d.user_id, -s.rank AS score, "
+        f"snippet(clinical_search, -1, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet "
+        "FROM clinical_search s JOIN clinical_search_document d ON d.id = s.rowid "
+        "WHERE clinical_search MATCH :match ORDER BY s.rank"
+    ), {"match": match})
+
+
+def _postgres_matches(conn, terms, fields):
+    selects = []
+    for table, table_fields in SEARCH_FIELDS.items():
+        selected = [field for field in table_fields if field in fields]
+        if not selected:
+            continue
+        # The whole-row expression is the indexed one; the selected fields narrow it down
+        document = " || ' ' || ".join(f"coalesce({field}, '')" for field in selected)
+        selects.append(
+            f"SELECT user_id, ts_rank({_tsvector(selected)}, q) AS score, "
+            f"ts_headline('english', {document}, q, "
+            f"'StartSel=[, StopSel=], MinWords=3, MaxWords={SNIPPET_TOKENS}') AS snippet "
+            f"FROM {table}, to_tsquery('english', :tsquery) q "
+            f"WHERE {_tsvector(table_fields)} @@ q AND {_tsvector(selected)} @@ q"
+        )
+    return conn.execute(text(" UNION ALL ".join(selects) + " ORDER BY score DESC"),
+                        {"tsquery": " & ".join(f"{term}:*" for term in terms)})
+
+
+# Patients whose notes match every term (in any of `fields`), best first: [(user_id, score,
+# snippet of their best matching note)], `limit` patients after skipping `offset`. Matches are
+# read in rank order only until enough distinct patients are found.
+def search_patients(conn, query: str, fields: list[str] | None = None, offset: int = 0, limit: int = 20):
+    terms, fields = search_terms(query), search_fields(fields)
+    if conn.dialect.name == "sqlite":
+        result = _sqlite_matches(conn, terms, fields)
+    elif conn.dialect.name == "postgresql":
+        result = _postgres_matches(conn, terms, fields)
+    else:
+        raise SearchError(f"Full-text search isn't available on {conn.dialect.name}.")
+    seen, matches = set(), []
+    with result:
+        for user_id, score, snippet in result:
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            if len(seen) > offset:
+                matches.append((user_id, score, snippet))
+                if len(matches) == limit:
+                    break
+    return matches
+
+
+if __name__ == "__main__":
+    # python search.py --rebuild   reindex every note of DATABASE_URL
+    import os
+    from dotenv import load_dotenv
+    from database import create_db_engine
+
+    load_dotenv()
+    if "--rebuild" not in sys.argv:
+        sys.exit("usage: python search.py --rebuild")
+    engine = create_db_engine(os.getenv("DATABASE_URL"))
+    with engine.begin() as conn:
+        create_search_index(conn)
+        print(f"indexed {rebuild_search_index(conn)} notes")
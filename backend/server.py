@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+
+#Production entry point: python server.py --workers 4
+#  - migrations run once here, before any worker starts, so workers only check the version
+#  - workers are spawned (not forked) and import the app themselves, so every database
+#    connection is opened in the worker that uses it
+#  - SIGTERM/SIGINT drain: workers stop accepting, end their SSE streams, finish in-flight
+#    requests (up to --graceful-timeout) and then run the lifespan shutdown
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8000))
+GRACEFUL_SHUTDOWN_SECONDS = float(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", 20))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+
+APP = "main:app"
+
+#Called (on the event loop) when a worker receives its first shutdown signal. The app registers
+#hooks here that let long-lived responses end early instead of holding the drain open.
+_drain_hooks = []
+
+
+def on_drain(hook):
+    _drain_hooks.append(hook)
+
+
+def _uvicorn():
+    # Imported here so `import server` from the app costs nothing
+    import uvicorn
+    return uvicorn
+
+
+def _draining_server(config):
+    uvicorn = _uvicorn()
+
+    class DrainingServer(uvicorn.Server):
+        async def serve(self, sockets=None):
+            self.loop = asyncio.get_running_loop()
+            await super().serve(sockets)
+
+        def handle_exit(self, sig, frame):
+            draining = not self.should_exit
+            super().handle_exit(sig, frame)
+            if draining and getattr(self, "loop", None) is not None:
+                for hook in _drain_hooks:
+                    self.loop.call_soon_threadsafe(hook)
+
+    return DrainingServer(config)
+
+
+def config_options(args) -> dict:
+    # Logging is set up by the app (logs.py), which also replaces uvicorn's access log
+    return dict(log_level=args.log_level, timeout_graceful_shutdown=args.graceful_timeout,
+                proxy_headers=True, forwarded_allow_ips="*")
+
+
+def run_worker(options: dict, sockets):
+    server = _draining_server(_uvicorn().Config(APP, **options))
+    server.run(sockets=sockets)
+
+
+def migrate_once():
+    from dotenv import load_dotenv
+
+    from database import create_db_engine
+    from eligibility import refresh_stale_tpa_eligibility
+    from migrations import migrate
+
+    load_dotenv()
+    engine = create_db_engine(os.getenv("DATABASE_URL"))
+    try:
+        applied = migrate(engine)
+        refreshed = refresh_stale_tpa_eligibility(engine)
+    finally:
+        engine.dispose()
+    if applied:
+        print(f"applied migrations: {applied}")
+    if refreshed:
+        print(f"re-evaluated tPA eligibility for {refreshed} patients under the current rule set")
+
+
+# Keeps `workers` processes serving the shared socket, replacing any that die, until a
+# shutdown signal, which is forwarded to every worker; waits for them to drain.
+def supervise(args):
+    uvicorn = _uvicorn()
+    config = uvicorn.Config(APP, host=args.host, port=args.port, **config_options(args))
+    sockets = [config.bind_socket()]
+    context = multiprocessing.get_context("spawn")
+    options = config_options(args)
+
+    def start():
+        process = context.Process(target=run_worker, args=(options, sockets), daemon=False)
+        process.start()
+        return process
+
+    workers = [start() for _ in range(args.workers)]
+    stopping = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda sig, frame: stopping.append(sig))
+
+    while not stopping:
+        time.sleep(0.5)
+        for index, process in enumerate(workers):
+            if not process.is_alive() and not stopping:
+                print(f"worker {process.pid} exited with {process.exitcode}, restarting")
+                workers[index] = start()
+
+    for process in workers:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+    deadline = time.monotonic() + args.graceful_timeout + 5
+    for process in workers:
+        process.join(max(0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+    for sock in sockets:
+        sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the MedStroke API.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY, help="worker processes (WEB_CONCURRENCY)")
+    parser.add_argument("--graceful-timeout", type=float, default=GRACEFUL_SHUTDOWN_SECONDS,
+                        help="seconds to let in-flight requests finish on shutdown")
+    parser.add_argument("--log-level", default=LOG_LEVEL)
+    parser.add_argument("--reload", action="store_true", help="development: one process, restart on code changes")
+    args = parser.parse_args(argv)
+
+    if args.reload:
+        _uvicorn().run(APP, host=args.host, port=args.port, reload=True, log_level=args.log_level)
+        return
+
+    migrate_once()
+    if args.workers <= 1:
+        uvicorn = _uvicorn()
+        _draining_server(uvicorn.Config(APP, host=args.host, port=args.port, **config_options(args))).run()
+    else:
+        supervise(args)
+
+
+if __name__ == "__main__":
+    # Run through the importable module, so spawned workers and the app share one `server`
+    import server
+    server.main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+from uuid import uuid4
+
+import pytest
+
+#The app's modules import each other by name, as when it is run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_LEVEL", "warning")
+#main reads these when it is first imported, and load_dotenv never overrides them: the app runs
+#against a throwaway SQLite file, never the DATABASE_URL of .env
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='medstroke-tests-'), 'app.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret-key-at-least-32-bytes-long")
+
+
+#One app and database serve the whole run
+@pytest.fixture(scope="session")
+def main():
+    import main
+    return main
+
+
+@pytest.fixture(scope="session")
+def client(main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+# Inserts a user as the bulk loaders do (rollups updated in the same transaction) and returns
+# (user_id, Authorization headers). Skips POST /users and its password hash.
+@pytest.fixture(scope="session")
+def make_user(main, client):
+    from sqlalchemy import insert
+
+    from cohort_stats import update_cohort_stats
+    from models import Role, User
+
+    def make_user(role="Patient", age=70, **fields):
+        user_id = str(uuid4())
+        username = f"{role.lower()}-{user_id}@test"
+        with main.engine.begin() as conn:
+            conn.execute(insert(User).values(id=user_id, name=role, username=username, age=age, gender="male",
+                                             hashed_password="x", role=Role(role), **fields))
+            update_cohort_stats(conn, [user_id])
+        return user_id, {"Authorization": f"Bearer {main.create_access_token({'sub': username})}"}
+
+    return make_user
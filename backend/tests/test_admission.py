@@ -0,0 +1,61 @@
+# Admission control: a saturated class is turned away with 503 once it has waited its queue
+# timeout (429 when its queue is full), while higher classes and the exempt routes are served.
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Shed
+
+LIMITS = {"critical": 2, "normal": 1, "low": 1}
+QUEUE_LIMITS = {"critical": 4, "normal": 4, "low": 1}
+QUEUE_TIMEOUTS = {"critical": 1.0, "normal": 1.0, "low": 0.01}
+
+
+def test_saturated_class_is_shed(main, client, make_user, monkeypatch):
+    _, doctor = make_user("Doctor")
+    controller = main.admission_controller
+    # As many requests in flight as the low class may have: low work queues, the others don't
+    monkeypatch.setattr(controller, "in_flight", controller.limits["low"])
+    monkeypatch.setitem(controller.queue_timeouts, "low", 0.01)
+
+    response = client.get("/users/", headers=doctor)
+    assert response.status_code == 503
+    assert response.json()["priority_class"] == "low" and int(response.headers["Retry-After"]) >= 1
+
+    monkeypatch.setitem(controller.queue_limits, "low", 0)
+    assert client.get("/users/", headers=doctor).status_code == 429
+
+    assert client.get("/worklist", headers=doctor).status_code == 200
+    stats = client.get("/admission/stats", headers=doctor)
+    assert stats.status_code == 200 and stats.json()["in_flight"] == controller.limits["low"]
+
+
+def test_queued_request_gets_a_freed_slot():
+    async def run():
+        controller = AdmissionController(LIMITS, QUEUE_LIMITS, QUEUE_TIMEOUTS)
+        await controller.acquire("normal")
+        order = []
+
+        async def request(priority_class):
+            await controller.acquire(priority_class)
+            order.append(priority_class)
+
+        low, critical = asyncio.create_task(request("low")), asyncio.create_task(request("critical"))
+        await asyncio.sleep(0)
+        # Critical has room under its limit and nothing of its class or above queued ahead of it
+        assert order == ["critical"] and controller.stats()["classes"]["low"]["queued"] == 1
+        with pytest.raises(Shed) as shed:
+            await controller.acquire("low")
+        assert shed.value.status_code == 429
+
+        controller.release("normal", 0.01)
+        controller.release("critical", 0.01)
+        await asyncio.gather(low, critical)
+        assert order == ["critical", "low"] and controller.in_flight == 1
+
+        with pytest.raises(Shed) as shed:
+            await controller.acquire("low")
+        assert shed.value.status_code == 503
+        assert controller.stats()["classes"]["low"]["queued"] == 0
+
+    asyncio.run(run())
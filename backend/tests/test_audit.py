@@ -0,0 +1,73 @@
+# The audit flusher: recorded events reach the auditevent table, one row per patient, once a batch
+# fills up, when the trail is closed, and within a flush interval for the app's own trail.
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+from sqlalchemy import select
+
+from audit import AuditTrail
+from models import AuditEvent, Role
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def stored(main, resource):
+    with main.engine.connect() as conn:
+        return conn.execute(select(AuditEvent).where(AuditEvent.resource == resource)
+                            .order_by(AuditEvent.id)).all()
+
+
+# Takes client for the app startup, which creates the tables
+def test_flusher_persists_events(main, client):
+    resource = f"test-{uuid4()}"
+    doctor = SimpleNamespace(id="doctor-1", role=Role.doctor)
+    trail = AuditTrail(main.engine, enabled=True, batch_size=3, flush_interval_ms=60000)
+    trail.start()
+    try:
+        trail.record(doctor, "read", resource, ["p1", "p2"])
+        trail.record(None, "delete", resource)
+        # A full batch is written without waiting for the flush interval
+        wait_for(lambda: trail.stats()["written"] == 3)
+        rows = stored(main, resource)
+        assert [(row.actor_id, row.actor_role, row.action, row.patient_id) for row in rows] == [
+            ("doctor-1", Role.doctor, "read", "p1"), ("doctor-1", Role.doctor, "read", "p2"),
+            (None, None, "delete", None),
+        ]
+
+        trail.record(doctor, "read", resource, ["p3"])
+        trail.record(doctor, "read", resource, [])
+    finally:
+        trail.close()
+    assert [row.patient_id for row in stored(main, resource)][3:] == ["p3"]
+    assert trail.stats() == {"enabled": True, "recorded": 4, "written": 4, "buffered": 0, "dropped": 0,
+                             "failed_flushes": 0}
+
+
+def test_full_buffer_drops_the_oldest_events(main, client):
+    resource = f"test-{uuid4()}"
+    trail = AuditTrail(main.engine, enabled=True, buffer_size=2, flush_interval_ms=60000)
+    for patient_id in ("p1", "p2", "p3"):
+        trail.record(None, "read", resource, [patient_id])
+    trail.start()
+    trail.close()
+    assert [row.patient_id for row in stored(main, resource)] == ["p2", "p3"]
+    assert trail.stats()["dropped"] == 1
+
+
+def test_reads_are_audited(main, client, make_user):
+    patient, _ = make_user()
+    doctor_id, doctor = make_user("Doctor")
+    client.post(f"/users/{patient}/consultations", headers=doctor, json={"tpa_approval": False})
+    assert client.get(f"/users/{patient}/consultations", headers=doctor).status_code == 200
+
+    def audited():
+        response = client.get("/audit/events", headers=doctor, params={"patient_id": patient})
+        return [(event["actor_id"], event["action"], event["resource"]) for event in response.json()]
+
+    wait_for(lambda: (doctor_id, "read", "consultations") in audited())
@@ -0,0 +1,75 @@
+# The rollups kept by every write against contributions_statement(), the same figures computed
+# from scratch, after each kind of write that changes a user's contribution.
+import json
+
+from sqlalchemy import select
+
+from cohort_stats import ROLLUP_FIELDS, contributions_statement
+from models import CohortRollup
+
+
+def assert_rollups_consistent(main):
+    with main.engine.connect() as conn:
+        # A group whose last user left keeps a row of zeros; recomputing drops it
+        kept = {(row.role, row.age_band): tuple(getattr(row, field) for field in ROLLUP_FIELDS)
+                for row in conn.execute(select(CohortRollup))}
+        expected = {(row.role, row.age_band): tuple(getattr(row, field) for field in ROLLUP_FIELDS)
+                    for row in conn.execute(contributions_statement())}
+    assert {key: values for key, values in kept.items() if any(values)} == expected
+
+
+def test_rollups_follow_every_write(main, client, make_user):
+    _, neurologist = make_user("Neurologist", age=50)
+
+    response = client.post("/users", json={"name": "New", "username": "rollup-new@test", "age": 82,
+                                           "gender": "Female", "role": "Patient", "password": "pw"})
+    assert response.status_code == 200
+    created = response.json()["id"]
+    assert_rollups_consistent(main)
+
+    patient, patient_headers = make_user("Patient", age=30)
+    response = client.post("/users/me/vitals", headers=patient_headers,
+                           json={"blood_pressure_systolic": 150, "blood_pressure_diastolic": 90})
+    assert response.status_code == 200
+    assert_rollups_consistent(main)
+
+    response = client.post("/users/me/results", headers=patient_headers, json={"bmp_glucose": 120, "coagulation": "normal"})
+    assert response.status_code == 200
+    assert_rollups_consistent(main)
+
+    for approval in (True, False):
+        response = client.post(f"/users/{patient}/consultations", headers=neurologist,
+                               json={"tpa_approval": approval, "diagnosis": "stroke"})
+        assert response.status_code == 200
+        assert_rollups_consistent(main)
+
+    body = "\n".join(json.dumps(row) for row in [
+        {"user_id": created, "nihss_score": 9, "blood_pressure_systolic": 140},
+        {"user_id": patient, "nihss_score": 3},
+    ])
+    response = client.post("/ingest/vitals", headers=neurologist, content=body)
+    assert [row["status"] for row in map(json.loads, response.text.splitlines())] == ["created", "created"]
+    assert_rollups_consistent(main)
+
+    response = client.post("/ingest/results", headers={**neurologist, "Content-Type": "application/json"},
+                           content=json.dumps([{"user_id": created, "bmp_glucose": 90, "coagulation": "normal"}]))
+    assert [row["status"] for row in map(json.loads, response.text.splitlines())] == ["created"]
+    assert_rollups_consistent(main)
+
+    for user_id in (created, patient):
+        assert client.delete(f"/users/{user_id}", headers=neurologist).status_code == 200
+        assert_rollups_consistent(main)
+
+
+def test_stats_reads_the_rollups(main, client, make_user):
+    _, doctor = make_user("Doctor", age=40)
+    with main.engine.connect() as conn:
+        expected = {"users": 0, "pending": 0, "eligible": 0, "approved": 0, "denied": 0}
+        for row in conn.execute(contributions_statement()):
+            for field in expected:
+                expected[field] += getattr(row, field)
+
+    response = client.get("/stats", headers=doctor)
+    assert response.status_code == 200
+    [overall] = response.json()
+    assert {field: overall[field] for field in expected} == expected
@@ -0,0 +1,81 @@
+# The stored eligibility (tpa_criteria, evaluated in SQL by refresh_tpa_eligibility) against the
+# per-patient is_eligible_for_tpa, on both sides of every criterion's threshold.
+import os
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from database import create_db_engine
+from eligibility import refresh_all_tpa_eligibility
+from migrations import migrate
+from models import LabResult, Role, TpaEligibility, User, Vitals
+from utils import is_eligible_for_tpa
+
+ELIGIBLE = dict(
+    age=70, nihss_score=8, oxygen_saturation=98, significant_head_trauma=False, recent_surgery=False,
+    recent_myocardial_infarction=False, recent_hemorrhage=False, blood_pressure_systolic=150,
+    blood_pressure_diastolic=90, bmp_glucose=120.0, coagulation="normal", inr_score=1.1, platelet_count=250000,
+)
+
+BOUNDARIES = {
+    "age": [None, 0, 17, 18],
+    "nihss_score": [None, 0, 3, 4],
+    "oxygen_saturation": [None, 0, 94, 95],
+    "significant_head_trauma": [None, True],
+    "recent_surgery": [None, True],
+    "recent_myocardial_infarction": [None, True],
+    "recent_hemorrhage": [None, True],
+    "blood_pressure_systolic": [None, 185, 186],
+    "blood_pressure_diastolic": [None, 110, 111],
+    "bmp_glucose": [None, 49.9, 50.0, 400.0, 400.1],
+    "coagulation": [None, "abnormal", "ABNORMAL", "normal"],
+    "inr_score": [None, 0.0, 2.99, 3.0],
+    "platelet_count": [None, 0, 99999, 100000],
+}
+
+CASES = [{}] + [{field: value} for field, values in BOUNDARIES.items() for value in values]
+
+LAB_FIELDS = {"bmp_glucose", "coagulation"}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_db_engine(f"sqlite:///{os.path.join(tmp_path, 'eligibility.db')}")
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_stored_eligibility_matches_is_eligible_for_tpa(engine):
+    patients = {}
+    with engine.begin() as conn:
+        for index, case in enumerate(CASES):
+            values = {**ELIGIBLE, **case}
+            user_id = f"patient-{index:03}"
+            patients[user_id] = values
+            conn.execute(insert(User).values(id=user_id, name="Patient", username=user_id, age=values["age"],
+                                             gender="male", hashed_password="x", role=Role.patient))
+            conn.execute(insert(Vitals).values(
+                user_id=user_id, **{field: values[field] for field in ELIGIBLE if field not in LAB_FIELDS | {"age"}}
+            ))
+            conn.execute(insert(LabResult).values(user_id=user_id, **{field: values[field] for field in LAB_FIELDS}))
+        refresh_all_tpa_eligibility(conn)
+
+    with Session(engine) as session:
+        stored = dict(session.exec(select(TpaEligibility.user_id, TpaEligibility.eligible)).all())
+    assert set(stored) == set(patients)
+    for user_id, values in patients.items():
+        record = SimpleNamespace(**values)
+        assert stored[user_id] == is_eligible_for_tpa(record, record, record), values
+
+
+def test_boundaries_decide_eligibility():
+    record = SimpleNamespace(**ELIGIBLE)
+    assert is_eligible_for_tpa(record, record, record)
+    for case, eligible in (({"platelet_count": 0}, False), ({"platelet_count": None}, True),
+                           ({"platelet_count": 100000}, True), ({"inr_score": 3.0}, False),
+                           ({"blood_pressure_systolic": None}, False), ({"age": 18}, True)):
+        record = SimpleNamespace(**{**ELIGIBLE, **case})
+        assert is_eligible_for_tpa(record, record, record) is eligible, case
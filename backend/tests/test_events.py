@@ -0,0 +1,59 @@
+# The dashboard event broker: each publish reaches the subscribers that asked for its patient, a
+# slow subscriber gets one "resync" in place of its backlog, and sse_stream frames the events.
+import asyncio
+import json
+
+from events import EventBroker, sse_stream
+
+
+def drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        sequence, event_type, patient_id, data = subscriber.queue.get_nowait()
+        events.append((event_type, patient_id, json.loads(data)))
+    return events
+
+
+def test_publish_reaches_matching_subscribers():
+    broker = EventBroker()
+    everyone, first, both = broker.subscribe(), broker.subscribe(["p1"]), broker.subscribe(["p1", "p2"])
+    broker.publish("vitals", "p1", {"heart_rate": 80})
+    broker.publish("results", "p2", {"bmp_glucose": 120})
+    broker.publish("vitals", "p3", {})
+
+    assert [patient_id for _, patient_id, _ in drain(everyone)] == ["p1", "p2", "p3"]
+    assert drain(first) == [("vitals", "p1", {"patient_id": "p1", "heart_rate": 80})]
+    assert [event_type for event_type, _, _ in drain(both)] == ["vitals", "results"]
+
+    broker.unsubscribe(first)
+    broker.publish("vitals", "p1", {})
+    assert drain(first) == [] and len(drain(both)) == 1
+    assert broker.stats() == {"subscribers": 2, "published": 4, "overflows": 0}
+
+
+def test_slow_subscriber_gets_a_resync():
+    broker = EventBroker(queue_size=2)
+    subscriber = broker.subscribe(["p1"])
+    for heart_rate in (70, 80, 90):
+        broker.publish("vitals", "p1", {"heart_rate": heart_rate})
+    assert drain(subscriber) == [("resync", None, {"reason": "subscriber too slow"})]
+    assert broker.stats()["overflows"] == 1
+
+
+def test_sse_stream_frames_events_until_closed():
+    async def read():
+        broker = EventBroker()
+        stream = sse_stream(broker, ["p1"], heartbeat_seconds=0.01)
+        frames = [await anext(stream), await anext(stream)]
+        broker.publish("vitals", "p2", {})
+        broker.publish("vitals", "p1", {"heart_rate": 80})
+        frames.append(await anext(stream))
+        broker.close()
+        frames.extend([frame async for frame in stream])
+        return broker, frames
+
+    broker, frames = asyncio.run(read())
+    assert frames[:2] == [": connected\n\n", ": heartbeat\n\n"]
+    assert frames[2] == f"id: 2\nevent: vitals\ndata: {json.dumps({'patient_id': 'p1', 'heart_rate': 80})}\n\n"
+    assert frames[3:] == [f"id: 0\nevent: resync\ndata: {json.dumps({'reason': 'server shutting down'})}\n\n"]
+    assert broker.stats()["subscribers"] == 0
@@ -0,0 +1,63 @@
+# FAST_RESPONSES=true encodes rows directly; the bodies must be the bytes response_model writes.
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert
+
+import fast_responses
+from models import AuditEvent, AuditEventPublic, Role, VitalsObservationPublic
+
+AUDIT_EVENTS = [
+    {"occurred_at": datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc), "actor_id": "a",
+     "actor_role": Role.doctor, "action": "read", "resource": "vitals", "patient_id": "ü", "request_id": "r", "id": 1},
+    {"occurred_at": datetime(2024, 1, 2, 3, 4, 5), "actor_id": None, "actor_role": None, "action": "delete",
+     "resource": "user", "patient_id": None, "request_id": None, "id": 2},
+    {"occurred_at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone(timedelta(hours=2))), "actor_id": None,
+     "actor_role": Role.patient, "action": "read", "resource": "audit", "patient_id": None, "request_id": None, "id": 3},
+]
+
+OBSERVATIONS = [
+    {"observed_at": datetime(2024, 1, 1, tzinfo=timezone.utc), "blood_pressure_systolic": 150,
+     "blood_pressure_diastolic": None, "heart_rate": 80, "respiratory_rate": None, "oxygen_saturation": 98,
+     "nihss_score": 4, "inr_score": inr_score}
+    for inr_score in (1.0, 0.1, 1e20, 2.5e-7, None)
+]
+
+
+# encode() takes rows or ORM objects: anything with the fields as attributes
+def encode_both(monkeypatch, public_model, value):
+    bodies = []
+    for fast in (False, True):
+        monkeypatch.setattr(fast_responses, "FAST_RESPONSES", fast)
+        bodies.append(fast_responses.encode(public_model, value))
+    return bodies
+
+
+@pytest.mark.parametrize("public_model, rows", [(AuditEventPublic, AUDIT_EVENTS),
+                                                (VitalsObservationPublic, OBSERVATIONS)])
+def test_fast_path_encodes_like_response_model(monkeypatch, public_model, rows):
+    rows = [SimpleNamespace(**row) for row in rows]
+    default, fast = encode_both(monkeypatch, public_model, rows)
+    assert fast == default
+    for row in rows:
+        default, fast = encode_both(monkeypatch, public_model, row)
+        assert fast == default
+
+
+def test_audit_events_are_served_alike(main, client, make_user, monkeypatch):
+    patient, _ = make_user()
+    _, doctor = make_user("Doctor")
+    with main.engine.begin() as conn:
+        # Stored timestamps must be aware; they come back in UTC
+        conn.execute(insert(AuditEvent), [{**event, "id": None, "patient_id": patient} for event in AUDIT_EVENTS
+                                          if event["occurred_at"].tzinfo is not None])
+
+    bodies = []
+    for fast in (False, True):
+        monkeypatch.setattr(fast_responses, "FAST_RESPONSES", fast)
+        response = client.get("/audit/events", headers=doctor, params={"patient_id": patient})
+        assert response.status_code == 200
+        bodies.append(response.content)
+    assert bodies[0] == bodies[1]
+    assert len(response.json()) == 2
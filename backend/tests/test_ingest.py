@@ -0,0 +1,78 @@
+# Bulk ingest answers one status row per input row, in input order: bad rows are reported and
+# skipped, the rest are written.
+import json
+
+import pytest
+
+from ingest import INGEST_MAX_RECORD_SIZE, RECORD_TOO_LARGE
+
+
+def statuses(response):
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.fixture(scope="module")
+def clinician(make_user):
+    return make_user("Doctor", age=40)[1]
+
+
+def test_ndjson_error_rows(client, make_user, clinician):
+    patient, _ = make_user()
+    doctor, _ = make_user("Doctor")
+    lines = [
+        json.dumps({"user_id": patient, "heart_rate": 80}),
+        "{not json",
+        json.dumps({"user_id": patient, "heart_rate": "fast"}),
+        json.dumps({"heart_rate": 80}),
+        json.dumps({"user_id": "no-such-patient", "heart_rate": 80}),
+        json.dumps({"user_id": doctor, "heart_rate": 80}),
+        json.dumps({"user_id": patient, "chief_complaint": "x" * INGEST_MAX_RECORD_SIZE}),
+        "",
+        json.dumps({"user_id": patient, "heart_rate": 90, "observed_at": "2024-01-01T00:00:00"}),
+        json.dumps({"user_id": patient, "heart_rate": 95}),
+    ]
+    rows = statuses(client.post("/ingest/vitals", headers=clinician, content="\n".join(lines)))
+
+    assert [row["row"] for row in rows] == list(range(1, 10))
+    assert [row["status"] for row in rows] == ["created", "error", "error", "error", "error", "error", "error",
+                                               "error", "created"]
+    assert rows[1]["detail"].startswith("invalid JSON")
+    assert rows[2]["detail"][0]["loc"] == ["heart_rate"]
+    assert rows[3]["detail"][0]["loc"] == ["user_id"]
+    assert rows[4]["detail"] == rows[5]["detail"] == "unknown patient"
+    assert rows[6]["detail"] == RECORD_TOO_LARGE
+    # observed_at must carry a time zone
+    assert rows[7]["detail"][0]["loc"] == ["observed_at"]
+
+    history = client.get(f"/users/{patient}/vitals/history", headers=clinician).json()
+    assert [observation["heart_rate"] for observation in history] == [80, 95]
+
+
+def test_json_array_error_rows(client, make_user, clinician):
+    patient, _ = make_user()
+    json_headers = {**clinician, "Content-Type": "application/json"}
+
+    # Detected by its first byte, whatever the content type
+    body = json.dumps([{"user_id": patient, "bmp_glucose": 100}, {"user_id": patient, "bmp_glucose": "high"}])
+    for headers in (json_headers, clinician):
+        rows = statuses(client.post("/ingest/results", headers=headers, content="  " + body))
+        assert [row["status"] for row in rows] == ["created", "error"]
+
+    # A malformed array ends with a single error row after the elements read before it
+    rows = statuses(client.post("/ingest/results", headers=json_headers,
+                                content=f'[{{"user_id": "{patient}", "bmp_glucose": 100}}, {{"user_id": '))
+    assert [row["status"] for row in rows] == ["created", "error"]
+    assert rows[1]["detail"].startswith("invalid JSON")
+
+    rows = statuses(client.post("/ingest/results", headers=json_headers,
+                                content=json.dumps({"user_id": patient, "bmp_glucose": 100})))
+    assert rows == [{"row": 1, "status": "error", "detail": "expected a JSON array"}]
+
+    assert statuses(client.post("/ingest/results", headers=json_headers, content="[]")) == []
+
+
+def test_ingest_is_for_clinicians(client, make_user):
+    patient, patient_headers = make_user()
+    body = json.dumps({"user_id": patient, "heart_rate": 80})
+    assert client.post("/ingest/vitals", headers=patient_headers, content=body).status_code == 403
@@ -0,0 +1,106 @@
+# migrate() on a database created by the original models (no schema_version, the
+# index-on-every-column schema) against one created fresh: same tables and columns, and the
+# derived data the migrations leave empty rebuilt from the rows already there.
+import os
+
+import pytest
+from sqlalchemy import inspect, select, text
+
+from cohort_stats import ROLLUP_FIELDS, contributions_statement
+from database import create_db_engine
+from migrations import LATEST_VERSION, MIGRATIONS, get_schema_version, migrate
+from models import CohortRollup, TpaEligibility, VitalsObservation
+from search import search_patients
+
+#The schema as originally shipped (SQLModel.metadata.create_all of the first models.py)
+LEGACY_DDL = [
+    'CREATE TABLE "user" (name VARCHAR NOT NULL, username VARCHAR NOT NULL, age INTEGER, '
+    "gender VARCHAR(6) NOT NULL, id VARCHAR NOT NULL, hashed_password VARCHAR NOT NULL, "
+    "role VARCHAR(11) NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE vitals (chief_complaint VARCHAR, medical_history VARCHAR, blood_pressure_systolic INTEGER, "
+    "blood_pressure_diastolic INTEGER, heart_rate INTEGER, respiratory_rate INTEGER, oxygen_saturation INTEGER, "
+    "significant_head_trauma BOOLEAN, recent_surgery BOOLEAN, recent_myocardial_infarction BOOLEAN, "
+    "recent_hemorrhage BOOLEAN, platelet_count INTEGER, id VARCHAR NOT NULL, user_id VARCHAR NOT NULL, "
+    "nihss_score INTEGER, inr_score FLOAT, PRIMARY KEY (id), UNIQUE (user_id), "
+    'FOREIGN KEY(user_id) REFERENCES "user" (id) ON DELETE CASCADE)',
+    "CREATE TABLE labresult (cbc VARCHAR, bmp_glucose FLOAT, creatinine FLOAT, coagulation VARCHAR, "
+    "id VARCHAR NOT NULL, user_id VARCHAR NOT NULL, created_at DATETIME NOT NULL, PRIMARY KEY (id), "
+    'FOREIGN KEY(user_id) REFERENCES "user" (id) ON DELETE CASCADE)',
+    "CREATE TABLE neurologistconsultation (tpa_approval BOOLEAN, diagnosis VARCHAR, treatment_plan VARCHAR, "
+    "id VARCHAR NOT NULL, user_id VARCHAR NOT NULL, PRIMARY KEY (id), "
+    'FOREIGN KEY(user_id) REFERENCES "user" (id) ON DELETE CASCADE)',
+    "CREATE INDEX ix_vitals_chief_complaint ON vitals (chief_complaint)",
+    "CREATE INDEX ix_labresult_bmp_glucose ON labresult (bmp_glucose)",
+]
+
+LEGACY_ROWS = [
+    """INSERT INTO "user" VALUES ('Ann', 'ann@example.com', 70, 'female', 'p1', 'x', 'patient')""",
+    """INSERT INTO "user" VALUES ('Bob', 'bob@example.com', 15, 'male', 'p2', 'x', 'patient')""",
+    """INSERT INTO "user" VALUES ('Dr Cy', 'cy@example.com', 45, 'male', 'd1', 'x', 'doctor')""",
+    "INSERT INTO vitals VALUES ('sudden aphasia', 'hypertension', 150, 90, 80, 16, 98, 0, 0, 0, 0, 250000, "
+    "'v1', 'p1', 8, 1.1)",
+    "INSERT INTO labresult VALUES ('normal', 120.0, 1.0, 'normal', 'l1', 'p1', '2024-01-01 00:00:00.000000')",
+    "INSERT INTO neurologistconsultation VALUES (0, 'migraine', 'observe', 'c1', 'p2')",
+]
+
+
+def _engine(tmp_path, name):
+    return create_db_engine(f"sqlite:///{os.path.join(tmp_path, name)}")
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    engine = _engine(tmp_path, "legacy.db")
+    with engine.begin() as conn:
+        for statement in LEGACY_DDL + LEGACY_ROWS:
+            conn.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def fresh(tmp_path):
+    engine = _engine(tmp_path, "fresh.db")
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+def _schema(engine):
+    inspector = inspect(engine)
+    return {table: sorted(column["name"] for column in inspector.get_columns(table))
+            for table in inspector.get_table_names() if not table.startswith("clinical_search_")}
+
+
+def _triggers(engine):
+    with engine.connect() as conn:
+        return set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+
+
+def test_legacy_database_is_migrated_to_the_fresh_schema(legacy, fresh):
+    assert migrate(legacy) == [version for version, _, _ in MIGRATIONS]
+    with legacy.connect() as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+    assert _schema(legacy) == _schema(fresh)
+    assert _triggers(legacy) == _triggers(fresh)
+    assert migrate(legacy) == []
+
+
+def test_migrations_rebuild_the_derived_data(legacy):
+    migrate(legacy)
+    with legacy.connect() as conn:
+        eligibility = {user_id: eligible for user_id, eligible in
+                       conn.execute(select(TpaEligibility.user_id, TpaEligibility.eligible))}
+        assert eligibility == {"p1": True, "p2": False}
+
+        rollups = {(row.role, row.age_band): tuple(getattr(row, field) for field in ROLLUP_FIELDS)
+                   for row in conn.execute(select(CohortRollup))}
+        expected = {(row.role, row.age_band): tuple(getattr(row, field) for field in ROLLUP_FIELDS)
+                    for row in conn.execute(contributions_statement())}
+        assert rollups == expected
+
+        assert [user_id for user_id, _, _ in search_patients(conn, "aphasia")] == ["p1"]
+        assert [user_id for user_id, _, _ in search_patients(conn, "migraine")] == ["p2"]
+
+        observations = list(conn.execute(select(VitalsObservation.user_id, VitalsObservation.nihss_score)))
+        assert observations == [("p1", 8)]
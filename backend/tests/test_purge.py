@@ -0,0 +1,49 @@
+# Deleting users takes a clinician's token; a background purge is read back with its job token,
+# since it deletes every account, and only one runs at a time.
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+from models import User
+from purge import PurgeJobRegistry
+
+
+def test_deletes_need_a_clinician(client, make_user):
+    patient, patient_headers = make_user()
+    for path in (f"/users/{patient}", "/users/", "/users/?background=true"):
+        assert client.delete(path).status_code == 401
+        assert client.delete(path, headers=patient_headers).status_code == 403
+
+    _, doctor = make_user("Doctor")
+    assert client.delete(f"/users/{patient}", headers=doctor).status_code == 200
+    assert client.delete(f"/users/{patient}", headers=doctor).status_code == 404
+
+
+def test_only_one_purge_starts():
+    registry = PurgeJobRegistry()
+    with ThreadPoolExecutor(8) as pool:
+        jobs = list(pool.map(lambda _: registry.start(10), range(8)))
+    started = [job for job in jobs if job is not None]
+    assert len(started) == 1 and registry.active() is started[0]
+
+    started[0].status = "completed"
+    assert registry.start(10) is not None
+
+
+def test_background_purge_is_read_with_its_token(main, client, make_user):
+    _, doctor = make_user("Doctor")
+    make_user()
+    # TestClient runs the background task before returning the response
+    response = client.delete("/users/", headers=doctor, params={"background": True})
+    assert response.status_code == 202
+    job = response.json()
+    with main.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(User)).scalar() == 0
+
+    path = f"/purge-jobs/{job['id']}"
+    assert client.get(path).status_code == 404
+    assert client.get(path, headers={"X-Purge-Job-Token": "not-the-token"}).status_code == 404
+    response = client.get(path, headers={"X-Purge-Job-Token": job["token"]})
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed" and "token" not in response.json()
+    assert response.json()["deleted"] == job["total"]
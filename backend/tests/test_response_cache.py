@@ -0,0 +1,76 @@
+# ETag revalidation of the per-patient reads. Writes through this app invalidate its cache;
+# writes by another worker (made here straight to the database, with no invalidation in this
+# process) are caught by the database version every cached response is checked against.
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, insert
+
+from models import LabResult, NeurologistConsultation, User
+from vitals_series import record_vitals_observations
+
+
+@pytest.fixture(scope="module")
+def clinician(make_user):
+    return make_user("Neurologist", age=40)[1]
+
+
+def revalidate(client, path, headers, etag):
+    return client.get(path, headers={**headers, "If-None-Match": etag})
+
+
+def test_write_through_the_app_changes_the_etag(client, make_user, clinician):
+    patient, patient_headers = make_user()
+    client.post("/users/me/vitals", headers=patient_headers, json={"heart_rate": 80})
+    path = f"/users/{patient}/vitals"
+
+    first = client.get(path, headers=clinician)
+    assert first.status_code == 200 and first.headers["ETag"]
+    assert revalidate(client, path, clinician, first.headers["ETag"]).status_code == 304
+    assert client.get(path, headers={**clinician, "If-None-Match": "*"}).status_code == 304
+    assert client.get(path, headers={**clinician, "If-Modified-Since": first.headers["Last-Modified"]}).status_code == 304
+
+    client.post("/users/me/vitals", headers=patient_headers, json={"heart_rate": 95})
+    second = revalidate(client, path, clinician, first.headers["ETag"])
+    assert second.status_code == 200 and second.json()["heart_rate"] == 95
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert revalidate(client, path, clinician, second.headers["ETag"]).status_code == 304
+
+
+def test_write_by_another_worker_changes_the_etag(main, client, make_user, clinician):
+    patient, _ = make_user()
+    with main.engine.begin() as conn:
+        record_vitals_observations(conn, [{"user_id": patient, "heart_rate": 80}])
+        conn.execute(insert(LabResult).values(id="lab-1-" + patient, user_id=patient, bmp_glucose=100,
+                                              created_at=datetime.now(timezone.utc) - timedelta(minutes=5)))
+
+    paths = {resource: f"/users/{patient}/{resource}" for resource in ("vitals", "results", "consultations")}
+    paths["user"] = f"/users/{patient}"
+    etags = {}
+    for resource, path in paths.items():
+        response = client.get(path, headers=clinician)
+        assert response.status_code == 200, resource
+        etags[resource] = response.headers["ETag"]
+        assert revalidate(client, path, clinician, etags[resource]).status_code == 304
+
+    with main.engine.begin() as conn:
+        record_vitals_observations(conn, [{"user_id": patient, "heart_rate": 120}])
+        conn.execute(insert(LabResult).values(id="lab-2-" + patient, user_id=patient, bmp_glucose=300))
+        conn.execute(insert(NeurologistConsultation).values(id="consultation-" + patient, user_id=patient,
+                                                            tpa_approval=True))
+
+    expected = {"vitals": lambda body: body["heart_rate"] == 120,
+                "results": lambda body: body["bmp_glucose"] == 300,
+                "consultations": lambda body: [c["tpa_approval"] for c in body] == [True]}
+    for resource, check in expected.items():
+        response = revalidate(client, paths[resource], clinician, etags[resource])
+        assert response.status_code == 200, resource
+        assert check(response.json()), resource
+        assert response.headers["ETag"] != etags[resource]
+
+    # The user itself is unchanged; once another worker deletes it, the cached copy is not served
+    assert revalidate(client, paths["user"], clinician, etags["user"]).status_code == 304
+    with main.engine.begin() as conn:
+        conn.execute(delete(User).where(User.id == patient))
+    assert client.get(paths["user"], headers=clinician).status_code == 404
+    assert client.get(paths["vitals"], headers=clinician).status_code == 404
@@ -0,0 +1,34 @@
+# Authenticated requests are served from the token cache; deleting a user drops their tokens at
+# once, and any other change to the user (e.g. their role) is seen when the entry expires.
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import update
+
+import cache
+from models import Role, User
+
+
+def test_deleted_users_token_is_rejected(main, client, make_user):
+    patient, headers = make_user()
+    _, doctor = make_user("Doctor")
+    assert client.get("/users/me/", headers=headers).status_code == 200
+    hits = main.token_cache.stats()["hits"]
+    assert client.get("/users/me/", headers=headers).json()["id"] == patient
+    assert main.token_cache.stats()["hits"] == hits + 1
+
+    assert client.delete(f"/users/{patient}", headers=doctor).status_code == 200
+    assert client.get("/users/me/", headers=headers).status_code == 401
+
+
+def test_role_change_is_seen_when_the_entry_expires(main, client, make_user, monkeypatch):
+    user_id, headers = make_user()
+    assert client.get("/token/cache-stats", headers=headers).status_code == 403
+    with main.engine.begin() as conn:
+        conn.execute(update(User).where(User.id == user_id).values(role=Role.doctor))
+    assert client.get("/users/me/", headers=headers).json()["role"] == "Patient"
+
+    later = time.time() + main.TOKEN_CACHE_TTL_SECONDS + 1
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: later))
+    assert client.get("/users/me/", headers=headers).json()["role"] == "Doctor"
+    assert client.get("/token/cache-stats", headers=headers).status_code == 200
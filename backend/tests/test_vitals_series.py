@@ -0,0 +1,62 @@
+# The vitals series over [start, end), raw and downsampled into buckets aligned to `start`.
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from models import VITALS_SERIES_FIELDS
+from vitals_series import downsample, record_vitals_observations
+
+T0 = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+
+#(minutes after T0, heart_rate, nihss_score)
+OBSERVATIONS = [(0, 70, 2), (5, 90, None), (10, 80, 6), (20, 100, 4), (40, 60, None)]
+
+
+def minutes(value):
+    return T0 + timedelta(minutes=value)
+
+
+def observed_at(items, field="observed_at"):
+    return [datetime.fromisoformat(item[field]) for item in items]
+
+
+def test_downsample_keeps_min_max_and_last():
+    observations = [SimpleNamespace(**{**dict.fromkeys(VITALS_SERIES_FIELDS), "observed_at": minutes(offset),
+                                       "heart_rate": heart_rate, "nihss_score": nihss_score})
+                    for offset, heart_rate, nihss_score in OBSERVATIONS]
+    buckets = downsample(observations, timedelta(minutes=15))
+    assert [(bucket.bucket_start, bucket.count) for bucket in buckets] == [(minutes(0), 3), (minutes(15), 1),
+                                                                           (minutes(30), 1)]
+    first = buckets[0]
+    assert (first.min["heart_rate"], first.max["heart_rate"], first.last["heart_rate"]) == (70, 90, 80)
+    # Unmeasured values are skipped, not counted as the last one
+    assert (first.min["nihss_score"], first.max["nihss_score"], first.last["nihss_score"]) == (2, 6, 6)
+    assert buckets[2].last["nihss_score"] is None and buckets[2].min["oxygen_saturation"] is None
+
+    assert [bucket.bucket_start for bucket in downsample(observations, timedelta(minutes=15), minutes(5))] == \
+        [minutes(-10), minutes(5), minutes(20), minutes(35)]
+    assert downsample([], timedelta(minutes=15)) == []
+
+
+def test_history_honours_start_and_end(main, client, make_user):
+    patient, _ = make_user()
+    _, doctor = make_user("Doctor")
+    with main.engine.begin() as conn:
+        record_vitals_observations(conn, [{"user_id": patient, "observed_at": minutes(offset),
+                                           "heart_rate": heart_rate, "nihss_score": nihss_score}
+                                          for offset, heart_rate, nihss_score in OBSERVATIONS])
+    path = f"/users/{patient}/vitals/history"
+
+    response = client.get(path, headers=doctor)
+    assert observed_at(response.json()) == [minutes(offset) for offset, _, _ in OBSERVATIONS]
+    # start is inclusive, end exclusive
+    response = client.get(path, headers=doctor, params={"start": minutes(5).isoformat(),
+                                                        "end": minutes(40).isoformat()})
+    assert observed_at(response.json()) == [minutes(5), minutes(10), minutes(20)]
+
+    response = client.get(f"{path}/downsampled", headers=doctor,
+                          params={"bucket_seconds": 900, "start": minutes(5).isoformat()})
+    assert response.status_code == 200
+    buckets = response.json()
+    assert observed_at(buckets, "bucket_start") == [minutes(5), minutes(20), minutes(35)]
+    assert [bucket["count"] for bucket in buckets] == [2, 1, 1]
+    assert buckets[0]["max"]["heart_rate"] == 90 and buckets[0]["last"]["nihss_score"] == 6
@@ -0,0 +1,116 @@
+# The worklist pages through every patient with a cursor, and its eligibility agrees with the
+# eligibility endpoints and with is_eligible_for_tpa.
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from pagination import NEXT_CURSOR_HEADER, encode_cursor
+from utils import is_eligible_for_tpa
+
+VITALS = dict(nihss_score=8, inr_score=1.1, oxygen_saturation=98, significant_head_trauma=False,
+              recent_surgery=False, recent_myocardial_infarction=False, recent_hemorrhage=False,
+              blood_pressure_systolic=150, blood_pressure_diastolic=90, platelet_count=250000)
+LAB_RESULT = dict(bmp_glucose=120.0, coagulation="normal")
+
+#(age, vitals changes, lab result changes); None leaves that record out
+PATIENTS = [
+    (70, {}, {}),
+    (70, {"blood_pressure_systolic": 186}, {}),
+    (70, {"platelet_count": 0}, {}),
+    (16, {}, {}),
+    (70, {}, {"coagulation": "abnormal"}),
+    (70, {}, None),
+    (70, None, {}),
+    (70, None, None),
+]
+
+
+def ingest(client, headers, resource, rows):
+    response = client.post(f"/ingest/{resource}", headers=headers, content="\n".join(map(json.dumps, rows)))
+    assert all(json.loads(line)["status"] == "created" for line in response.text.splitlines())
+
+
+@pytest.fixture(scope="module")
+def clinician(make_user):
+    return make_user("Doctor", age=40)[1]
+
+
+@pytest.fixture(scope="module")
+def patients(client, make_user, clinician):
+    patients = {}
+    for age, vitals, lab_result in PATIENTS:
+        user_id, _ = make_user(age=age)
+        if vitals is not None:
+            ingest(client, clinician, "vitals", [{"user_id": user_id, **VITALS, **vitals}])
+        if lab_result is not None:
+            ingest(client, clinician, "results", [{"user_id": user_id, **LAB_RESULT, **lab_result}])
+        patients[user_id] = (age, vitals, lab_result)
+    return patients
+
+
+def walk(client, headers, path, limit, **params):
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, headers=headers, params={**params, "limit": limit,
+                                                              **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+def test_worklist_agrees_with_eligibility(main, client, clinician, patients):
+    worklist = {item["id"]: item for page in walk(client, clinician, "/worklist", 3) for item in page}
+    screening = {row["user_id"]: row for row in client.get("/tpa-eligibility", headers=clinician,
+                                                           params={"limit": 10000}).json()}
+    assert worklist.keys() == screening.keys()
+
+    for user_id, item in worklist.items():
+        response = client.get(f"/users/{user_id}/tpa-eligibility", headers=clinician)
+        if item["eligible_for_tpa"] is None:
+            assert response.status_code == 404
+            assert not screening[user_id]["eligible"]
+        else:
+            assert response.json()["eligible_for_tpa"] == item["eligible_for_tpa"]
+            assert (item["eligible_for_tpa"] == main.SUCCESSFUL_ELIGIBILITY_MESSAGE) == screening[user_id]["eligible"]
+
+    eligible = [item["id"] for page in walk(client, clinician, "/worklist", 2, eligible_only=True) for item in page]
+    assert eligible == sorted(user_id for user_id, row in screening.items() if row["eligible"])
+    eligible_only = client.get("/tpa-eligibility", headers=clinician, params={"eligible_only": True, "limit": 10000})
+    assert [row["user_id"] for row in eligible_only.json()] == eligible
+
+    for user_id, (age, vitals, lab_result) in patients.items():
+        if vitals is None or lab_result is None:
+            assert worklist[user_id]["eligible_for_tpa"] is None
+            continue
+        record = SimpleNamespace(age=age, **{**VITALS, **vitals, **LAB_RESULT, **lab_result})
+        assert (user_id in eligible) == is_eligible_for_tpa(record, record, record), (vitals, lab_result)
+    assert sum(user_id in eligible for user_id in patients) == 1
+
+
+def test_keyset_pagination_boundaries(client, clinician, patients):
+    everyone = [item["id"] for page in walk(client, clinician, "/worklist", 1) for item in page]
+    assert everyone == sorted(set(everyone))
+    assert set(patients) <= set(everyone)
+    total = len(everyone)
+
+    # A full last page gets no cursor; one row short, the cursor leads to exactly that row
+    response = client.get("/worklist", headers=clinician, params={"limit": total})
+    assert len(response.json()) == total and NEXT_CURSOR_HEADER not in response.headers
+    pages = walk(client, clinician, "/worklist", total - 1)
+    assert [len(page) for page in pages] == [total - 1, 1]
+
+    response = client.get("/worklist", headers=clinician, params={"cursor": encode_cursor(everyone[-1])})
+    assert response.json() == [] and NEXT_CURSOR_HEADER not in response.headers
+    response = client.get("/worklist", headers=clinician, params={"cursor": encode_cursor(everyone[0]), "limit": 1})
+    assert [item["id"] for item in response.json()] == everyone[1:2]
+
+    # Offset paging is still served for existing clients
+    response = client.get("/worklist", headers=clinician, params={"offset": 1, "limit": 2})
+    assert [item["id"] for item in response.json()] == everyone[1:3]
+
+    for cursor in ("not a cursor", encode_cursor(5)):
+        assert client.get("/worklist", headers=clinician, params={"cursor": cursor}).status_code == 400
+    assert client.get("/worklist", headers=clinician, params={"limit": 101}).status_code == 422
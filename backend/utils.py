@@ -1,22 +1,81 @@
-from models import LabResultPublic, VitalsPublic, User
+from sqlalchemy import case, func, or_
+from sqlmodel import select
 
+from models import LabResult, LabResultPublic, Role, VitalsPublic, User, Vitals
 
+
+# The per-patient check, with the same criteria and missing-value handling as tpa_criteria (which
+# the stored eligibility is computed from): a missing BP, glucose, coagulation or INR fails, a
+# missing platelet count doesn't.
 def is_eligible_for_tpa(vitals: VitalsPublic, lab_result: LabResultPublic, user: User) -> bool:
-    if not (user.age and user.age >= 18):
+    if user.age is None or user.age < 18:
         return False
-    if not (vitals.nihss_score and vitals.nihss_score >= 4):
+    if vitals.nihss_score is None or vitals.nihss_score < 4:
         return False
-    if not (vitals.oxygen_saturation and vitals.oxygen_saturation >= 95):
+    if vitals.oxygen_saturation is None or vitals.oxygen_saturation < 95:
         return False
     if vitals.significant_head_trauma or vitals.recent_surgery or \
        vitals.recent_myocardial_infarction or vitals.recent_hemorrhage:
         return False
-    if vitals.blood_pressure_systolic > 185 or vitals.blood_pressure_diastolic > 110:
+    if vitals.blood_pressure_systolic is None or vitals.blood_pressure_diastolic is None or \
+       vitals.blood_pressure_systolic > 185 or vitals.blood_pressure_diastolic > 110:
         return False
-    if lab_result.bmp_glucose < 50 or lab_result.bmp_glucose > 400:
+    if lab_result.bmp_glucose is None or lab_result.bmp_glucose < 50 or lab_result.bmp_glucose > 400:
         return False
-    if lab_result.coagulation.lower() == "abnormal" or vitals.inr_score >= 3.0:
+    if lab_result.coagulation is None or vitals.inr_score is None or \
+       lab_result.coagulation.lower() == "abnormal" or vitals.inr_score >= 3.0:
         return False
-    if vitals.platelet_count and vitals.platelet_count < 100000:
+    if vitals.platelet_count is not None and vitals.platelet_count < 100000:
         return False
     return True
+
+
+#Bump whenever the criteria below change: stored eligibility computed under another version
+#is recomputed for every patient at startup (see eligibility.py)
+TPA_RULES_VERSION = 1
+
+
+# The criteria of is_eligible_for_tpa as SQL conditions, in the same order, each true when the
+# patient fails it. `labs` holds the latest lab result's columns (LabResult or a subquery's .c).
+# Missing BP/glucose/coagulation/INR count as a failure.
+def tpa_criteria(labs):
+    return [
+        ("age", or_(User.age.is_(None), User.age < 18)),
+        ("nihss", or_(Vitals.nihss_score.is_(None), Vitals.nihss_score < 4)),
+        ("oxygen_saturation", or_(Vitals.oxygen_saturation.is_(None), Vitals.oxygen_saturation < 95)),
+        ("exclusion_criteria", or_(Vitals.significant_head_trauma.is_(True), Vitals.recent_surgery.is_(True),
+                                   Vitals.recent_myocardial_infarction.is_(True), Vitals.recent_hemorrhage.is_(True))),
+        ("blood_pressure", or_(Vitals.blood_pressure_systolic.is_(None), Vitals.blood_pressure_diastolic.is_(None),
+                               Vitals.blood_pressure_systolic > 185, Vitals.blood_pressure_diastolic > 110)),
+        ("glucose", or_(labs.bmp_glucose.is_(None), labs.bmp_glucose < 50, labs.bmp_glucose > 400)),
+        ("coagulation", or_(labs.coagulation.is_(None), Vitals.inr_score.is_(None),
+                            func.lower(labs.coagulation) == "abnormal", Vitals.inr_score >= 3.0)),
+        ("platelet_count", Vitals.platelet_count < 100000),
+    ]
+
+
+# Every criterion a patient fails, for the stored eligibility: one row per patient with
+# has_vitals, has_lab_result and a boolean column per criterion. The latest lab result is
+# looked up per patient through ix_labresult_user_id_created_at, so evaluating a handful of
+# patients only reads their rows.
+def tpa_criteria_statement(user_ids=None):
+    latest_lab_id = (
+        select(LabResult.id)
+        .where(LabResult.user_id == User.id)
+        .order_by(LabResult.created_at.desc())
+        .limit(1)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    criteria = [case((condition, True), else_=False).label(name) for name, condition in tpa_criteria(LabResult)]
+    statement = (
+        select(User.id, Vitals.id.is_not(None).label("has_vitals"),
+               LabResult.id.is_not(None).label("has_lab_result"), *criteria)
+        .outerjoin(Vitals, Vitals.user_id == User.id)
+        .outerjoin(LabResult, LabResult.id == latest_lab_id)
+        .where(User.role == Role.patient)
+    )
+    if user_ids is not None:
+        statement = statement.where(User.id.in_(user_ids))
+    return statement
+
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, insert, update
+from sqlmodel import select
+
+from models import VITALS_SERIES_FIELDS, Vitals, VitalsBucket, VitalsObservation
+
+# Snapshot columns an observation may update (everything but the keys)
+SNAPSHOT_FIELDS = [name for name in Vitals.model_fields if name not in ("id", "user_id")]
+
+
+# Timestamps are compared and stored in UTC; naive values are taken to be UTC already
+def as_utc(value: datetime | None) -> datetime | None:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+# Built once: the per-patient snapshot update, with one bound parameter per snapshot field
+_update_snapshot = (
+    update(Vitals).where(Vitals.user_id == bindparam("b_user_id"))
+    .values({name: bindparam(name) for name in SNAPSHOT_FIELDS})
+    .execution_options(synchronize_session=False)
+)
+
+
+# Appends observations to the series and folds them into each patient's current Vitals snapshot.
+# `rows` are dicts with user_id, observed_at and any Vitals fields; None means "not measured" and
+# leaves the snapshot's value alone. A snapshot only moves forward: observations older than it
+# are stored in the series but don't overwrite it. Returns the new observation ids, in order.
+# `conn` is a sync Connection; async callers use `await conn.run_sync(record_vitals_observations, rows)`.
+def record_vitals_observations(conn, rows: list[dict]) -> list[int]:
+    now = datetime.now(timezone.utc)
+    for row in rows:
+        row["observed_at"] = as_utc(row.get("observed_at")) or now
+
+    observations = [
+        {"user_id": row["user_id"], "observed_at": row["observed_at"],
+         **{name: row.get(name) for name in VITALS_SERIES_FIELDS}}
+        for row in rows
+    ]
+    ids = list(conn.execute(insert(VitalsObservation).returning(VitalsObservation.id, sort_by_parameter_order=True),
+                            observations).scalars())
+
+    user_ids = {row["user_id"] for row in rows}
+    snapshots = {
+        snapshot["user_id"]: dict(snapshot)
+        for snapshot in conn.execute(select(Vitals).where(Vitals.user_id.in_(user_ids))).mappings()
+    }
+    existing = set(snapshots)
+    for row in sorted(rows, key=lambda row: row["observed_at"]):
+        snapshot = snapshots.setdefault(row["user_id"], {"user_id": row["user_id"], "observed_at": None})
+        if snapshot["observed_at"] is not None and row["observed_at"] < snapshot["observed_at"]:
+            continue
+        snapshot.update({name: row[name] for name in SNAPSHOT_FIELDS if row.get(name) is not None})
+
+    created = [Vitals(**snapshot).model_dump() for user_id, snapshot in snapshots.items() if user_id not in existing]
+    updated = [
+        {"b_user_id": user_id, **{name: snapshot.get(name) for name in SNAPSHOT_FIELDS}}
+        for user_id, snapshot in snapshots.items() if user_id in existing
+    ]
+    if created:
+        conn.execute(insert(Vitals), created)
+    if updated:
+        conn.execute(_update_snapshot, updated)
+    return ids
+
+
+# Observations for one patient in [start, end), oldest first
+def vitals_range_statement(user_id: str, start: datetime | None, end: datetime | None):
+    statement = select(VitalsObservation).where(VitalsObservation.user_id == user_id)
+    if start is not None:
+        statement = statement.where(VitalsObservation.observed_at >= as_utc(start))
+    if end is not None:
+        statement = statement.where(VitalsObservation.observed_at < as_utc(end))
+    return statement.order_by(VitalsObservation.observed_at, VitalsObservation.id)
+
+
+# Min/max/last of every series field per fixed-width time bucket, for charting. `observations`
+# must be ordered by observed_at; it is consumed in one pass, holding one bucket at a time.
+def downsample(observations, bucket: timedelta, origin: datetime | None = None) -> list[VitalsBucket]:
+    buckets = []
+    current = None
+    for observation in observations:
+        if origin is None:
+            origin = observation.observed_at
+        bucket_start = origin + bucket * ((observation.observed_at - origin) // bucket)
+        if current is None or current.bucket_start != bucket_start:
+            current = VitalsBucket(bucket_start=bucket_start, count=0,
+                                   min=dict.fromkeys(VITALS_SERIES_FIELDS), max=dict.fromkeys(VITALS_SERIES_FIELDS),
+                                   last=dict.fromkeys(VITALS_SERIES_FIELDS))
+            buckets.append(current)
+        current.count += 1
+        for name in VITALS_SERIES_FIELDS:
+            value = getattr(observation, name)
+            if value is None:
+                continue
+            current.min[name] = value if current.min[name] is None else min(current.min[name], value)
+            current.max[name] = value if current.max[name] is None else max(current.max[name], value)
+            current.last[name] = value
+    return buckets
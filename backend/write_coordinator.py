@@ -0,0 +1,153 @@
+import asyncio
+import contextlib
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from metrics import Histogram
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process writer lock, SQLite's busy timeout only
+    fcntl = None
+
+#Group commit for the POST handlers (WRITE_COORDINATOR=true). On SQLite every transaction
+#queues on the single writer lock, so a surge of concurrent submissions spends its time
+#waiting on (and timing out for) that lock. With the coordinator on, each worker has one writer
+#thread: handlers hand it their write, it runs the writes queued within WRITE_BATCH_WINDOW_MS
+#(at most WRITE_BATCH_MAX of them) in one transaction on the sync engine, and each handler
+#gets its own result back once that transaction has committed.
+WRITE_COORDINATOR = os.getenv("WRITE_COORDINATOR", "false").lower() == "true"
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", 2))
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", 256))
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve(future, result=None, error=None):
+    # A caller that went away (client disconnected) still had its write committed
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _deliver(loop, future, result=None, error=None):
+    try:
+        loop.call_soon_threadsafe(_resolve, future, result, error)
+    except RuntimeError:
+        pass  # the caller's event loop has already closed
+
+
+# The writers of all the worker processes take turns on a SQLite file through a blocking flock
+# next to it. SQLite's own busy handler polls with growing sleeps, so under contention a writer
+# can wait seconds after the lock was released; flock hands it over as soon as it is.
+def _lock_path(engine) -> str | None:
+    database = engine.url.database
+    if engine.url.get_backend_name() != "sqlite" or not database or database == ":memory:" or fcntl is None:
+        return None
+    return database + ".write-lock"
+
+
+@contextlib.contextmanager
+def _writer_lock(path: str | None):
+    if path is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class WriteCoordinator:
+    def __init__(self, engine, async_engine, enabled: bool = WRITE_COORDINATOR,
+                 window_ms: float = WRITE_BATCH_WINDOW_MS, max_batch: int = WRITE_BATCH_MAX):
+        self.engine = engine
+        self.lock_path = _lock_path(engine)
+        self.async_engine = async_engine
+        self.enabled = enabled
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batch_sizes = Histogram("write_coordinator_batch_size", "Writes committed per transaction.", (),
+                                     BATCH_SIZE_BUCKETS)
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # Runs `work(conn)`, a sync callable given a Connection, in a transaction and returns its
+    # result after the commit: in a transaction shared with other writes on the writer thread
+    # when the coordinator is enabled, in one of its own on the async engine otherwise
+    async def run(self, work):
+        if not self.enabled:
+            async with self.async_engine.begin() as conn:
+                return await conn.run_sync(work)
+        self._start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((work, loop, future))
+        return await future
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name="write-coordinator", daemon=True)
+                self._thread.start()
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            if batch[0] is not None and self.window and self._queue.qsize() < self.max_batch - 1:
+                time.sleep(self.window)
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            batch = [item for item in batch if item is not None]
+            if batch:
+                self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        try:
+            with _writer_lock(self.lock_path), self.engine.begin() as conn:
+                results = [work(conn) for work, _, _ in batch]
+        except Exception as exc:
+            # A lock timeout has nothing to do with any one write. A failing write (a constraint,
+            # say) rolled the others back with it: retry each on its own, so only it fails.
+            if len(batch) == 1 or isinstance(exc, OperationalError):
+                for _, loop, future in batch:
+                    _deliver(loop, future, error=exc)
+                return
+            logger.warning("group commit of %d writes failed (%s), retrying them one by one", len(batch),
+                           type(exc).__name__)
+            for item in batch:
+                self._commit([item])
+            return
+        self.batch_sizes.observe((), len(batch))
+        for (_, loop, future), result in zip(batch, results):
+            _deliver(loop, future, result)
+
+    # Commits whatever is still queued, then stops the writer thread
+    async def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            await asyncio.to_thread(thread.join)
+
+    def render(self) -> list[str]:
+        return self.batch_sizes.render()
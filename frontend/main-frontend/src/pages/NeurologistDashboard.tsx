@@ -9,7 +9,7 @@ import { toast } from "sonner";
 import { FileText, Check, X, Info, Loader2 } from "lucide-react";
 import { patientService } from "@/services/patientService";
 
-import { PatientCase, PatientData, UserPatientData, User } from "@/types/patient";
+import { PatientCase, PatientData, UserPatientData, User, WorklistItem } from "@/types/patient";
 import { useAuth } from "@/hooks/useAuth";
 // Mock patient cases - these will be replaced with API data
 const mockPatientCases: PatientCase[] = [
@@ -133,52 +133,27 @@ const NeurologistDashboard = () => {
         setLoading(true);
         setError(null);
         
-        // Get patients with role "Patient"
-        const patientUsers = await patientService.getPatients();
-        console.log("Fetched patient users:", patientUsers);
+        // Get patients with their vitals, labs, consultations and eligibility, one batched call per page
+        const worklist = await patientService.getFullWorklist();
+        console.log("Fetched patient worklist:", worklist);
         
-        if (patientUsers && Array.isArray(patientUsers)) {
-          // For each patient user, fetch their vitals and lab results
-          const patientCasesPromises = patientUsers.map(async (patientUser: User) => {
-            try {
-              // Get vitals for this patient
-              const vitalsData = await patientService.getPatientVitals(patientUser.id);
-              console.log(`Vitals data for patient ${patientUser.id}:`, vitalsData);
-              
-              // Get lab results for this patient
-              const labData = await patientService.getPatientLabResults(patientUser.id);
-              console.log(`Lab data for patient ${patientUser.id}:`, labData);
-              
-              // Get consultations for this patient (if any)
-              const consultations = await patientService.getPatientConsultations(patientUser.id);
-              console.log(`Consultations for patient ${patientUser.id}:`, consultations);
-              
-              // Check TPA eligibility
-              const tpaEligibility = await patientService.checkTPAEligibility(patientUser.id);
-              console.log(`TPA eligibility for patient ${patientUser.id}:`, tpaEligibility);
-              
-              // Create a PatientCase object
-              return {
-                id: patientUser.id,
-                patientData: {
-                  name: patientUser.name,
-                  age: patientUser.age,
-                  gender: patientUser.gender,
-                  ...vitalsData
-                },
-                labData: labData,
-                consultations: consultations || [],
-                tpa_eligibility: tpaEligibility?.eligible ? "eligible" : "ineligible",
-                status: consultations && consultations.length > 0 ? 
-                  (consultations[0].tpa_approval ? "approved" : "denied") : "pending"
-              } as PatientCase;
-            } catch (error) {
-              console.error(`Error fetching data for patient ${patientUser.id}:`, error);
-              return null;
-            }
-          });
-          
-          const patientCases = (await Promise.all(patientCasesPromises)).filter(Boolean) as PatientCase[];
+        if (worklist && Array.isArray(worklist)) {
+          const patientCases = worklist
+            .filter((item: WorklistItem) => item.vitals && item.lab_result)
+            .map((item: WorklistItem) => ({
+              id: item.id,
+              patientData: {
+                name: item.name,
+                age: item.age,
+                gender: item.gender,
+                ...item.vitals
+              },
+              labData: item.lab_result,
+              consultations: item.consultations || [],
+              tpa_eligibility: item.eligible_for_tpa,
+              status: item.consultations && item.consultations.length > 0 ?
+                (item.consultations[0].tpa_approval ? "approved" : "denied") : "pending"
+            }) as PatientCase);
           console.log("Processed patient cases:", patientCases);
           
           // If we got data from the API, use it
@@ -1,7 +1,7 @@
 
 import axios from 'axios';
 import { api } from '../lib/api';
-import { PatientData, LabData, Diagnosis } from '../types/patient';
+import { PatientData, LabData, Diagnosis, UserPage, VitalsObservation, VitalsBucket, DashboardEvent, WorklistItem, WorklistPage } from '../types/patient';
 
 //const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000' || "https://stroke-diagnoser.onrender.com";
 const API_URL = "https://stroke-diagnoser.onrender.com";
@@ -17,33 +17,63 @@ const getAuthHeader = () => {
 };
 
 export const patientService = {
-  // Fetch patients by role (for doctors and neurologists)
-  getPatientsByRole: async (role: string) => {
+  // Fetch one page of users by role (for doctors and neurologists).
+  // Pass the returned nextCursor back in to get the following page; it is null on the last page.
+  getPatientsByRole: async (role: string, cursor: string | null = null, limit = 100): Promise<UserPage> => {
     try {
-      const response = await axios.get(`${API_URL}/users/role/${role}`, getAuthHeader());
-      return response.data;
+      const response = await axios.get(`${API_URL}/users/role/${role}`, {
+        ...getAuthHeader(),
+        params: { limit, ...(cursor ? { cursor } : {}) }
+      });
+      return { users: response.data, nextCursor: response.headers['x-next-cursor'] ?? null };
     } catch (error) {
       console.error('Error fetching patients by role:', error);
       throw error;
     }
   },
 
-  // Get all patients (with role = Patient)
-  getPatients: async () => {
+  // Get one page of patients (with role = Patient)
+  getPatients: async (cursor: string | null = null, limit = 100): Promise<UserPage> => {
     try {
-      const response = await axios.get(`${API_URL}/users/role/Patient`, getAuthHeader());
-      return response.data;
+      return await patientService.getPatientsByRole('Patient', cursor, limit);
     } catch (error) {
       console.error('Error fetching patients:', error);
       // Fallback to local storage if API fails
       const localPatients = localStorage.getItem('patients');
       if (localPatients) {
-        return JSON.parse(localPatients);
+        return { users: JSON.parse(localPatients), nextCursor: null };
       }
       throw error;
     }
   },
 
+  // Get one page of patients with vitals, latest lab result, consultations and eligibility in one call.
+  // Pass the returned nextCursor back in to get the following page; it is null on the last page.
+  getWorklist: async (cursor: string | null = null, limit = 100): Promise<WorklistPage> => {
+    try {
+      const response = await axios.get(`${API_URL}/worklist`, {
+        ...getAuthHeader(),
+        params: { limit, ...(cursor ? { cursor } : {}) }
+      });
+      return { items: response.data, nextCursor: response.headers['x-next-cursor'] ?? null };
+    } catch (error) {
+      console.error('Error fetching patient worklist:', error);
+      throw error;
+    }
+  },
+
+  // The whole worklist: follows the cursor until the last page
+  getFullWorklist: async (limit = 100): Promise<WorklistItem[]> => {
+    const items: WorklistItem[] = [];
+    let cursor: string | null = null;
+    do {
+      const page = await patientService.getWorklist(cursor, limit);
+      items.push(...page.items);
+      cursor = page.nextCursor;
+    } while (cursor);
+    return items;
+  },
+
   // Submit vitals for current patient
   submitVitals: async (vitalsData: PatientData) => {
     try {
@@ -77,6 +107,34 @@ export const patientService = {
     }
   },
 
+  // Get a patient's vitals observations in [start, end), oldest first
+  getPatientVitalsHistory: async (userId: string, start?: string, end?: string): Promise<VitalsObservation[]> => {
+    try {
+      const response = await axios.get(`${API_URL}/users/${userId}/vitals/history`, {
+        ...getAuthHeader(),
+        params: { start, end }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching patient vitals history:', error);
+      throw error;
+    }
+  },
+
+  // Get min/max/last per time bucket of a patient's vitals, for charts
+  getPatientVitalsChart: async (userId: string, bucketSeconds = 900, start?: string, end?: string): Promise<VitalsBucket[]> => {
+    try {
+      const response = await axios.get(`${API_URL}/users/${userId}/vitals/history/downsampled`, {
+        ...getAuthHeader(),
+        params: { bucket_seconds: bucketSeconds, start, end }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching patient vitals chart:', error);
+      throw error;
+    }
+  },
+
   // Get lab results for a specific patient
   getPatientLabResults: async (userId: string) => {
     try {
@@ -114,6 +172,48 @@ export const patientService = {
     }
   },
 
+  // Subscribe to dashboard deltas (vitals, results, consultations) for the given patients, or all
+  // patients when none are given. Uses fetch streaming because EventSource can't send the auth
+  // header. Returns a function that closes the subscription.
+  subscribeToPatientEvents: (onEvent: (event: DashboardEvent) => void, patientIds: string[] = []) => {
+    const controller = new AbortController();
+    const params = new URLSearchParams(patientIds.map((id) => ['patient_id', id]));
+
+    // The server ends the stream when it restarts or scales down (after a "resync" event);
+    // reconnect until the caller unsubscribes
+    const listen = async () => {
+      const response = await fetch(`${API_URL}/events?${params}`, {
+        headers: getAuthHeader().headers,
+        signal: controller.signal
+      });
+      const reader = response.body!.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop() ?? '';
+        for (const message of messages) {
+          const type = message.match(/^event: (.*)$/m)?.[1];
+          const data = message.match(/^data: (.*)$/m)?.[1];
+          if (type && data) onEvent({ type, ...JSON.parse(data) });
+        }
+      }
+    };
+
+    (async () => {
+      while (!controller.signal.aborted) {
+        await listen();
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+      }
+    })().catch((error) => {
+      if (error.name !== 'AbortError') console.error('Dashboard event stream failed:', error);
+    });
+
+    return () => controller.abort();
+  },
+
   // Check TPA eligibility for a patient
   checkTPAEligibility: async (userId: string) => {
     try {
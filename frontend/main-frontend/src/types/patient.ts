@@ -78,3 +78,58 @@ export interface User {
   gender: string;  // "Male" | "Female"
   role: string;    // "Patient" | "Doctor" | "Neurologist"
 }
+
+// One entry of a patient's vitals series (GET /users/{id}/vitals/history)
+export interface VitalsObservation {
+  observed_at: string;
+  blood_pressure_systolic: number | null;
+  blood_pressure_diastolic: number | null;
+  heart_rate: number | null;
+  respiratory_rate: number | null;
+  oxygen_saturation: number | null;
+  nihss_score: number | null;
+  inr_score: number | null;
+}
+
+type VitalsSeriesValues = Partial<Record<Exclude<keyof VitalsObservation, 'observed_at'>, number | null>>;
+
+// One downsampled bucket (GET /users/{id}/vitals/history/downsampled)
+export interface VitalsBucket {
+  bucket_start: string;
+  count: number;
+  min: VitalsSeriesValues;
+  max: VitalsSeriesValues;
+  last: VitalsSeriesValues;
+}
+
+// Delta pushed on GET /events. "resync" means events were dropped: refetch.
+// Bulk ingest events carry no payload (bulk: true).
+export interface DashboardEvent {
+  type: 'vitals' | 'results' | 'consultations' | 'resync' | string;
+  patient_id: string | null;
+  vitals?: PatientData;
+  lab_result?: LabData;
+  consultation?: Diagnosis;
+  bulk?: boolean;
+  reason?: string;
+}
+
+// One page of a cursor-paginated user listing (GET /users/role/{role})
+export interface UserPage {
+  users: User[];
+  nextCursor: string | null;
+}
+
+// Batched worklist entry returned by GET /worklist
+export interface WorklistItem extends User {
+  vitals: PatientData | null;
+  lab_result: LabData | null;
+  consultations: Diagnosis[];
+  eligible_for_tpa: string | null;
+}
+
+// One page of the cursor-paginated worklist (GET /worklist)
+export interface WorklistPage {
+  items: WorklistItem[];
+  nextCursor: string | null;
+}